@@ -0,0 +1,92 @@
+import json
+import os
+import platform
+import time
+import numpy as np
+
+
+def measure(name, fn, repeat=200, warmup=10, items_per_call=1):
+    """
+    Gọi `fn()` `warmup` lần (bỏ qua) rồi `repeat` lần có đo thời gian. Trả về
+    thống kê độ trễ mỗi lần gọi (ms) và throughput (item/giây).
+    """
+    for _ in range(warmup):
+        fn()
+    latencies = np.empty(repeat)
+    for i in range(repeat):
+        started = time.perf_counter()
+        fn()
+        latencies[i] = time.perf_counter() - started
+
+    total = latencies.sum()
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {
+        "name": name,
+        "calls": repeat,
+        "items_per_call": items_per_call,
+        "mean_ms": float(latencies.mean() * 1000),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "throughput_per_s": float(repeat * items_per_call / total) if total else float("inf"),
+    }
+
+
+def environment():
+    import sklearn
+
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "sklearn": sklearn.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def print_report(results):
+    header = f"{'benchmark':<34}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'items/s':>14}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['name']:<34}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}"
+            f"{r['throughput_per_s']:>14.1f}"
+        )
+
+
+def save_baseline(results, path):
+    with open(path, "w") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2)
+    print(f"💾 Baseline saved to {path}")
+
+
+def compare_with_baseline(results, path, tolerance=0.2, metrics=("p50_ms",)):
+    """
+    So sánh với baseline đã lưu. Một benchmark bị coi là chậm đi nếu một trong
+    các `metrics` vượt baseline quá `tolerance` (0.2 = chậm hơn 20%). Trả về danh
+    sách các regression.
+    """
+    with open(path) as f:
+        baseline = json.load(f)
+    if baseline.get("environment") != environment():
+        print(f"⚠️ Baseline was recorded on a different environment: {baseline.get('environment')}")
+
+    previous = {r["name"]: r for r in baseline["results"]}
+    regressions = []
+    print(f"\n{'benchmark':<34}{'metric':>8}{'baseline':>12}{'current':>12}{'change':>10}")
+    for r in results:
+        old = previous.get(r["name"])
+        if old is None:
+            print(f"{r['name']:<34}{'(new)':>8}")
+            continue
+        for metric in metrics:
+            change = r[metric] / old[metric] - 1 if old[metric] else 0.0
+            flag = " ❌" if change > tolerance else ""
+            print(
+                f"{r['name']:<34}{metric[:-3]:>8}{old[metric]:>12.3f}{r[metric]:>12.3f}"
+                f"{change:>+10.1%}{flag}"
+            )
+            if change > tolerance:
+                regressions.append((r["name"], metric, old[metric], r[metric]))
+    return regressions
@@ -0,0 +1,192 @@
+"""
+Benchmark các đường nóng của dự đoán và training trên dữ liệu tổng hợp, không
+cần Postgres (lớp DB được thay bằng bộ nhớ trong, xem `benchmarks/stubs.py`).
+
+    python -m benchmarks.run_benchmarks                       # chạy và in kết quả
+    python -m benchmarks.run_benchmarks --save baseline.json  # lưu baseline
+    python -m benchmarks.run_benchmarks --compare baseline.json --tolerance 0.2
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import warnings
+
+# Server benchmark chạy trong process này: khởi động đồng bộ, không cần DB
+os.environ.setdefault("STARTUP_MODE", "blocking")
+warnings.filterwarnings("ignore")
+
+from src.data.dao.medical_record_dao import BASE_FEATURE_COLUMNS, MedicalRecordDAO  # noqa: E402
+from src.ml.predict import HealthPredictor  # noqa: E402
+from src.ml.train_model import HealthPredictionTrainer  # noqa: E402
+
+from .harness import compare_with_baseline, measure, print_report, save_baseline  # noqa: E402
+from .stubs import make_patients, make_training_frame, stub_database  # noqa: E402
+
+MODEL_FILE = "data/health_prediction_model.pkl"
+
+
+def quiet(fn):
+    """Bọc `fn` để bỏ output print của code được đo."""
+
+    def wrapper():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return fn()
+
+    return wrapper
+
+
+def bench_prediction(predictor, feature_names, sizes, repeat):
+    patients = make_patients(max(sizes), feature_names)
+    results = [
+        measure("predict_single", lambda: predictor.predict_single(patients[0]), repeat=repeat)
+    ]
+
+    cached = HealthPredictor(model_file=MODEL_FILE, prediction_cache_size=10000)
+    with contextlib.redirect_stdout(io.StringIO()):
+        cached.load_model()
+    cached.predict_single(patients[0])
+    results.append(
+        measure(
+            "predict_single[cache hit]",
+            lambda: cached.predict_single(patients[0]),
+            repeat=repeat,
+        )
+    )
+    for size in sizes:
+        batch = patients[:size]
+        results.append(
+            measure(
+                f"predict_batch[{size}]",
+                lambda batch=batch: predictor.predict_batch(batch),
+                repeat=max(3, repeat // max(1, size // 10)),
+                warmup=2,
+                items_per_call=size,
+            )
+        )
+    return results
+
+
+def bench_training(symptom_codes, disease_codes, n_records, repeat):
+    frame = make_training_frame(n_records, symptom_codes, disease_codes)
+    with stub_database(symptom_codes, disease_codes, training_frame=frame):
+        results = [
+            measure(
+                f"get_training_data[{n_records}]",
+                quiet(MedicalRecordDAO.get_training_data),
+                repeat=repeat,
+                warmup=1,
+                items_per_call=n_records,
+            )
+        ]
+
+        def train():
+            trainer = HealthPredictionTrainer()
+            trainer._train(streaming=False)
+
+        results.append(
+            measure(
+                f"train[{n_records}]",
+                quiet(train),
+                repeat=max(1, repeat // 3),
+                warmup=0,
+                items_per_call=n_records,
+            )
+        )
+    return results
+
+
+def bench_http(symptom_codes, disease_codes, feature_names, batch_size, repeat):
+    with contextlib.redirect_stdout(io.StringIO()):
+        from src.app import app
+        from src.util.request_logger import request_logger
+
+    if request_logger is not None:
+        request_logger.stream = open(os.devnull, "w")
+    client = app.test_client()
+    body = {"user_id": 1, "symptom_codes": list(symptom_codes[:3])}
+    batch_body = {
+        "patients": [
+            {"user_id": 1, "symptom_codes": list(symptom_codes[i % 5 : i % 5 + 3])}
+            for i in range(batch_size)
+        ]
+    }
+
+    def post(path, payload):
+        def call():
+            response = client.post(path, json=payload)
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} returned {response.status_code}: {response.get_data()}")
+
+        return call
+
+    with stub_database(symptom_codes, disease_codes):
+        return [
+            measure("http /predict", post("/predict", body), repeat=repeat),
+            measure(
+                f"http /predict/batch[{batch_size}]",
+                post("/predict/batch", batch_body),
+                repeat=max(3, repeat // 10),
+                items_per_call=batch_size,
+            ),
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the prediction/training benchmarks.")
+    parser.add_argument("--quick", action="store_true", help="Smaller data and fewer repeats")
+    parser.add_argument(
+        "--only", default="", help="Comma-separated groups: prediction,training,http"
+    )
+    parser.add_argument("--save", metavar="PATH", help="Save results as a baseline")
+    parser.add_argument("--compare", metavar="PATH", help="Compare against a saved baseline")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="Allowed slowdown before failing (0.2 = 20%%)"
+    )
+    parser.add_argument(
+        "--metrics", default="p50_ms", help="Comma-separated metrics to compare (p50_ms,p95_ms,p99_ms)"
+    )
+    args = parser.parse_args()
+
+    groups = set(filter(None, args.only.split(","))) or {"prediction", "training", "http"}
+    repeat = 50 if args.quick else 300
+    n_records = 2000 if args.quick else 20000
+    batch_sizes = (1, 10, 100) if args.quick else (1, 10, 100, 1000)
+
+    predictor = HealthPredictor(model_file=MODEL_FILE)
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = predictor.load_model()
+    feature_names = model.vectorizer.feature_names
+    symptom_codes = [name for name in feature_names if name not in BASE_FEATURE_COLUMNS]
+    disease_codes = model.label_columns
+
+    results = []
+    if "prediction" in groups:
+        print("⏱️ Prediction benchmarks...")
+        results += bench_prediction(predictor, feature_names, batch_sizes, repeat)
+    if "training" in groups:
+        print("⏱️ Training benchmarks...")
+        results += bench_training(symptom_codes, disease_codes, n_records, max(3, repeat // 50))
+    if "http" in groups:
+        print("⏱️ HTTP benchmarks...")
+        results += bench_http(symptom_codes, disease_codes, feature_names, 100, repeat)
+
+    print()
+    print_report(results)
+
+    if args.save:
+        save_baseline(results, args.save)
+    if args.compare:
+        regressions = compare_with_baseline(
+            results, args.compare, tolerance=args.tolerance, metrics=args.metrics.split(",")
+        )
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            sys.exit(1)
+        print("\n✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+from contextlib import ExitStack, contextmanager
+from datetime import date
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from src.data.database.database import DatabaseClient
+from src.data.dao.medical_record_dao import BASE_FEATURE_COLUMNS
+from src.data.dao.symptoms_dao import SymptomsDAO
+from src.data.dao.diseases_dao import DiseasesDAO
+from src.data.model.user_model import UserModel
+
+SEASONS = ["spring", "summer", "autumn", "winter"]
+GENDERS = ["male", "female", "other"]
+
+
+class FakeCursor:
+    """
+    Cursor giả: ghi nhận câu lệnh, trả id tăng dần cho `INSERT ... RETURNING id`
+    và `(id, [])` cho `CREATE_PREDICTION_RECORD_QUERY`.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._result = None
+
+    def execute(self, query, params=None):
+        self.connection.statements += 1
+        if "RETURNING" in query:
+            self.connection.next_id += 1
+            self._result = (self.connection.next_id,)
+            if "new_record" in query:
+                self._result += ([],)
+
+    def executemany(self, query, params_list):
+        self.connection.statements += len(params_list)
+
+    def fetchone(self):
+        return self._result
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FakeConnection:
+    def __init__(self):
+        self.statements = 0
+        self.next_id = 0
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def make_training_frame(n_records, symptom_codes, disease_codes, seed=42):
+    """Khung dữ liệu thô giống kết quả `TRAINING_DATA_QUERY` (mỗi dòng một record)."""
+    rng = np.random.default_rng(seed)
+    symptom_codes = np.asarray(symptom_codes, dtype=object)
+    disease_codes = np.asarray(disease_codes, dtype=object)
+    n_symptoms = rng.integers(1, 6, size=n_records)
+    n_diseases = rng.integers(1, 3, size=n_records)
+    birth_years = rng.integers(1940, 2015, size=n_records)
+    return pd.DataFrame(
+        {
+            "id": np.arange(1, n_records + 1),
+            "date_of_birth": [date(int(y), 1, 1) for y in birth_years],
+            "gender": rng.choice(GENDERS, size=n_records),
+            "weather_temp": rng.uniform(10.0, 40.0, size=n_records).round(1),
+            "humidity": rng.integers(30, 91, size=n_records),
+            "air_quality_index": rng.integers(1, 6, size=n_records),
+            "season": rng.choice(SEASONS, size=n_records),
+            "symptoms": [
+                list(rng.choice(symptom_codes, size=k, replace=False)) for k in n_symptoms
+            ],
+            "diseases": [
+                list(rng.choice(disease_codes, size=k, replace=False)) for k in n_diseases
+            ],
+        }
+    )
+
+
+def make_patients(n_patients, feature_names, seed=42):
+    """Dict feature của bệnh nhân ngẫu nhiên, cùng dạng với `build_patient_features`."""
+    rng = np.random.default_rng(seed)
+    symptom_names = [name for name in feature_names if name not in BASE_FEATURE_COLUMNS]
+    patients = []
+    for _ in range(n_patients):
+        features = {
+            "age": int(rng.integers(1, 90)),
+            "gender": int(rng.integers(0, 3)),
+            "weather_temp": float(rng.uniform(10.0, 40.0)),
+            "humidity": int(rng.integers(30, 91)),
+            "air_quality_index": int(rng.integers(1, 6)),
+            "season": int(rng.integers(0, 4)),
+        }
+        for code in rng.choice(symptom_names, size=int(rng.integers(1, 6)), replace=False):
+            features[str(code)] = 1
+        patients.append(features)
+    return patients
+
+
+def _prime_vocabulary(cache, codes):
+    cache.prime([(i + 1, code) for i, code in enumerate(codes)])
+
+
+@contextmanager
+def stub_database(symptom_codes, disease_codes, training_frame=None):
+    """
+    Thay lớp DB bằng bộ nhớ trong: `DatabaseClient.get_connection` trả về
+    `FakeConnection`, cache danh mục được nạp sẵn, user nào cũng tồn tại, và
+    `pd.read_sql` trả về `training_frame` / danh sách mã.
+    """
+    connection = FakeConnection()
+    user = UserModel(
+        id=1,
+        username="bench",
+        email="bench@example.com",
+        password="x",
+        first_name=None,
+        last_name=None,
+        date_of_birth=date(1990, 1, 1),
+        gender="male",
+        role="patient",
+    )
+
+    def read_sql(query, conn, params=None, **kwargs):
+        if "FROM symptoms" in query and "medical_records" not in query:
+            return pd.DataFrame({"code": list(symptom_codes)})
+        if "FROM diseases" in query and "medical_records" not in query:
+            return pd.DataFrame({"code": list(disease_codes)})
+        return training_frame.copy()
+
+    _prime_vocabulary(SymptomsDAO.vocabulary, symptom_codes)
+    _prime_vocabulary(DiseasesDAO.vocabulary, disease_codes)
+    with ExitStack() as stack:
+        stack.enter_context(
+            mock.patch.object(DatabaseClient, "get_connection", staticmethod(lambda: connection))
+        )
+        stack.enter_context(
+            mock.patch("src.data.dao.users_dao.UsersDAO.get_user_by_id", staticmethod(lambda _id, columns=None: user))
+        )
+        stack.enter_context(
+            mock.patch(
+                "src.data.dao.users_dao.UsersDAO.get_users_by_ids",
+                staticmethod(lambda ids, columns=None: {_id: user for _id in ids}),
+            )
+        )
+        stack.enter_context(mock.patch.object(pd, "read_sql", read_sql))
+        try:
+            yield connection
+        finally:
+            SymptomsDAO.vocabulary.invalidate()
+            DiseasesDAO.vocabulary.invalidate()
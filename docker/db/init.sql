@@ -113,6 +113,7 @@ CREATE TABLE IF NOT EXISTS model_training_history (
     training_data_count INTEGER, -- Số lượng bản ghi dùng để train
     doctor_diagnosed_count INTEGER, -- Số bản ghi do bác sĩ chẩn đoán
     system_predicted_count INTEGER, -- Số bản ghi do hệ thống dự đoán
+    last_record_id INTEGER, -- medical_records.id lớn nhất đã được đưa vào training (mốc cho train incremental)
     
     deployed_at TIMESTAMP,
     
@@ -127,6 +128,9 @@ CREATE TABLE IF NOT EXISTS model_training_history (
     notes TEXT
 );
 
+-- Bảng đã có từ trước (CREATE TABLE IF NOT EXISTS không thêm cột mới)
+ALTER TABLE model_training_history ADD COLUMN IF NOT EXISTS last_record_id INTEGER;
+
 -- Tạo index cho bảng model_training_history
 CREATE INDEX IF NOT EXISTS idx_training_trigger ON model_training_history(trigger_type);
 CREATE INDEX IF NOT EXISTS idx_training_user ON model_training_history(triggered_by);
@@ -0,0 +1,2 @@
+-- Database tạo trước khi có train incremental: thêm cột mốc last_record_id
+ALTER TABLE model_training_history ADD COLUMN IF NOT EXISTS last_record_id INTEGER;
@@ -1,12 +1,26 @@
 import sys
 import traceback
+import threading
 import time
 import os
-from flask import Flask, jsonify, request, g
+from datetime import datetime
+from flask import Flask, Response, jsonify, request, g
 from src.controller.user_controller import user_api
 from src.controller.auth_controller import auth_api
-from src.controller.predict_controller import predict_api, health_predictor_instance
+from src.controller.model_controller import model_api
+from src.controller.predict_controller import (
+    predict_api,
+    health_predictor_instance,
+    micro_batcher,
+    write_queue,
+)
 from src.data.database.database import DatabaseClient
+from src.util.request_logger import request_logger
+from src.util import metrics
+from src.util.metrics import METRICS_CONFIG
+from src.data.dao.symptoms_dao import SymptomsDAO
+from src.data.dao.users_dao import UsersDAO
+from src.data.dao.diseases_dao import DiseasesDAO
 from src.ml.train_model import HealthPredictionTrainer
 from src.ml.predict import HealthPredictor
 
@@ -16,59 +30,141 @@ app = Flask(__name__)
 # --- Logging Middleware ---
 @app.before_request
 def log_request_info():
-    """Log incoming request details."""
+    """Record the request start time; the log record itself is written after the response."""
     g.start_time = time.time()
-    print("--- New Request ---")
-    print(f"Endpoint: {request.method} {request.path}")
-    body = request.get_json(silent=True)
-    if body:
-        print(f"Body: {body}")
-    else:
-        if request.form:
-            print(f"Form Data: {dict(request.form)}")
-        else:
-            print("Body: (No JSON body or form data)")
+    if METRICS_CONFIG["enabled"]:
+        metrics.begin_request()
 
 
 @app.after_request
 def log_response_info(response):
-    """Log outgoing response details."""
+    """Record request metrics and hand the summary to the background request logger."""
     duration = time.time() - g.start_time
-    print(f"Status: {response.status}")
-    if response.content_type == "application/json":
-        response_body = response.get_data(as_text=True)
-        print(f"Response Body: {response_body[:500]}")
-    else:
-        print(f"Response Body: (Content-Type: {response.content_type})")
-    print(f"Execution Time: {duration:.4f}s")
-    print("--- Request End ---")
+    if METRICS_CONFIG["enabled"]:
+        metrics.end_request(response, duration)
+    if request_logger is not None:
+        request_logger.log(request, response, duration)
     return response
 
 
+@app.teardown_appcontext
+def release_db_connection(exception=None):
+    """Return the request's pooled connection, if one was checked out."""
+    DatabaseClient.release_connection(exception)
+
+
 # --- Database and Model Initialization ---
-MODEL_FILE_PATH = "data/health_prediction_model.pkl"
+MODEL_FILE_PATH = health_predictor_instance.model_file
 
-DatabaseClient.connect()
+STARTUP_CONFIG = {
+    # background: nhận request ngay, kết nối DB/load model ở thread nền
+    # blocking: làm xong mọi thứ trước khi server chạy (hành vi cũ)
+    # manual: không tự khởi động khi import; entry point tự gọi `initialize()`
+    # (server pre-fork `src/server.py`)
+    "mode": os.environ.get("STARTUP_MODE", "background"),
+    # Khoảng thời gian (giây) giữa các lần thử kết nối lại DB ở chế độ background
+    "db_retry_interval": float(os.environ.get("STARTUP_DB_RETRY_INTERVAL", 2)),
+}
+
+startup_state = {
+    "state": "starting",
+    "stage": None,
+    "error": None,
+    "started_at": datetime.now().isoformat(),
+    "finished_at": None,
+}
 
-if not os.path.exists(MODEL_FILE_PATH):
-    print(f"🤔 Model file not found at '{MODEL_FILE_PATH}'. Starting training...")
-    try:
-        trainer = HealthPredictionTrainer()
-        trainer.train_model()
-        print("✅ Initial model training completed successfully.")
-    except Exception as e:
-        print(f"❌ Initial model training failed: {e}")
-        traceback.print_exc(file=sys.stdout)
-else:
-    print(f"✅ Model already exists at '{MODEL_FILE_PATH}'. Skipping training.")
 
-# Load the model into the global instance
-try:
+def _set_startup_stage(stage):
+    print(f"🚀 Startup: {stage}")
+    startup_state["stage"] = stage
+
+
+def connect_database(retry_interval=None):
+    """Connects the pool; with `retry_interval`, keeps retrying until it succeeds."""
+    while DatabaseClient.connect() is False and retry_interval:
+        print(f"⚠️ Database unavailable, retrying in {retry_interval}s...")
+        time.sleep(retry_interval)
+
+
+def load_model():
+    _set_startup_stage("loading_model")
     print("🧠 Loading model into global instance...")
     health_predictor_instance.load_model()
     print("✅ Model loaded successfully into global instance.")
-except FileNotFoundError:
-    print("⚠️ Model could not be loaded. The /predict endpoint will be unavailable.")
+
+
+def start_background_services():
+    """
+    Starts the threads that hold database connections of their own: the user
+    cache invalidation listener and the write-behind writer. The pre-fork
+    server runs this in each worker after fork instead of in the master.
+    """
+    if UsersDAO.cache is not None:
+        UsersDAO.cache.start()
+
+    if write_queue is not None:
+        # Ghi nốt các bản ghi dự đoán còn lại trong hàng đợi từ lần chạy trước
+        write_queue.start()
+        print(f"✅ Prediction write-behind queue started ({write_queue.get_stats()['pending']} pending).")
+
+
+def initialize(retry_interval=None, start_services=True):
+    """
+    Loads the model (training it first if there is none yet), connects the
+    database and preloads vocabularies. An existing model is loaded before
+    touching the database so it can serve as soon as possible.
+    """
+    try:
+        if os.path.exists(MODEL_FILE_PATH):
+            print(f"✅ Model already exists at '{MODEL_FILE_PATH}'. Skipping training.")
+            load_model()
+
+        _set_startup_stage("connecting_database")
+        connect_database(retry_interval)
+
+        # Nạp sẵn danh mục triệu chứng/bệnh để /predict không phải tra cứu DB
+        _set_startup_stage("loading_vocabularies")
+        try:
+            with DatabaseClient.connection_scope():
+                SymptomsDAO.vocabulary.load()
+                DiseasesDAO.vocabulary.load()
+            print("✅ Symptom and disease vocabularies loaded.")
+        except Exception as e:
+            print(f"⚠️ Could not preload vocabularies, they will load on first use: {e}")
+
+        if start_services:
+            start_background_services()
+
+        if not health_predictor_instance.is_ready():
+            print(f"🤔 Model file not found at '{MODEL_FILE_PATH}'. Starting training...")
+            _set_startup_stage("training_model")
+            with DatabaseClient.connection_scope():
+                trainer = HealthPredictionTrainer()
+                trainer.train_model(trigger_type="startup", filename=MODEL_FILE_PATH)
+            print("✅ Initial model training completed successfully.")
+            load_model()
+
+        _set_startup_stage("done")
+        startup_state["state"] = "ready"
+    except Exception as e:
+        print(f"❌ Startup failed, the /predict endpoint will be unavailable: {e}")
+        traceback.print_exc(file=sys.stdout)
+        startup_state["state"] = "failed"
+        startup_state["error"] = str(e)
+    finally:
+        startup_state["finished_at"] = datetime.now().isoformat()
+
+
+if STARTUP_CONFIG["mode"] == "blocking":
+    initialize()
+elif STARTUP_CONFIG["mode"] != "manual":
+    threading.Thread(
+        target=initialize,
+        kwargs={"retry_interval": STARTUP_CONFIG["db_retry_interval"]},
+        name="startup",
+        daemon=True,
+    ).start()
 
 
 # --- Routes and Blueprints ---
@@ -77,6 +173,110 @@ def home():
     return "Health predictor is running ..."
 
 
+@app.route("/healthz")
+def healthz():
+    """Liveness: the process is up and serving requests."""
+    return jsonify({"status": "ok", "startup": startup_state})
+
+
+@app.route("/readyz")
+def readyz():
+    """Readiness: the model is loaded and the database answers."""
+    db_ok, db_error = DatabaseClient.ping()
+    model = health_predictor_instance.model
+    ready = db_ok and model is not None
+    body = {
+        "status": "ready" if ready else "not_ready",
+        "startup": startup_state,
+        "database": {"ok": db_ok, "error": db_error},
+        "model": model.get_info() if model else None,
+    }
+    return jsonify(body), 200 if ready else 503
+
+
+@app.route("/stats")
+def stats():
+    return jsonify(
+        {
+            "db_pool": DatabaseClient.get_pool_stats(),
+            "micro_batcher": micro_batcher.get_stats() if micro_batcher else None,
+            "request_log": request_logger.get_stats() if request_logger else None,
+            "write_behind": write_queue.get_stats() if write_queue else None,
+            "prediction_cache": health_predictor_instance.get_cache_stats(),
+            "user_cache": UsersDAO.cache.get_stats() if UsersDAO.cache else None,
+        }
+    )
+
+
+def _pool_stat(key):
+    def collect():
+        stats = DatabaseClient.get_pool_stats()
+        return {(): stats[key]} if stats else {}
+
+    return collect
+
+
+for _key in ("size", "in_use", "idle"):
+    metrics.registry.register(
+        metrics.GaugeCallback(f"db_pool_{_key}", f"Database connection pool {_key}.", _pool_stat(_key))
+    )
+for _key in ("waits", "timeouts", "reconnects"):
+    metrics.registry.register(
+        metrics.GaugeCallback(
+            f"db_pool_{_key}_total",
+            f"Database connection pool {_key}.",
+            _pool_stat(_key),
+            metric_type="counter",
+        )
+    )
+metrics.registry.register(
+    metrics.GaugeCallback(
+        "model_loaded",
+        "1 when a prediction model is loaded.",
+        lambda: {(): int(health_predictor_instance.is_ready())},
+    )
+)
+metrics.registry.register(
+    metrics.GaugeCallback(
+        "request_log_dropped_total",
+        "Request log records dropped because the queue was full.",
+        lambda: {(): request_logger.get_stats()["dropped"]} if request_logger else {},
+        metric_type="counter",
+    )
+)
+
+
+def _write_queue_stat(key):
+    def collect():
+        return {(): write_queue.get_stats()[key]} if write_queue else {}
+
+    return collect
+
+
+metrics.registry.register(
+    metrics.GaugeCallback(
+        "prediction_write_queue_pending",
+        "Prediction records waiting for the write-behind writer.",
+        _write_queue_stat("pending"),
+    )
+)
+for _key in ("written", "failures", "sync_writes", "dead_letters"):
+    metrics.registry.register(
+        metrics.GaugeCallback(
+            f"prediction_write_queue_{_key}_total",
+            f"Prediction write-behind {_key}.",
+            _write_queue_stat(_key),
+            metric_type="counter",
+        )
+    )
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus text exposition of request, stage, DB and model metrics."""
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+
 @app.errorhandler(Exception)
 def handle_exception(e):
     traceback.print_exc(file=sys.stdout)
@@ -88,6 +288,7 @@ def handle_exception(e):
 app.register_blueprint(user_api)
 app.register_blueprint(auth_api)
 app.register_blueprint(predict_api)
+app.register_blueprint(model_api)
 
 if __name__ == "__main__":
     app.run(debug=True)
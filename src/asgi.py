@@ -0,0 +1,483 @@
+"""
+Chế độ phục vụ ASGI: cùng các route của `user_api`, `auth_api` và `predict_api`
+nhưng handler là coroutine, truy vấn DB qua pool asyncpg và suy luận (CPU)
+chạy trong một thread pool có giới hạn. Một process giữ được hàng nghìn request
+đang chờ I/O mà không cần hàng nghìn thread.
+
+    pip install starlette asyncpg uvicorn
+    python -m src.asgi                         # hoặc: uvicorn src.asgi:app --port 5000
+
+Model phải có sẵn (chế độ này không train lúc khởi động; dùng `python -m src.app`
+hoặc `POST /model/train` để tạo model).
+"""
+
+import asyncio
+import json
+import os
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    from starlette.applications import Starlette
+    from starlette.responses import PlainTextResponse, Response, StreamingResponse
+    from starlette.routing import Route
+except ImportError as e:
+    raise ImportError(
+        "The ASGI server needs the optional packages starlette, asyncpg and uvicorn: "
+        "pip install starlette asyncpg uvicorn"
+    ) from e
+
+from src.controller.predict_controller import (
+    MAX_BATCH_SIZE,
+    USER_FEATURE_COLUMNS,
+    batch_entry_error,
+    build_patient_features,
+    health_predictor_instance,
+    run_prediction,
+)
+from src.controller.user_controller import USERS_STREAM_CHUNK, parse_users_page_args
+from src.data.dao.async_dao import AsyncMedicalRecordDAO, AsyncSymptomsDAO, AsyncUsersDAO
+from src.data.dao.symptoms_dao import SymptomsDAO
+from src.data.dao.users_dao import DuplicateUserError, UsersDAO
+from src.data.database.async_database import AsyncDatabaseClient
+from src.data.model.user_model import UserModel
+from src.data.persistence.write_behind import WRITE_BEHIND_CONFIG
+from src.ml.predict import ModelNotReadyError
+from src.util.user_util import user_to_dict
+
+ASGI_CONFIG = {
+    "host": os.environ.get("ASGI_HOST", "127.0.0.1"),
+    "port": int(os.environ.get("ASGI_PORT", 5000)),
+    # Số thread chạy suy luận song song
+    "inference_workers": int(os.environ.get("ASGI_INFERENCE_WORKERS", os.cpu_count() or 1)),
+    # Số suy luận tối đa được giao cho thread pool cùng lúc (đang chạy + đang chờ);
+    # request vượt quá thì chờ trong event loop thay vì làm đầy hàng đợi của pool
+    "max_pending_inference": int(os.environ.get("ASGI_MAX_PENDING_INFERENCE", 256)),
+    # Khoảng thời gian (giây) thử kết nối lại DB khi khởi động
+    "db_retry_interval": float(os.environ.get("STARTUP_DB_RETRY_INTERVAL", 2)),
+}
+
+inference_executor = ThreadPoolExecutor(
+    max_workers=ASGI_CONFIG["inference_workers"], thread_name_prefix="inference"
+)
+_inference_slots = None
+
+startup_state = {
+    "state": "starting",
+    "stage": None,
+    "error": None,
+    "started_at": datetime.now().isoformat(),
+    "finished_at": None,
+}
+
+
+# --- Responses ---
+def json_response(data, status_code=200, headers=None):
+    """JSON định dạng giống `jsonify` của Flask (ngày theo HTTP date, key sắp xếp)."""
+    body = json.dumps(data, default=DefaultJSONProvider.default, sort_keys=True)
+    return Response(body, status_code=status_code, headers=headers, media_type="application/json")
+
+
+def error_response(code, message, headers=None):
+    return json_response({"error_code": code, "error_message": message}, code, headers)
+
+
+def model_not_ready_response():
+    return error_response(
+        503,
+        "Prediction model is not available yet. Please retry shortly.",
+        {"Retry-After": "5"},
+    )
+
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+async def run_inference(fn, *args):
+    """Chạy `fn` (CPU) trong thread pool, giới hạn số việc đang giao cho pool."""
+    async with _inference_slots:
+        return await asyncio.get_running_loop().run_in_executor(inference_executor, fn, *args)
+
+
+def _as_date(value):
+    # asyncpg cần `date` cho cột DATE, psycopg2 thì nhận cả chuỗi ISO
+    return date.fromisoformat(value) if isinstance(value, str) and value else value
+
+
+# --- Startup ---
+def _set_startup_stage(stage):
+    print(f"🚀 Startup: {stage}")
+    startup_state["stage"] = stage
+
+
+async def initialize():
+    """Load model (ở thread pool) rồi kết nối DB, thử lại tới khi được."""
+    try:
+        _set_startup_stage("loading_model")
+        if os.path.exists(health_predictor_instance.model_file):
+            await asyncio.get_running_loop().run_in_executor(
+                inference_executor, health_predictor_instance.load_model
+            )
+        else:
+            print(
+                f"⚠️ Model file not found at '{health_predictor_instance.model_file}'. "
+                "Train it first; /predict returns 503 until then."
+            )
+
+        _set_startup_stage("connecting_database")
+        while True:
+            try:
+                await AsyncDatabaseClient.connect()
+                break
+            except Exception as e:
+                print(f"⚠️ Database unavailable, retrying in {ASGI_CONFIG['db_retry_interval']}s: {e}")
+                await asyncio.sleep(ASGI_CONFIG["db_retry_interval"])
+
+        if UsersDAO.cache is not None:
+            UsersDAO.cache.start()
+
+        if WRITE_BEHIND_CONFIG["enabled"]:
+            # Hàng đợi ghi nền dùng pool psycopg2 của Flask; ở đây /predict ghi trực tiếp
+            print(
+                "⚠️ PREDICT_WRITE_BEHIND is not supported in ASGI mode; /predict writes records "
+                f"synchronously and records pending in {WRITE_BEHIND_CONFIG['queue_path']} "
+                "are only flushed by the Flask server."
+            )
+
+        _set_startup_stage("done")
+        startup_state["state"] = "ready"
+    except Exception as e:
+        print(f"❌ Startup failed, the /predict endpoint will be unavailable: {e}")
+        traceback.print_exc(file=sys.stdout)
+        startup_state["state"] = "failed"
+        startup_state["error"] = str(e)
+    finally:
+        startup_state["finished_at"] = datetime.now().isoformat()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global _inference_slots
+    _inference_slots = asyncio.Semaphore(ASGI_CONFIG["max_pending_inference"])
+    startup_task = asyncio.create_task(initialize())
+    try:
+        yield
+    finally:
+        startup_task.cancel()
+        await AsyncDatabaseClient.disconnect()
+        inference_executor.shutdown(wait=False)
+
+
+# --- Health ---
+async def home(request):
+    return PlainTextResponse("Health predictor is running ...")
+
+
+async def healthz(request):
+    return json_response({"status": "ok", "startup": startup_state})
+
+
+async def readyz(request):
+    db_ok, db_error = await AsyncDatabaseClient.ping()
+    model = health_predictor_instance.model
+    ready = db_ok and model is not None
+    body = {
+        "status": "ready" if ready else "not_ready",
+        "startup": startup_state,
+        "database": {"ok": db_ok, "error": db_error},
+        "model": model.get_info() if model else None,
+    }
+    return json_response(body, 200 if ready else 503)
+
+
+async def stats(request):
+    return json_response(
+        {
+            "db_pool": AsyncDatabaseClient.get_pool_stats(),
+            "prediction_cache": health_predictor_instance.get_cache_stats(),
+            "user_cache": UsersDAO.cache.get_stats() if UsersDAO.cache else None,
+        }
+    )
+
+
+# --- Users ---
+async def get_all_users(request):
+    """Như GET /users của Flask: trang theo id, stream từ cursor asyncpg."""
+    try:
+        fields, after_id, limit, role = parse_users_page_args(request.query_params)
+    except ValueError as e:
+        return error_response(400, str(e))
+
+    pool_conn = await AsyncDatabaseClient.acquire()
+    transaction = pool_conn.transaction()
+    rows = None
+    try:
+        await transaction.start()
+        rows = AsyncUsersDAO.iter_users(pool_conn, fields, after_id=after_id, limit=limit, role=role)
+        # Chạy query trước khi gửi header để lỗi DB vẫn trả về mã lỗi bình thường
+        first_row = await anext(rows, None)
+    except BaseException:
+        if rows is not None:
+            await rows.aclose()
+        await transaction.rollback()
+        await AsyncDatabaseClient.pool.release(pool_conn)
+        raise
+
+    async def generate():
+        try:
+            count = 0
+            last_id = None
+            chunk = ['{"users":[']
+            row = first_row
+            while row is not None:
+                chunk.append(
+                    ("," if count else "")
+                    + json.dumps(dict(zip(fields, row)), default=DefaultJSONProvider.default, sort_keys=True)
+                )
+                count += 1
+                last_id = row[0]
+                if len(chunk) >= USERS_STREAM_CHUNK:
+                    yield "".join(chunk)
+                    chunk = []
+                row = await anext(rows, None)
+            next_after_id = last_id if count == limit else None
+            chunk.append(f'],"next_after_id":{json.dumps(next_after_id)}}}')
+            yield "".join(chunk)
+        finally:
+            await rows.aclose()
+            await transaction.rollback()
+            await AsyncDatabaseClient.pool.release(pool_conn)
+
+    return StreamingResponse(generate(), media_type="application/json")
+
+
+async def get_user(request):
+    async with AsyncDatabaseClient.acquire() as conn:
+        user = await AsyncUsersDAO.get_user_by_id(conn, request.path_params["user_id"])
+    if user:
+        return json_response(user_to_dict(user))
+    return json_response({"error": "User not found"}, 404)
+
+
+async def update_user(request):
+    data = await read_json(request) or {}
+    async with AsyncDatabaseClient.acquire() as conn:
+        # Đọc thẳng từ DB: object trong cache dùng chung, không được sửa tại chỗ
+        user = await AsyncUsersDAO.get_user_by_id(conn, request.path_params["user_id"], use_cache=False)
+        if not user:
+            return error_response(404, "User not found")
+
+        # Các trường required không được update
+        required_fields = {"id", "username", "email", "password", "role", "is_active"}
+        for key, value in data.items():
+            if key in required_fields:
+                continue
+            if hasattr(user, key):
+                setattr(user, key, value)
+        user.date_of_birth = _as_date(user.date_of_birth)
+
+        await AsyncUsersDAO.update_user(conn, user)
+    return json_response(user_to_dict(user))
+
+
+async def delete_user(request):
+    async with AsyncDatabaseClient.acquire() as conn:
+        success = await AsyncUsersDAO.delete_user(conn, request.path_params["user_id"])
+    if success:
+        return json_response({"success": True})
+    return json_response({"error": "User not found"}, 404)
+
+
+# --- Auth ---
+async def signup(request):
+    data = await read_json(request) or {}
+    for field in ["username", "email", "password", "role"]:
+        if not data.get(field):
+            return error_response(400, f"Missing required field: {field}")
+
+    user = UserModel(
+        id=None,
+        username=data.get("username"),
+        email=data.get("email"),
+        password=data.get("password"),
+        first_name=data.get("first_name"),
+        last_name=data.get("last_name"),
+        date_of_birth=_as_date(data.get("date_of_birth")),
+        gender=data.get("gender"),
+        phone=data.get("phone"),
+        address=data.get("address"),
+        current_latitude=data.get("current_latitude"),
+        current_longitude=data.get("current_longitude"),
+        current_diseases=data.get("current_diseases"),
+        role=data.get("role"),
+        is_active=True,
+    )
+    try:
+        async with AsyncDatabaseClient.acquire() as conn:
+            user = await AsyncUsersDAO.create_user(conn, user)
+        return json_response(user_to_dict(user), 201)
+    except DuplicateUserError as e:
+        return error_response(409, str(e))
+    except Exception as e:
+        return error_response(500, str(e))
+
+
+async def login(request):
+    data = await read_json(request) or {}
+    username = data.get("username")
+    password = data.get("password")
+    if not username or not password:
+        return error_response(400, "Missing username or password")
+
+    async with AsyncDatabaseClient.acquire() as conn:
+        user, password_ok = await AsyncUsersDAO.authenticate(conn, username, password)
+    if not user:
+        return error_response(404, "User not found")
+    if not password_ok:
+        return error_response(401, "Invalid credentials")
+    return json_response(user_to_dict(user))
+
+
+# --- Prediction ---
+async def predict(request):
+    """
+    Như POST /predict của Flask: mã triệu chứng được kiểm tra trên cache danh mục
+    trước khi suy luận; câu INSERT vẫn kiểm tra lại phòng khi cache đã cũ.
+    """
+    if not health_predictor_instance.is_ready():
+        return model_not_ready_response()
+
+    data = await read_json(request) or {}
+    user_id = data.get("user_id")
+    symptom_codes = data.get("symptom_codes")
+    if not user_id or not isinstance(user_id, int):
+        return error_response(400, "Missing or invalid user_id")
+    if not symptom_codes or not isinstance(symptom_codes, list):
+        return error_response(400, "Missing or invalid symptom_codes list")
+
+    async with AsyncDatabaseClient.acquire() as conn:
+        invalid_codes = await AsyncSymptomsDAO.get_invalid_symptom_codes(conn, symptom_codes)
+        if invalid_codes:
+            return error_response(400, f"Invalid symptom codes provided: {invalid_codes}")
+        user = await AsyncUsersDAO.get_user_by_id(conn, user_id, columns=USER_FEATURE_COLUMNS)
+    if not user:
+        return error_response(404, "User not found")
+
+    try:
+        patient_features, context = build_patient_features(user, symptom_codes)
+        # Không giữ connection trong lúc suy luận
+        prediction_result = await run_inference(run_prediction, patient_features)
+        if not prediction_result:
+            raise Exception("Prediction failed")
+
+        async with AsyncDatabaseClient.acquire() as conn:
+            record_id, invalid_codes = await AsyncMedicalRecordDAO.create_prediction_record(
+                conn,
+                user_id=user_id,
+                weather_temp=context["weather_temp"],
+                humidity=context["humidity"],
+                air_quality_index=context["air_quality_index"],
+                season=context["season"],
+                symptom_codes=symptom_codes,
+                disease_predictions=dict(prediction_result.get("sorted_predictions", [])),
+            )
+    except Exception as e:
+        print(f"❌ Prediction and record creation failed: {e}")
+        return error_response(500, f"An internal error occurred: {e}")
+
+    if invalid_codes:
+        # Danh mục trong cache đã cũ so với bảng symptoms
+        SymptomsDAO.vocabulary.invalidate()
+        return error_response(400, f"Invalid symptom codes provided: {invalid_codes}")
+    prediction_result["medical_record_id"] = record_id
+    return json_response(prediction_result)
+
+
+async def predict_batch(request):
+    """Như POST /predict/batch của Flask; user và mã triệu chứng được kiểm tra bằng hai query cho cả batch."""
+    if not health_predictor_instance.is_ready():
+        return model_not_ready_response()
+
+    data = await read_json(request) or {}
+    patients = data.get("patients")
+    if not patients or not isinstance(patients, list):
+        return error_response(400, "Missing or invalid patients list")
+    if len(patients) > MAX_BATCH_SIZE:
+        return error_response(413, f"Batch too large: at most {MAX_BATCH_SIZE} patients per request")
+
+    errors = [batch_entry_error(entry) for entry in patients]
+    valid_entries = [entry for entry, error in zip(patients, errors) if error is None]
+
+    async with AsyncDatabaseClient.acquire() as conn:
+        users = await AsyncUsersDAO.get_users_by_ids(
+            conn, {entry["user_id"] for entry in valid_entries}, columns=USER_FEATURE_COLUMNS
+        )
+        all_codes = list(dict.fromkeys(code for entry in valid_entries for code in entry["symptom_codes"]))
+        unknown_codes = set(await AsyncSymptomsDAO.get_invalid_symptom_codes(conn, all_codes))
+
+    results = [None] * len(patients)
+    features_to_score = []
+    positions = []
+    for i, (entry, error) in enumerate(zip(patients, errors)):
+        if error is None:
+            user = users.get(entry["user_id"])
+            invalid_codes = [code for code in entry["symptom_codes"] if code in unknown_codes]
+            if not user:
+                error = "User not found"
+            elif invalid_codes:
+                error = f"Invalid symptom codes provided: {invalid_codes}"
+        if error is not None:
+            results[i] = {"patient_id": i, "error": error}
+            continue
+        patient_features, _ = build_patient_features(user, entry["symptom_codes"])
+        features_to_score.append(patient_features)
+        positions.append(i)
+
+    batch_results = await run_inference(health_predictor_instance.predict_batch, features_to_score)
+    for i, result in zip(positions, batch_results):
+        result["patient_id"] = i
+        result["user_id"] = patients[i]["user_id"]
+        results[i] = result
+    return json_response({"results": results})
+
+
+async def handle_exception(request, exc):
+    if isinstance(exc, ModelNotReadyError):
+        return model_not_ready_response()
+    traceback.print_exc(file=sys.stdout)
+    code = getattr(exc, "code", 500)
+    return error_response(code if isinstance(code, int) else 500, str(exc))
+
+
+app = Starlette(
+    routes=[
+        Route("/", home),
+        Route("/healthz", healthz),
+        Route("/readyz", readyz),
+        Route("/stats", stats),
+        Route("/users", get_all_users, methods=["GET"]),
+        Route("/users/{user_id:int}", get_user, methods=["GET"]),
+        Route("/users/{user_id:int}", update_user, methods=["PUT"]),
+        Route("/users/{user_id:int}", delete_user, methods=["DELETE"]),
+        Route("/signup", signup, methods=["POST"]),
+        Route("/login", login, methods=["POST"]),
+        Route("/predict", predict, methods=["POST"]),
+        Route("/predict/batch", predict_batch, methods=["POST"]),
+    ],
+    exception_handlers={Exception: handle_exception},
+    lifespan=lifespan,
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=ASGI_CONFIG["host"], port=ASGI_CONFIG["port"])
@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify
-from src.data.dao.users_dao import UsersDAO
+from src.data.dao.users_dao import DuplicateUserError, UsersDAO
 from src.data.model.user_model import UserModel
 from src.util.user_util import user_to_dict
 
@@ -22,17 +22,6 @@ def signup():
                 400,
             )
 
-    if UsersDAO.get_user_by_username(data.get("username")):
-        return (
-            jsonify({"error_code": 409, "error_message": "Username already exists"}),
-            409,
-        )
-    if UsersDAO.get_user_by_email(data.get("email")):
-        return (
-            jsonify({"error_code": 409, "error_message": "Email already exists"}),
-            409,
-        )
-
     user = UserModel(
         id=None,
         username=data.get("username"),
@@ -53,6 +42,9 @@ def signup():
     try:
         user = UsersDAO.create_user(user)
         return jsonify(user_to_dict(user)), 201
+    except DuplicateUserError as e:
+        # Trùng username/email do constraint UNIQUE phát hiện, không cần kiểm tra trước
+        return jsonify({"error_code": 409, "error_message": str(e)}), 409
     except Exception as e:
         return jsonify({"error_code": 500, "error_message": str(e)}), 500
 
@@ -73,11 +65,11 @@ def login():
             400,
         )
 
-    user = UsersDAO.get_user_by_username(username)
+    user, password_ok = UsersDAO.authenticate(username, password)
     if not user:
         return jsonify({"error_code": 404, "error_message": "User not found"}), 404
 
-    if user.password != password:
+    if not password_ok:
         return jsonify({"error_code": 401, "error_message": "Invalid credentials"}), 401
 
     return jsonify(user_to_dict(user)), 200
@@ -0,0 +1,44 @@
+from flask import Blueprint, request, jsonify
+from src.controller.predict_controller import health_predictor_instance
+from src.ml.training_worker import TrainingJobRunner
+
+model_api = Blueprint("model_api", __name__)
+
+training_runner = TrainingJobRunner(health_predictor_instance)
+
+
+def training_options_error(data):
+    """Thông báo lỗi nếu body của POST /model/train không hợp lệ, ngược lại None."""
+    if not isinstance(data, dict):
+        return "Request body must be a JSON object"
+    for field in ("incremental", "streaming"):
+        if data.get(field) is not None and not isinstance(data[field], bool):
+            return f"Invalid {field}: must be true, false or null"
+    triggered_by = data.get("triggered_by")
+    if triggered_by is not None and (not isinstance(triggered_by, int) or isinstance(triggered_by, bool)):
+        return "Invalid triggered_by: must be a user id or null"
+    return None
+
+
+@model_api.route("/model/train", methods=["POST"])
+def start_training():
+    data = request.get_json(silent=True) or {}
+    error = training_options_error(data)
+    if error is not None:
+        return jsonify({"error_code": 400, "error_message": error}), 400
+    started = training_runner.start(
+        incremental=data.get("incremental"),
+        streaming=data.get("streaming"),
+        triggered_by=data.get("triggered_by"),
+    )
+    if not started:
+        return (
+            jsonify({"error_code": 409, "error_message": "A training job is already running"}),
+            409,
+        )
+    return jsonify(training_runner.get_status()), 202
+
+
+@model_api.route("/model/train/status", methods=["GET"])
+def training_status():
+    return jsonify(training_runner.get_status())
@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime
+import atexit
 import random
 import logging
+import os
 
 from src.data.dao.users_dao import UsersDAO
 from src.data.dao.medical_record_dao import MedicalRecordDAO
@@ -9,10 +11,52 @@ from src.data.dao.symptoms_dao import SymptomsDAO
 from src.data.dao.diseases_dao import DiseasesDAO
 from src.data.database.database import DatabaseClient
 from src.ml.predict import HealthPredictor
+from src.ml.micro_batcher import MicroBatcher
+from src.ml.model_store import resolve_current_model
+from src.data.persistence.write_behind import WRITE_BEHIND_CONFIG, PredictionWriteQueue
+from src.util.metrics import timed_stage
 
 predict_api = Blueprint("predict_api", __name__)
 
-health_predictor_instance = HealthPredictor()
+# Số bệnh nhân tối đa trong một request /predict/batch
+MAX_BATCH_SIZE = 10000
+
+MICRO_BATCH_CONFIG = {
+    # Gom các request /predict đồng thời thành một lần predict_proba
+    "enabled": os.environ.get("PREDICT_MICRO_BATCHING", "0") == "1",
+    "max_batch_size": int(os.environ.get("PREDICT_MICRO_BATCH_MAX_SIZE", 32)),
+    "max_wait_ms": float(os.environ.get("PREDICT_MICRO_BATCH_MAX_WAIT_MS", 5)),
+}
+
+# Cột users cần để dựng feature cho bệnh nhân
+USER_FEATURE_COLUMNS = ("id", "date_of_birth", "gender")
+
+health_predictor_instance = HealthPredictor(model_file=resolve_current_model())
+
+micro_batcher = (
+    MicroBatcher(
+        health_predictor_instance,
+        max_batch_size=MICRO_BATCH_CONFIG["max_batch_size"],
+        max_wait_ms=MICRO_BATCH_CONFIG["max_wait_ms"],
+    )
+    if MICRO_BATCH_CONFIG["enabled"]
+    else None
+)
+
+write_queue = (
+    PredictionWriteQueue(
+        WRITE_BEHIND_CONFIG["queue_path"],
+        max_pending=WRITE_BEHIND_CONFIG["max_pending"],
+        batch_size=WRITE_BEHIND_CONFIG["batch_size"],
+        flush_interval_ms=WRITE_BEHIND_CONFIG["flush_interval_ms"],
+        enqueue_timeout=WRITE_BEHIND_CONFIG["enqueue_timeout"],
+        id_block_size=WRITE_BEHIND_CONFIG["id_block_size"],
+    )
+    if WRITE_BEHIND_CONFIG["enabled"]
+    else None
+)
+if write_queue is not None:
+    atexit.register(write_queue.close)
 
 
 def get_current_season():
@@ -28,18 +72,96 @@ def get_current_season():
         return "autumn"
 
 
+def build_patient_features(user, symptom_codes):
+    """
+    Builds the model feature dict for a patient plus the environment context
+    (weather, season) that is stored alongside the medical record.
+    """
+    context = {
+        "weather_temp": round(random.uniform(10.0, 40.0), 1),
+        "humidity": random.randint(30, 90),
+        "air_quality_index": random.randint(1, 5),
+        "season": get_current_season(),
+    }
+
+    patient_features = {
+        "age": (
+            datetime.now().year - user.date_of_birth.year
+            if user.date_of_birth
+            else 30
+        ),
+        "gender": {"male": 1, "female": 0, "other": 2}.get(user.gender, 2),
+        "weather_temp": context["weather_temp"],
+        "humidity": context["humidity"],
+        "air_quality_index": context["air_quality_index"],
+        "season": {"spring": 0, "summer": 1, "autumn": 2, "winter": 3}.get(
+            context["season"], 0
+        ),
+    }
+    for code in symptom_codes:
+        patient_features[code] = 1
+    return patient_features, context
+
+
+def model_not_ready_response():
+    return (
+        jsonify(
+            {
+                "error_code": 503,
+                "error_message": "Prediction model is not available yet. Please retry shortly.",
+            }
+        ),
+        503,
+        {"Retry-After": "5"},
+    )
+
+
+def run_prediction(patient_features):
+    """Scores one patient, through the micro-batcher when it is enabled."""
+    if micro_batcher is not None:
+        return micro_batcher.submit(patient_features)
+    return health_predictor_instance.predict_single(patient_features)
+
+
+def top_disease_predictions(prediction_result):
+    """Maps the top predictions to `{disease_id: probability}` for persisting."""
+    top_3_predictions = prediction_result.get("sorted_predictions", [])
+    if not top_3_predictions:
+        return {}
+    disease_map = DiseasesDAO.get_disease_ids_by_codes([pred[0] for pred in top_3_predictions])
+    return {
+        disease_map[code]: prob
+        for code, prob in top_3_predictions
+        if code in disease_map
+    }
+
+
+def enqueue_prediction_record(user_id, symptom_codes, context, prediction_result):
+    """
+    Write-behind mode: queues the medical record for the background writer and
+    returns its pre-allocated id without waiting for the database writes.
+    """
+    symptom_ids = list(SymptomsDAO.get_symptom_ids_by_codes(symptom_codes).values())
+    return write_queue.submit(
+        {
+            "user_id": user_id,
+            "weather_temp": context["weather_temp"],
+            "humidity": context["humidity"],
+            "air_quality_index": context["air_quality_index"],
+            "season": context["season"],
+            "symptom_ids": symptom_ids,
+            "diseases": [
+                [disease_id, prob]
+                for disease_id, prob in top_disease_predictions(prediction_result).items()
+            ],
+        }
+    )
+
+
 @predict_api.route("/predict", methods=["POST"])
 def predict():
-    if health_predictor_instance is None:
-        return (
-            jsonify(
-                {
-                    "error_code": 503,
-                    "error_message": "Prediction model is not available. Please train the model first.",
-                }
-            ),
-            503,
-        )
+    if not health_predictor_instance.is_ready():
+        return model_not_ready_response()
 
     data = request.json
     user_id = data.get("user_id")
@@ -61,81 +183,90 @@ def predict():
             400,
         )
 
-    user = UsersDAO.get_user_by_id(user_id)
+    with timed_stage("validate_symptoms"):
+        invalid_codes = SymptomsDAO.get_invalid_symptom_codes(symptom_codes)
+    if invalid_codes:
+        return (
+            jsonify(
+                {
+                    "error_code": 400,
+                    "error_message": f"Invalid symptom codes provided: {invalid_codes}",
+                }
+            ),
+            400,
+        )
+
+    with timed_stage("user_lookup"):
+        user = UsersDAO.get_user_by_id(user_id, columns=USER_FEATURE_COLUMNS)
     if not user:
         return jsonify({"error_code": 404, "error_message": "User not found"}), 404
 
-    conn = DatabaseClient.connection
+    if write_queue is not None:
+        try:
+            with timed_stage("feature_build"):
+                patient_features, context = build_patient_features(user, symptom_codes)
+            with timed_stage("inference"):
+                prediction_result = run_prediction(patient_features)
+            if not prediction_result:
+                raise Exception("Prediction failed")
+            with timed_stage("record_enqueue"):
+                prediction_result["medical_record_id"] = enqueue_prediction_record(
+                    user_id, symptom_codes, context, prediction_result
+                )
+            return jsonify(prediction_result), 200
+        except Exception as e:
+            logging.error(f"Prediction and record creation failed: {e}")
+            return (
+                jsonify(
+                    {
+                        "error_code": 500,
+                        "error_message": f"An internal error occurred: {e}",
+                    }
+                ),
+                500,
+            )
+
+    conn = DatabaseClient.get_connection()
     cursor = conn.cursor()
 
     try:
         # --- 1. Perform Prediction ---
-        weather_temp = round(random.uniform(10.0, 40.0), 1)
-        humidity = random.randint(30, 90)
-        air_quality_index = random.randint(1, 5)
-        season_name = get_current_season()
-
-        patient_features = {
-            "age": (
-                datetime.now().year - user.date_of_birth.year
-                if user.date_of_birth
-                else 30
-            ),
-            "gender": {"male": 1, "female": 0, "other": 2}.get(user.gender, 2),
-            "weather_temp": weather_temp,
-            "humidity": humidity,
-            "air_quality_index": air_quality_index,
-            "season": {"spring": 0, "summer": 1, "autumn": 2, "winter": 3}.get(
-                season_name, 0
-            ),
-        }
-        for code in symptom_codes:
-            patient_features[code] = 1
-
-        prediction_result = health_predictor_instance.predict_single(patient_features)
+        with timed_stage("feature_build"):
+            patient_features, context = build_patient_features(user, symptom_codes)
+        with timed_stage("inference"):
+            prediction_result = run_prediction(patient_features)
         if not prediction_result:
             raise Exception("Prediction failed")
 
-        # --- 2. Create Medical Record ---
-        record_id = MedicalRecordDAO.create_medical_record(
-            user_id=user_id,
-            weather_temp=weather_temp,
-            humidity=humidity,
-            air_quality_index=air_quality_index,
-            season=season_name,
-            cursor=cursor,
-        )
-
-        # --- 3. Add Symptoms ---
-        symptom_map = SymptomsDAO.get_symptom_ids_by_codes(symptom_codes)
-        symptom_ids = list(symptom_map.values())
-        if len(symptom_ids) != len(symptom_codes):
-            found_codes = list(symptom_map.keys())
-            invalid_codes = [code for code in symptom_codes if code not in found_codes]
-            raise ValueError(f"Invalid symptom codes provided: {invalid_codes}")
-
-        MedicalRecordDAO.add_symptoms_to_record(record_id, symptom_ids, cursor=cursor)
-
-        # --- 4. Add Top 3 Disease Predictions ---
-        top_3_predictions = prediction_result.get("sorted_predictions", [])
-
-        if top_3_predictions:
-            top_3_disease_codes = [pred[0] for pred in top_3_predictions]
-            disease_map = DiseasesDAO.get_disease_ids_by_codes(top_3_disease_codes)
+        # --- 2. Create Medical Record with its Symptoms and Top 3 Disease Predictions ---
+        with timed_stage("record_insert"):
+            record_id, invalid_codes = MedicalRecordDAO.create_prediction_record(
+                user_id=user_id,
+                weather_temp=context["weather_temp"],
+                humidity=context["humidity"],
+                air_quality_index=context["air_quality_index"],
+                season=context["season"],
+                symptom_codes=symptom_codes,
+                disease_predictions=dict(prediction_result.get("sorted_predictions", [])),
+                cursor=cursor,
+            )
+        if invalid_codes:
+            # Danh mục trong cache đã cũ so với bảng symptoms
+            conn.rollback()
+            SymptomsDAO.vocabulary.invalidate()
+            return (
+                jsonify(
+                    {
+                        "error_code": 400,
+                        "error_message": f"Invalid symptom codes provided: {invalid_codes}",
+                    }
+                ),
+                400,
+            )
 
-            disease_predictions_to_save = {
-                disease_map[code]: prob
-                for code, prob in top_3_predictions
-                if code in disease_map
-            }
-
-            if disease_predictions_to_save:
-                MedicalRecordDAO.add_diseases_to_record(
-                    record_id, disease_predictions_to_save, cursor=cursor
-                )
-
-        # --- 5. Commit Transaction ---
-        conn.commit()
+        # --- 3. Commit Transaction ---
+        with timed_stage("commit"):
+            conn.commit()
 
         prediction_result["medical_record_id"] = record_id
         return jsonify(prediction_result), 200
@@ -154,3 +285,82 @@ def predict():
         )
     finally:
         cursor.close()
+
+
+def batch_entry_error(entry):
+    """Validation error of one /predict/batch entry, or None if it is well-formed."""
+    if not isinstance(entry, dict):
+        return "Invalid patient entry"
+    user_id = entry.get("user_id")
+    if not user_id or not isinstance(user_id, int):
+        return "Missing or invalid user_id"
+    symptom_codes = entry.get("symptom_codes")
+    if not symptom_codes or not isinstance(symptom_codes, list):
+        return "Missing or invalid symptom_codes list"
+    return None
+
+
+@predict_api.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    """
+    Scores many patients in one request. Expects
+    `{"patients": [{"user_id": int, "symptom_codes": [str]}, ...]}` and returns
+    one result per patient, in order; invalid entries carry an `error` field
+    instead of failing the whole batch. Batch predictions are not persisted as
+    medical records.
+    """
+    if not health_predictor_instance.is_ready():
+        return model_not_ready_response()
+
+    data = request.json or {}
+    patients = data.get("patients")
+    if not patients or not isinstance(patients, list):
+        return (
+            jsonify({"error_code": 400, "error_message": "Missing or invalid patients list"}),
+            400,
+        )
+    if len(patients) > MAX_BATCH_SIZE:
+        return (
+            jsonify(
+                {
+                    "error_code": 413,
+                    "error_message": f"Batch too large: at most {MAX_BATCH_SIZE} patients per request",
+                }
+            ),
+            413,
+        )
+
+    errors = [batch_entry_error(entry) for entry in patients]
+    valid_entries = [entry for entry, error in zip(patients, errors) if error is None]
+
+    with timed_stage("user_lookup"):
+        users = UsersDAO.get_users_by_ids(
+            {entry["user_id"] for entry in valid_entries}, columns=USER_FEATURE_COLUMNS
+        )
+
+    results = [None] * len(patients)
+    features_to_score = []
+    positions = []
+    for i, (entry, error) in enumerate(zip(patients, errors)):
+        if error is None:
+            user = users.get(entry["user_id"])
+            invalid_codes = SymptomsDAO.get_invalid_symptom_codes(entry["symptom_codes"])
+            if not user:
+                error = "User not found"
+            elif invalid_codes:
+                error = f"Invalid symptom codes provided: {invalid_codes}"
+        if error is not None:
+            results[i] = {"patient_id": i, "error": error}
+            continue
+        patient_features, _ = build_patient_features(user, entry["symptom_codes"])
+        features_to_score.append(patient_features)
+        positions.append(i)
+
+    with timed_stage("inference"):
+        batch_results = health_predictor_instance.predict_batch(features_to_score)
+    for i, result in zip(positions, batch_results):
+        result["patient_id"] = i
+        result["user_id"] = patients[i]["user_id"]
+        results[i] = result
+
+    return jsonify({"results": results}), 200
@@ -1,16 +1,83 @@
 import datetime
-from flask import Blueprint, request, jsonify
-from src.data.dao.users_dao import UsersDAO
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from src.data.dao.users_dao import USER_PUBLIC_COLUMNS, UsersDAO
 from src.data.model.user_model import UserModel
 from src.util.user_util import user_to_dict
 
 user_api = Blueprint("user_api", __name__)
 
+# Số user mặc định / tối đa trong một trang của GET /users
+USERS_PAGE_DEFAULT_LIMIT = 100
+USERS_PAGE_MAX_LIMIT = 1000
+# Số user gộp vào một lần ghi khi stream response
+USERS_STREAM_CHUNK = 200
+
+
+def parse_users_page_args(args):
+    """
+    Reads the GET /users query parameters into `(fields, after_id, limit, role)`.
+    Raises ValueError with a client-facing message when they are invalid.
+    """
+    try:
+        limit = int(args.get("limit", USERS_PAGE_DEFAULT_LIMIT))
+        after_id = args.get("after_id")
+        after_id = int(after_id) if after_id else None
+    except ValueError:
+        raise ValueError("limit and after_id must be integers")
+    if not 1 <= limit <= USERS_PAGE_MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {USERS_PAGE_MAX_LIMIT}")
+
+    fields = USER_PUBLIC_COLUMNS
+    if args.get("fields"):
+        requested = [name.strip() for name in args["fields"].split(",") if name.strip()]
+        invalid = [name for name in requested if name not in USER_PUBLIC_COLUMNS]
+        if invalid:
+            raise ValueError(f"Unknown fields: {invalid}")
+        fields = ("id",) + tuple(dict.fromkeys(name for name in requested if name != "id"))
+    return fields, after_id, limit, args.get("role")
+
+
+def _bad_request(message):
+    return jsonify({"error_code": 400, "error_message": message}), 400
+
 
 @user_api.route("/users", methods=["GET"])
 def get_all_users():
-    users = UsersDAO.get_all_users()
-    return jsonify([user_to_dict(user) for user in users])
+    """
+    Lists users one page at a time, ordered by id. Query parameters:
+    `limit` (default 100, at most 1000), `after_id` (the `next_after_id` of the
+    previous page), `role` and `fields` (comma-separated columns; `id` is always
+    included). The body `{"users": [...], "next_after_id": id | null}` is
+    streamed from a server-side cursor, so memory does not grow with the page.
+    """
+    try:
+        fields, after_id, limit, role = parse_users_page_args(request.args)
+    except ValueError as e:
+        return _bad_request(str(e))
+
+    rows = UsersDAO.iter_users(fields, after_id=after_id, limit=limit, role=role)
+    # Chạy query trước khi gửi header để lỗi DB vẫn trả về mã lỗi bình thường
+    first_row = next(rows, None)
+
+    def generate():
+        dumps = current_app.json.dumps
+        count = 0
+        last_id = None
+        chunk = ['{"users":[']
+        row = first_row
+        while row is not None:
+            chunk.append(("," if count else "") + dumps(dict(zip(fields, row))))
+            count += 1
+            last_id = row[0]
+            if len(chunk) >= USERS_STREAM_CHUNK:
+                yield "".join(chunk)
+                chunk = []
+            row = next(rows, None)
+        next_after_id = last_id if count == limit else None
+        chunk.append(f'],"next_after_id":{dumps(next_after_id)}}}')
+        yield "".join(chunk)
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
 
 
 @user_api.route("/users/<int:user_id>", methods=["GET"])
@@ -24,7 +91,8 @@ def get_user(user_id):
 @user_api.route("/users/<int:user_id>", methods=["PUT"])
 def update_user(user_id):
     data = request.json
-    user = UsersDAO.get_user_by_id(user_id)
+    # Đọc thẳng từ DB: object trong cache dùng chung, không được sửa tại chỗ
+    user = UsersDAO.get_user_by_id(user_id, use_cache=False)
     if not user:
         return jsonify({"error_code": 404, "error_message": "User not found"}), 404
 
@@ -0,0 +1,197 @@
+import os
+import select
+import threading
+import time
+import traceback
+from collections import OrderedDict
+import psycopg2
+import psycopg2.extensions
+from ..database.database import DATABASE_CONFIG
+
+USER_CACHE_CONFIG = {
+    # Số user tối đa giữ trong cache (LRU); 0 = tắt cache
+    "max_size": int(os.environ.get("USER_CACHE_SIZE", 0)),
+    # Thời gian sống (giây) của một user trong cache
+    "ttl": float(os.environ.get("USER_CACHE_TTL", 60)),
+    # "local": chỉ xoá cache của process đang sửa user; "notify": xoá ở mọi
+    # process qua LISTEN/NOTIFY của Postgres
+    "invalidation": os.environ.get("USER_CACHE_INVALIDATION", "local"),
+}
+
+USER_CACHE_CHANNEL = "user_cache_invalidate"
+
+
+class LocalInvalidationBus:
+    """Không phát đi đâu: process khác chỉ thấy thay đổi khi hết TTL."""
+
+    def publish(self, user_id, cursor):
+        pass
+
+    async def publish_async(self, user_id, conn):
+        pass
+
+    def start(self, on_invalidate):
+        pass
+
+
+class PostgresInvalidationBus:
+    """
+    Phát id user bị sửa/xoá bằng `pg_notify` trong cùng transaction (Postgres
+    chỉ gửi khi commit) và nghe kênh đó bằng một connection riêng ở thread nền.
+    Khi mất kết nối thì xoá toàn bộ cache vì có thể đã lỡ thông báo.
+    """
+
+    def __init__(self, channel=USER_CACHE_CHANNEL, config=DATABASE_CONFIG, retry_interval=2.0):
+        self.channel = channel
+        self.config = config
+        self.retry_interval = retry_interval
+        self._thread = None
+
+    def publish(self, user_id, cursor):
+        cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, str(user_id)))
+
+    async def publish_async(self, user_id, conn):
+        """Như `publish`, trên một connection asyncpg (chế độ ASGI)."""
+        await conn.execute("SELECT pg_notify($1, $2)", self.channel, str(user_id))
+
+    def start(self, on_invalidate):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(
+            target=self._listen, args=(on_invalidate,), name="user-cache-listener", daemon=True
+        )
+        self._thread.start()
+
+    def _listen(self, on_invalidate):
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.config)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                # Thông báo gửi trong lúc chưa nghe đã bị lỡ
+                on_invalidate(None)
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        on_invalidate(int(notify.payload))
+            except Exception:
+                traceback.print_exc()
+                on_invalidate(None)
+                time.sleep(self.retry_interval)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+class UserCache:
+    """
+    Cache user theo id (kèm chỉ mục username -> id), giới hạn số phần tử (LRU)
+    và thời gian sống. Object trả về được dùng chung giữa các request nên không
+    được sửa trực tiếp; muốn sửa thì đọc thẳng từ DB.
+
+    `generation()` đọc trước khi query DB rồi truyền cho `put()`, để kết quả đọc
+    được trước một lần invalidate không bị đưa lại vào cache.
+    """
+
+    def __init__(self, max_size, ttl, bus=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.bus = bus or LocalInvalidationBus()
+        self._users = OrderedDict()  # id -> (user, expires_at)
+        self._ids_by_username = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    def start(self):
+        """Bắt đầu nhận invalidate từ process khác (nếu bus hỗ trợ)."""
+        self.bus.start(self.invalidate)
+
+    def generation(self):
+        return self._generation
+
+    def _get(self, user_id):
+        entry = self._users.get(user_id)
+        if entry is not None:
+            user, expires_at = entry
+            if time.monotonic() < expires_at:
+                self._users.move_to_end(user_id)
+                self._hits += 1
+                return user
+            self._remove(user_id)
+        self._misses += 1
+        return None
+
+    def get_by_id(self, user_id):
+        with self._lock:
+            return self._get(user_id)
+
+    def get_by_username(self, username):
+        with self._lock:
+            user_id = self._ids_by_username.get(username)
+            if user_id is None:
+                self._misses += 1
+                return None
+            return self._get(user_id)
+
+    def put(self, user, generation):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._remove(user.id)
+            self._users[user.id] = (user, time.monotonic() + self.ttl)
+            self._ids_by_username[user.username] = user.id
+            while len(self._users) > self.max_size:
+                self._remove(next(iter(self._users)))
+
+    def _remove(self, user_id):
+        entry = self._users.pop(user_id, None)
+        if entry is not None:
+            self._ids_by_username.pop(entry[0].username, None)
+
+    def publish_invalidation(self, user_id, cursor):
+        """Gọi trong transaction sửa/xoá user, trước khi commit."""
+        self.bus.publish(user_id, cursor)
+
+    async def publish_invalidation_async(self, user_id, conn):
+        await self.bus.publish_async(user_id, conn)
+
+    def invalidate(self, user_id=None):
+        """Xoá một user (hoặc toàn bộ nếu `user_id` là None) khỏi cache của process này."""
+        with self._lock:
+            self._generation += 1
+            self._invalidations += 1
+            if user_id is None:
+                self._users.clear()
+                self._ids_by_username.clear()
+            else:
+                self._remove(user_id)
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._users),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else None,
+                "invalidations": self._invalidations,
+                "invalidation": type(self.bus).__name__,
+            }
+
+
+def create_user_cache(config=USER_CACHE_CONFIG):
+    """Cache theo cấu hình, hoặc None nếu tắt."""
+    if not config["max_size"]:
+        return None
+    bus = PostgresInvalidationBus() if config["invalidation"] == "notify" else LocalInvalidationBus()
+    return UserCache(config["max_size"], config["ttl"], bus)
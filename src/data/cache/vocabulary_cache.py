@@ -0,0 +1,102 @@
+import asyncio
+import os
+import threading
+import time
+from psycopg2 import sql
+from ..database.database import DatabaseClient
+
+# Thời gian sống (giây) của cache mã -> id; để trống = không hết hạn
+VOCABULARY_CACHE_TTL = (
+    float(os.environ["VOCABULARY_CACHE_TTL"]) if os.environ.get("VOCABULARY_CACHE_TTL") else None
+)
+
+_LOAD_QUERY = "SELECT id, code FROM {} WHERE code IS NOT NULL ORDER BY id"
+
+
+class VocabularyCache:
+    """
+    In-memory code -> id map for a small, rarely changing lookup table
+    (`symptoms`, `diseases`). Loaded once (at startup or on first use) and
+    served from memory until `invalidate()` is called or the TTL expires.
+    """
+
+    def __init__(self, table, ttl=None):
+        self.table = table
+        self.ttl = ttl
+        # (map mã -> id, thời điểm load); thay cả tuple một lần để đọc không cần lock
+        self._snapshot = None
+        self._lock = threading.Lock()
+        # Khóa của event loop (chế độ ASGI), tạo khi cần
+        self._async_lock = None
+
+    def load(self):
+        """(Re)loads the whole table from the database."""
+        query = sql.SQL(_LOAD_QUERY).format(sql.Identifier(self.table))
+        conn = DatabaseClient.get_connection()
+        with conn.cursor() as cursor:
+            cursor.execute(query)
+            return self.prime(cursor.fetchall())
+
+    async def load_async(self, conn):
+        """Như `load()` nhưng qua một connection asyncpg (chế độ ASGI)."""
+        quoted_table = '"' + self.table.replace('"', '""') + '"'
+        return self.prime(await conn.fetch(_LOAD_QUERY.format(quoted_table)))
+
+    def prime(self, rows):
+        """Replaces the cached map with `(id, code)` rows without querying the database."""
+        ids_by_code = {code: id for id, code in rows}
+        self._snapshot = (ids_by_code, time.monotonic())
+        return ids_by_code
+
+    def invalidate(self):
+        """Drops the cached map; the next lookup reloads it."""
+        self._snapshot = None
+
+    def _fresh_map(self):
+        """Returns the cached map if it is loaded and not expired, else None."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        ids_by_code, loaded_at = snapshot
+        if self.ttl is not None and time.monotonic() - loaded_at >= self.ttl:
+            return None
+        return ids_by_code
+
+    def _get_map(self):
+        ids_by_code = self._fresh_map()
+        if ids_by_code is None:
+            with self._lock:
+                ids_by_code = self._fresh_map()
+                if ids_by_code is None:
+                    ids_by_code = self.load()
+        return ids_by_code
+
+    def get_ids_by_codes(self, codes) -> dict[str, int]:
+        """Maps the known codes among `codes` to their ids."""
+        ids_by_code = self._get_map()
+        return {code: ids_by_code[code] for code in codes if code in ids_by_code}
+
+    def get_unknown_codes(self, codes) -> list[str]:
+        """Returns the codes (in input order) that are not in the table."""
+        ids_by_code = self._get_map()
+        return [code for code in codes if code not in ids_by_code]
+
+    async def get_unknown_codes_async(self, conn, codes) -> list[str]:
+        """
+        Như `get_unknown_codes`, nhưng nếu cần load thì dùng connection asyncpg
+        `conn`. Các request cùng gặp cache trống chờ một lần load chung (khóa
+        asyncio, không chặn event loop).
+        """
+        ids_by_code = self._fresh_map()
+        if ids_by_code is None:
+            if self._async_lock is None:
+                self._async_lock = asyncio.Lock()
+            async with self._async_lock:
+                ids_by_code = self._fresh_map()
+                if ids_by_code is None:
+                    ids_by_code = await self.load_async(conn)
+        return [code for code in codes if code not in ids_by_code]
+
+    def get_all_codes(self) -> list[str]:
+        """All codes, ordered by id."""
+        return list(self._get_map())
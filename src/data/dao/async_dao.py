@@ -0,0 +1,220 @@
+"""
+Bản asyncpg của các truy vấn mà chế độ ASGI (`src/asgi.py`) cần. Mỗi hàm nhận
+một connection asyncpg; cache user và các hằng số/SQL dùng chung với các DAO
+đồng bộ.
+"""
+
+import asyncpg
+from functools import lru_cache
+from ..database.async_database import to_asyncpg
+from ..model.user_model import USER_COLUMNS, USER_PUBLIC_COLUMNS, UserModel
+from .medical_record_dao import CREATE_PREDICTION_RECORD_QUERY
+from .symptoms_dao import SymptomsDAO
+from .users_dao import DuplicateUserError, UsersDAO, conflicting_field
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+@lru_cache(maxsize=None)
+def _select_users(columns, where):
+    return f"SELECT {', '.join(map(_quote, columns))} FROM users WHERE {where}"
+
+
+_INSERT_USER_QUERY = """
+    INSERT INTO users (username, email, password, first_name, last_name, date_of_birth, gender, phone, address, current_latitude, current_longitude, current_diseases, role, is_active)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14)
+    RETURNING id
+"""
+
+_UPDATE_USER_QUERY = """
+    UPDATE users SET first_name=$1, last_name=$2, date_of_birth=$3, gender=$4, phone=$5, address=$6, current_latitude=$7, current_longitude=$8, current_diseases=$9, role=$10, is_active=$11
+    WHERE id=$12
+"""
+
+_AUTHENTICATE_QUERY = (
+    f"SELECT {', '.join(map(_quote, USER_PUBLIC_COLUMNS))}, password = $1 FROM users WHERE username = $2"
+)
+
+
+class AsyncUsersDAO:
+    @staticmethod
+    async def _get_one(conn, where, args, columns):
+        columns = tuple(columns)
+        row = await conn.fetchrow(_select_users(columns, where), *args)
+        return UserModel.from_row(row, columns) if row else None
+
+    @staticmethod
+    async def get_user_by_id(conn, user_id, columns=USER_COLUMNS, use_cache=True):
+        """Giống `UsersDAO.get_user_by_id`, dùng chung cache user."""
+        cache = UsersDAO.cache
+        if cache is None or not use_cache:
+            return await AsyncUsersDAO._get_one(conn, "id = $1", (user_id,), columns)
+        user = cache.get_by_id(user_id)
+        if user is None:
+            generation = cache.generation()
+            user = await AsyncUsersDAO._get_one(conn, "id = $1", (user_id,), USER_COLUMNS)
+            if user is not None:
+                cache.put(user, generation)
+        return user
+
+    @staticmethod
+    async def get_users_by_ids(conn, user_ids, columns=USER_COLUMNS) -> dict[int, UserModel]:
+        """Giống `UsersDAO.get_users_by_ids`: một query cho các user chưa có trong cache."""
+        cache = UsersDAO.cache
+        users = {}
+        if cache is not None:
+            for user_id in user_ids:
+                user = cache.get_by_id(user_id)
+                if user is not None:
+                    users[user_id] = user
+            user_ids = [user_id for user_id in user_ids if user_id not in users]
+            columns = USER_COLUMNS
+        if not user_ids:
+            return users
+        columns = tuple(columns)
+        generation = cache.generation() if cache is not None else None
+        rows = await conn.fetch(_select_users(columns, "id = ANY($1::int[])"), list(user_ids))
+        for row in rows:
+            user = UserModel.from_row(row, columns)
+            users[user.id] = user
+            if cache is not None:
+                cache.put(user, generation)
+        return users
+
+    @staticmethod
+    async def authenticate(conn, username, password):
+        """Giống `UsersDAO.authenticate`: trả về `(user, password_ok)`."""
+        cache = UsersDAO.cache
+        if cache is not None:
+            user = cache.get_by_username(username)
+            if user is not None:
+                return user, user.password == password
+        row = await conn.fetchrow(_AUTHENTICATE_QUERY, password, username)
+        if row is None:
+            return None, False
+        return UserModel.from_row(tuple(row)[:-1], USER_PUBLIC_COLUMNS), bool(row[-1])
+
+    @staticmethod
+    async def create_user(conn, user: UserModel):
+        """Giống `UsersDAO.create_user`; trùng username/email -> `DuplicateUserError`."""
+        try:
+            user.id = await conn.fetchval(
+                _INSERT_USER_QUERY,
+                user.username,
+                user.email,
+                user.password,
+                user.first_name,
+                user.last_name,
+                user.date_of_birth,
+                user.gender,
+                user.phone,
+                user.address,
+                user.current_latitude,
+                user.current_longitude,
+                user.current_diseases,
+                user.role,
+                user.is_active,
+            )
+        except asyncpg.UniqueViolationError as e:
+            raise DuplicateUserError(conflicting_field(e.constraint_name, e.detail)) from e
+        return user
+
+    @staticmethod
+    async def update_user(conn, user: UserModel):
+        async with conn.transaction():
+            await conn.execute(
+                _UPDATE_USER_QUERY,
+                user.first_name,
+                user.last_name,
+                user.date_of_birth,
+                user.gender,
+                user.phone,
+                user.address,
+                user.current_latitude,
+                user.current_longitude,
+                user.current_diseases,
+                user.role,
+                user.is_active,
+                user.id,
+            )
+            if UsersDAO.cache is not None:
+                await UsersDAO.cache.publish_invalidation_async(user.id, conn)
+        if UsersDAO.cache is not None:
+            UsersDAO.cache.invalidate(user.id)
+        return user
+
+    @staticmethod
+    async def delete_user(conn, user_id):
+        async with conn.transaction():
+            status = await conn.execute("DELETE FROM users WHERE id = $1", user_id)
+            deleted = status != "DELETE 0"
+            if deleted and UsersDAO.cache is not None:
+                await UsersDAO.cache.publish_invalidation_async(user_id, conn)
+        if UsersDAO.cache is not None:
+            UsersDAO.cache.invalidate(user_id)
+        return deleted
+
+    @staticmethod
+    async def iter_users(conn, fields, after_id=None, limit=100, role=None, prefetch=1000):
+        """
+        Giống `UsersDAO.iter_users` (keyset pagination, chỉ SELECT `fields`),
+        bằng cursor asyncpg. Phải được gọi trong một transaction.
+        """
+        conditions = []
+        args = []
+        if after_id is not None:
+            args.append(after_id)
+            conditions.append(f"id > ${len(args)}")
+        if role is not None:
+            args.append(role)
+            conditions.append(f"role = ${len(args)}")
+        args.append(limit)
+        where = " AND ".join(conditions) if conditions else "TRUE"
+        query = _select_users(tuple(fields), f"{where} ORDER BY id LIMIT ${len(args)}")
+        async for row in conn.cursor(query, *args, prefetch=prefetch):
+            yield tuple(row)
+
+
+class AsyncMedicalRecordDAO:
+    @staticmethod
+    async def create_prediction_record(
+        conn,
+        user_id,
+        weather_temp,
+        humidity,
+        air_quality_index,
+        season,
+        symptom_codes,
+        disease_predictions,
+    ):
+        """
+        Giống `MedicalRecordDAO.create_prediction_record` (cùng câu SQL, một round
+        trip, tự commit). Trả về `(record_id, invalid_symptom_codes)`.
+        """
+        query, names = to_asyncpg(CREATE_PREDICTION_RECORD_QUERY)
+        params = {
+            "user_id": user_id,
+            "weather_temp": weather_temp,
+            "humidity": humidity,
+            "air_quality_index": air_quality_index,
+            "season": season,
+            "symptom_codes": list(symptom_codes),
+            "disease_codes": list(disease_predictions),
+            "probabilities": list(disease_predictions.values()),
+        }
+        record_id, invalid_codes = await conn.fetchrow(query, *(params[name] for name in names))
+        return record_id, list(invalid_codes)
+
+
+class AsyncSymptomsDAO:
+    @staticmethod
+    async def get_invalid_symptom_codes(conn, symptom_codes) -> list[str]:
+        """
+        Giống `SymptomsDAO.get_invalid_symptom_codes`: kiểm tra trên cùng cache danh
+        mục, `conn` chỉ dùng khi cache cần load lại.
+        """
+        if not symptom_codes:
+            return []
+        return await SymptomsDAO.vocabulary.get_unknown_codes_async(conn, symptom_codes)
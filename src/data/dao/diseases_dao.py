@@ -1,15 +1,12 @@
-from ..database.database import DatabaseClient
+from ..cache.vocabulary_cache import VocabularyCache, VOCABULARY_CACHE_TTL
 
 
 class DiseasesDAO:
+    vocabulary = VocabularyCache("diseases", ttl=VOCABULARY_CACHE_TTL)
+
     @staticmethod
     def get_disease_ids_by_codes(disease_codes: list[str]) -> dict[str, int]:
         """Fetches a dictionary mapping disease codes to their IDs."""
         if not disease_codes:
             return {}
-        conn = DatabaseClient.connection
-        with conn.cursor() as cursor:
-            query = "SELECT id, code FROM diseases WHERE code = ANY(%s)"
-            cursor.execute(query, (disease_codes,))
-            rows = cursor.fetchall()
-            return {code: id for id, code in rows}
+        return DiseasesDAO.vocabulary.get_ids_by_codes(disease_codes)
@@ -1,76 +1,211 @@
 import pandas as pd
+import numpy as np
 from datetime import datetime
+from psycopg2.extras import execute_values
 from ..database.database import DatabaseClient
 
 
+# Số bản ghi mỗi lần fetch khi stream dữ liệu training
+TRAINING_CHUNK_SIZE = 50000
+
+# Các cột feature cơ bản (trước các cột triệu chứng) theo đúng thứ tự khi training
+BASE_FEATURE_COLUMNS = ["gender", "weather_temp", "humidity", "air_quality_index", "season", "age"]
+
+TRAINING_DATA_QUERY = """
+    WITH record_symptoms_agg AS (
+        SELECT
+            r.id AS record_id,
+            array_agg(s.code) AS symptoms
+        FROM medical_records r
+        LEFT JOIN record_symptoms rs ON r.id = rs.record_id
+        LEFT JOIN symptoms s ON rs.symptom_id = s.id
+        WHERE (%(min_record_id)s IS NULL OR r.id > %(min_record_id)s)
+          AND (%(max_record_id)s IS NULL OR r.id <= %(max_record_id)s)
+        GROUP BY r.id
+    ),
+    record_diseases_agg AS (
+        -- Lấy tất cả mã bệnh của một record
+        SELECT
+            r.id AS record_id,
+            array_agg(d.code) AS diseases
+        FROM medical_records r
+        LEFT JOIN record_diseases rd ON r.id = rd.record_id
+        LEFT JOIN diseases d ON rd.disease_id = d.id
+        WHERE d.code IS NOT NULL
+          AND (%(min_record_id)s IS NULL OR r.id > %(min_record_id)s)
+          AND (%(max_record_id)s IS NULL OR r.id <= %(max_record_id)s)
+        GROUP BY r.id
+    )
+    SELECT
+        mr.id,
+        u.date_of_birth,
+        u.gender,
+        mr.weather_temp,
+        mr.humidity,
+        mr.air_quality_index,
+        mr.season,
+        COALESCE(rsa.symptoms, '{}') AS symptoms,
+        rda.diseases
+    FROM medical_records mr
+    JOIN users u ON mr.user_id = u.id
+    JOIN record_symptoms_agg rsa ON mr.id = rsa.record_id
+    JOIN record_diseases_agg rda ON mr.id = rda.record_id
+    WHERE rda.diseases IS NOT NULL AND array_length(rda.diseases, 1) > 0
+"""
+
+
+# Ghi một bản ghi dự đoán cùng triệu chứng và bệnh trong một câu lệnh (một round
+# trip): mã được đổi sang id bằng join ngay trên server. Nếu có mã triệu chứng
+# không tồn tại thì không ghi gì và trả về danh sách mã đó (theo thứ tự đầu vào).
+CREATE_PREDICTION_RECORD_QUERY = """
+    WITH input_symptoms AS (
+        SELECT t.code, t.ord, s.id AS symptom_id
+        FROM unnest(%(symptom_codes)s::text[]) WITH ORDINALITY AS t(code, ord)
+        LEFT JOIN symptoms s ON s.code = t.code
+    ),
+    new_record AS (
+        INSERT INTO medical_records
+            (user_id, record_type, status, weather_temp, humidity, air_quality_index, season)
+        SELECT %(user_id)s::int, 'system_prediction', 'completed',
+               %(weather_temp)s::float8, %(humidity)s::int, %(air_quality_index)s::int, %(season)s::text
+        WHERE NOT EXISTS (SELECT 1 FROM input_symptoms WHERE symptom_id IS NULL)
+        RETURNING id
+    ),
+    inserted_symptoms AS (
+        INSERT INTO record_symptoms (record_id, symptom_id)
+        SELECT DISTINCT r.id, i.symptom_id
+        FROM new_record r
+        CROSS JOIN input_symptoms i
+    ),
+    inserted_diseases AS (
+        INSERT INTO record_diseases (record_id, disease_id, probability)
+        SELECT r.id, d.id, p.probability
+        FROM new_record r
+        CROSS JOIN unnest(%(disease_codes)s::text[], %(probabilities)s::float8[]) AS p(code, probability)
+        JOIN diseases d ON d.code = p.code
+    )
+    SELECT
+        (SELECT id FROM new_record),
+        (SELECT COALESCE(array_agg(code ORDER BY ord), '{}')
+         FROM input_symptoms WHERE symptom_id IS NULL)
+"""
+
+
 class MedicalRecordDAO:
     @staticmethod
-    def get_training_data() -> pd.DataFrame | None:
+    def get_training_data(min_record_id=None, max_record_id=None) -> pd.DataFrame | None:
         """
         Tải và xử lý dữ liệu training từ database cho bài toán multi-label.
         Mỗi bản ghi có thể có nhiều bệnh (label), sử dụng disease.code cho tên cột.
+        Có thể giới hạn theo khoảng id (min_record_id, max_record_id].
         """
         print("🗃️ Loading and processing multi-label training data from database...")
-        conn = DatabaseClient.connection
-        query = """
-            WITH record_symptoms_agg AS (
-                SELECT
-                    r.id AS record_id,
-                    array_agg(s.code) AS symptoms
-                FROM medical_records r
-                LEFT JOIN record_symptoms rs ON r.id = rs.record_id
-                LEFT JOIN symptoms s ON rs.symptom_id = s.id
-                GROUP BY r.id
-            ),
-            record_diseases_agg AS (
-                -- Lấy tất cả mã bệnh của một record
-                SELECT
-                    r.id AS record_id,
-                    array_agg(d.code) AS diseases
-                FROM medical_records r
-                LEFT JOIN record_diseases rd ON r.id = rd.record_id
-                LEFT JOIN diseases d ON rd.disease_id = d.id
-                WHERE d.code IS NOT NULL
-                GROUP BY r.id
-            )
-            SELECT
-                mr.id,
-                u.date_of_birth,
-                u.gender,
-                mr.weather_temp,
-                mr.humidity,
-                mr.air_quality_index,
-                mr.season,
-                COALESCE(rsa.symptoms, '{}') AS symptoms,
-                rda.diseases
-            FROM medical_records mr
-            JOIN users u ON mr.user_id = u.id
-            JOIN record_symptoms_agg rsa ON mr.id = rsa.record_id
-            JOIN record_diseases_agg rda ON mr.id = rda.record_id
-            WHERE rda.diseases IS NOT NULL AND array_length(rda.diseases, 1) > 0;
-        """
+        conn = DatabaseClient.get_connection()
 
         try:
-            df = pd.read_sql(query, conn)
+            df = pd.read_sql(
+                TRAINING_DATA_QUERY,
+                conn,
+                params={"min_record_id": min_record_id, "max_record_id": max_record_id},
+            )
             if df.empty:
                 print("⚠️ No training data found in the database.")
                 return None
             print(f"✅ Loaded {len(df)} raw records from the database.")
         except Exception as e:
             print(f"❌ Error loading data from database: {e}")
+            # Không để connection ở trạng thái transaction lỗi cho các câu lệnh sau
+            conn.rollback()
             return None
 
-        # --- Feature Engineering ---
-        current_year = datetime.now().year
-        df["age"] = df["date_of_birth"].apply(
-            lambda dob: current_year - dob.year if pd.notna(dob) else None
-        )
-        df["gender"] = df["gender"].map({"male": 1, "female": 0, "other": 2}).fillna(2)
-        df["season"] = (
-            df["season"].map({"spring": 0, "summer": 1, "autumn": 2, "winter": 3}).fillna(0)
-        )
+        codes = MedicalRecordDAO._get_vocabulary_codes(conn)
+        if codes is None:
+            return None
+        all_symptom_codes, all_disease_codes = codes
 
-        # --- One-Hot Encode Symptoms and Diseases ---
+        df = MedicalRecordDAO._engineer_features(df, all_symptom_codes, all_disease_codes)
+
+        print("✅ Data processing and feature engineering complete for multi-label format.")
+        return df
+
+    @staticmethod
+    def get_training_matrix(
+        chunk_size: int = TRAINING_CHUNK_SIZE, min_record_id=None, max_record_id=None
+    ):
+        """
+        Stream dữ liệu training bằng server-side cursor, xử lý feature theo từng
+        chunk và ghi thẳng vào ma trận NumPy cấp phát sẵn, để bộ nhớ đỉnh không
+        phụ thuộc vào việc giữ toàn bộ kết quả query (kể cả các mảng array_agg).
+
+        Trả về `(X, Y, feature_names, label_columns)` với X kiểu float32 và Y kiểu
+        uint8, hoặc None nếu không có dữ liệu. Có thể giới hạn theo khoảng id
+        (min_record_id, max_record_id].
+        """
+        print(f"🗃️ Streaming multi-label training data in chunks of {chunk_size}...")
+        conn = DatabaseClient.get_connection()
+
+        codes = MedicalRecordDAO._get_vocabulary_codes(conn)
+        if codes is None:
+            return None
+        all_symptom_codes, all_disease_codes = codes
+        feature_names = BASE_FEATURE_COLUMNS + list(all_symptom_codes)
+        label_columns = list(all_disease_codes)
+
+        try:
+            # Cố định tập bản ghi: chỉ lấy tới id lớn nhất hiện tại, nên số bản ghi
+            # là cận trên để cấp phát trước ma trận
+            bounds = {"min_record_id": min_record_id, "max_record_id": max_record_id}
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    SELECT count(*), max(id) FROM medical_records
+                    WHERE (%(min_record_id)s IS NULL OR id > %(min_record_id)s)
+                      AND (%(max_record_id)s IS NULL OR id <= %(max_record_id)s)
+                    """,
+                    bounds,
+                )
+                capacity, bounds["max_record_id"] = cursor.fetchone()
+            if not capacity:
+                print("⚠️ No training data found in the database.")
+                return None
+
+            X = np.empty((capacity, len(feature_names)), dtype=np.float32)
+            Y = np.empty((capacity, len(label_columns)), dtype=np.uint8)
+            n_rows = 0
+
+            with conn.cursor(name="training_data_stream") as cursor:
+                cursor.itersize = chunk_size
+                cursor.execute(TRAINING_DATA_QUERY, bounds)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    chunk = pd.DataFrame.from_records(
+                        rows, columns=[column.name for column in cursor.description]
+                    )
+                    chunk = MedicalRecordDAO._engineer_features(
+                        chunk, all_symptom_codes, all_disease_codes
+                    )
+                    end = n_rows + len(chunk)
+                    X[n_rows:end] = chunk[feature_names].to_numpy(dtype=np.float32)
+                    Y[n_rows:end] = chunk[label_columns].to_numpy(dtype=np.uint8)
+                    n_rows = end
+                    print(f"   ... processed {n_rows} records")
+        except Exception as e:
+            print(f"❌ Error streaming data from database: {e}")
+            conn.rollback()
+            return None
+
+        if n_rows == 0:
+            print("⚠️ No training data found in the database.")
+            return None
+
+        print(f"✅ Streamed and processed {n_rows} records.")
+        return X[:n_rows], Y[:n_rows], feature_names, label_columns
+
+    @staticmethod
+    def _get_vocabulary_codes(conn):
+        """Lấy danh sách mã triệu chứng và mã bệnh (theo thứ tự trong DB)."""
         try:
             symptoms_df = pd.read_sql("SELECT code FROM symptoms", conn)
             all_symptom_codes = symptoms_df["code"].tolist()
@@ -79,19 +214,51 @@ class MedicalRecordDAO:
             all_disease_codes = diseases_df["code"].tolist()
         except Exception as e:
             print(f"❌ Error loading symptom or disease codes from database: {e}")
+            conn.rollback()
             return None
+        return all_symptom_codes, all_disease_codes
+
+    @staticmethod
+    def _encode_codes(code_lists: pd.Series, codes: list[str]) -> np.ndarray:
+        """
+        One-hot (multi-hot) encode một cột chứa danh sách mã thành ma trận
+        (n_rows, len(codes)) kiểu int64, không lặp Python theo từng mã.
+        """
+        matrix = np.zeros((len(code_lists), len(codes)), dtype=np.int64)
+        exploded = pd.Series(code_lists.to_numpy(), dtype=object).explode()
+        column_positions = pd.Index(codes).get_indexer(exploded.to_numpy())
+        known = column_positions >= 0
+        matrix[exploded.index.to_numpy()[known], column_positions[known]] = 1
+        return matrix
 
-        for symptom_code in all_symptom_codes:
-            df[symptom_code] = df["symptoms"].apply(lambda x: 1 if symptom_code in x else 0)
+    @staticmethod
+    def _engineer_features(
+        df: pd.DataFrame, all_symptom_codes: list[str], all_disease_codes: list[str]
+    ) -> pd.DataFrame:
+        """Biến dữ liệu thô (mỗi dòng một record) thành bảng feature + label."""
+        # --- Feature Engineering ---
+        current_year = datetime.now().year
+        birth_year = pd.to_datetime(df["date_of_birth"]).dt.year
+        age = current_year - birth_year
+        df["age"] = age if age.hasnans else age.astype(np.int64)
+        df["gender"] = df["gender"].map({"male": 1, "female": 0, "other": 2}).fillna(2)
+        df["season"] = (
+            df["season"].map({"spring": 0, "summer": 1, "autumn": 2, "winter": 3}).fillna(0)
+        )
 
-        for disease_code in all_disease_codes:
-            df[disease_code] = df["diseases"].apply(lambda x: 1 if disease_code in x else 0)
+        # --- One-Hot Encode Symptoms and Diseases ---
+        symptom_matrix = MedicalRecordDAO._encode_codes(df["symptoms"], all_symptom_codes)
+        disease_matrix = MedicalRecordDAO._encode_codes(df["diseases"], all_disease_codes)
+        encoded = pd.DataFrame(
+            np.hstack([symptom_matrix, disease_matrix]),
+            columns=list(all_symptom_codes) + list(all_disease_codes),
+            index=df.index,
+        )
 
         # --- Clean up ---
         df = df.drop(columns=["date_of_birth", "symptoms", "diseases", "id"])
+        df = pd.concat([df, encoded], axis=1)
         df = df.dropna(subset=["age"])
-
-        print("✅ Data processing and feature engineering complete for multi-label format.")
         return df
 
     @staticmethod
@@ -101,7 +268,7 @@ class MedicalRecordDAO:
         """
         Creates a new medical record. Can use an existing cursor or create a new one.
         """
-        conn = DatabaseClient.connection
+        conn = DatabaseClient.get_connection()
         
         # If a cursor is not provided, create one and manage the transaction locally.
         if cursor is None:
@@ -135,7 +302,7 @@ class MedicalRecordDAO:
         if not symptom_ids:
             return
             
-        conn = DatabaseClient.connection
+        conn = DatabaseClient.get_connection()
 
         if cursor is None:
             with conn.cursor() as cur:
@@ -157,7 +324,7 @@ class MedicalRecordDAO:
         if not disease_predictions:
             return
 
-        conn = DatabaseClient.connection
+        conn = DatabaseClient.get_connection()
         
         if cursor is None:
             with conn.cursor() as cur:
@@ -170,3 +337,103 @@ class MedicalRecordDAO:
         args = [(record_id, disease_id, prob) for disease_id, prob in disease_predictions.items()]
         query = "INSERT INTO record_diseases (record_id, disease_id, probability) VALUES (%s, %s, %s)"
         cursor.executemany(query, args)
+
+    @staticmethod
+    def create_prediction_record(
+        user_id,
+        weather_temp,
+        humidity,
+        air_quality_index,
+        season,
+        symptom_codes: list[str],
+        disease_predictions: dict[str, float],
+        cursor,
+    ) -> tuple[int | None, list[str]]:
+        """
+        Ghi bản ghi dự đoán, các triệu chứng (theo mã) và xác suất bệnh (mã ->
+        xác suất) trong một round trip. Trả về `(record_id, invalid_symptom_codes)`;
+        khi có mã triệu chứng không hợp lệ thì `record_id` là None và không có gì
+        được ghi. Mã bệnh không tồn tại bị bỏ qua. Không commit.
+        """
+        cursor.execute(
+            CREATE_PREDICTION_RECORD_QUERY,
+            {
+                "user_id": user_id,
+                "weather_temp": weather_temp,
+                "humidity": humidity,
+                "air_quality_index": air_quality_index,
+                "season": season,
+                "symptom_codes": list(symptom_codes),
+                "disease_codes": list(disease_predictions),
+                "probabilities": list(disease_predictions.values()),
+            },
+        )
+        record_id, invalid_codes = cursor.fetchone()
+        return record_id, list(invalid_codes)
+
+    @staticmethod
+    def reserve_record_ids(count: int, cursor) -> list[int]:
+        """Lấy trước `count` id từ sequence của medical_records (một round trip)."""
+        cursor.execute(
+            "SELECT nextval('medical_records_id_seq') FROM generate_series(1, %s)", (count,)
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    @staticmethod
+    def insert_prediction_records(records: list[dict], cursor, page_size: int = 1000):
+        """
+        Ghi nhiều bản ghi dự đoán (id đã cấp trước) cùng triệu chứng và bệnh của
+        chúng bằng insert nhiều dòng. Ghi lại cùng một bản ghi không gây lỗi
+        (`ON CONFLICT DO NOTHING`), nên có thể thử lại một batch an toàn.
+
+        Mỗi record: `{"id", "user_id", "weather_temp", "humidity",
+        "air_quality_index", "season", "symptom_ids": [...],
+        "diseases": [[disease_id, probability], ...]}`.
+        """
+        if not records:
+            return
+        execute_values(
+            cursor,
+            """
+            INSERT INTO medical_records
+                (id, user_id, record_type, status, weather_temp, humidity, air_quality_index, season)
+            VALUES %s
+            ON CONFLICT (id) DO NOTHING
+            """,
+            [
+                (
+                    r["id"],
+                    r["user_id"],
+                    "system_prediction",
+                    "completed",
+                    r["weather_temp"],
+                    r["humidity"],
+                    r["air_quality_index"],
+                    r["season"],
+                )
+                for r in records
+            ],
+            page_size=page_size,
+        )
+
+        symptom_rows = [(r["id"], symptom_id) for r in records for symptom_id in r["symptom_ids"]]
+        if symptom_rows:
+            execute_values(
+                cursor,
+                "INSERT INTO record_symptoms (record_id, symptom_id) VALUES %s ON CONFLICT DO NOTHING",
+                symptom_rows,
+                page_size=page_size,
+            )
+
+        disease_rows = [
+            (r["id"], disease_id, probability)
+            for r in records
+            for disease_id, probability in r["diseases"]
+        ]
+        if disease_rows:
+            execute_values(
+                cursor,
+                "INSERT INTO record_diseases (record_id, disease_id, probability) VALUES %s ON CONFLICT DO NOTHING",
+                disease_rows,
+                page_size=page_size,
+            )
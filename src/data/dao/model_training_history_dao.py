@@ -0,0 +1,107 @@
+from ..database.database import DatabaseClient
+
+
+class ModelTrainingHistoryDAO:
+    @staticmethod
+    def start_run(trigger_type, triggered_by=None, notes=None) -> int:
+        """Creates a 'running' history entry and returns its id."""
+        conn = DatabaseClient.get_connection()
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO model_training_history (trigger_type, triggered_by, status, notes)
+                VALUES (%s, %s, 'running', %s)
+                RETURNING id
+                """,
+                (trigger_type, triggered_by, notes),
+            )
+            run_id = cursor.fetchone()[0]
+            conn.commit()
+            return run_id
+
+    @staticmethod
+    def complete_run(
+        run_id,
+        training_data_count,
+        doctor_diagnosed_count,
+        system_predicted_count,
+        last_record_id,
+        duration_seconds,
+        notes=None,
+    ):
+        conn = DatabaseClient.get_connection()
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE model_training_history
+                SET status = 'completed',
+                    training_data_count = %s,
+                    doctor_diagnosed_count = %s,
+                    system_predicted_count = %s,
+                    last_record_id = %s,
+                    training_completed_at = CURRENT_TIMESTAMP,
+                    training_duration_seconds = %s,
+                    notes = COALESCE(%s, notes)
+                WHERE id = %s
+                """,
+                (
+                    training_data_count,
+                    doctor_diagnosed_count,
+                    system_predicted_count,
+                    last_record_id,
+                    duration_seconds,
+                    notes,
+                    run_id,
+                ),
+            )
+            conn.commit()
+
+    @staticmethod
+    def finish_run(run_id, status, duration_seconds, error_message=None, notes=None):
+        """
+        Closes a run as 'failed' or 'cancelled'. Rolls back first: after an error
+        the connection may be in an aborted transaction.
+        """
+        conn = DatabaseClient.get_connection()
+        conn.rollback()
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE model_training_history
+                SET status = %s,
+                    training_completed_at = CURRENT_TIMESTAMP,
+                    training_duration_seconds = %s,
+                    error_message = %s,
+                    notes = COALESCE(%s, notes)
+                WHERE id = %s
+                """,
+                (status, duration_seconds, error_message, notes, run_id),
+            )
+            conn.commit()
+
+    @staticmethod
+    def get_record_counts(min_record_id=None, max_record_id=None) -> dict:
+        """
+        Counts medical records in (min_record_id, max_record_id] by record type,
+        plus the highest id in that range.
+        """
+        conn = DatabaseClient.get_connection()
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT
+                    count(*) FILTER (WHERE record_type = 'doctor_diagnosis'),
+                    count(*) FILTER (WHERE record_type = 'system_prediction'),
+                    max(id)
+                FROM medical_records
+                WHERE (%(min_record_id)s IS NULL OR id > %(min_record_id)s)
+                  AND (%(max_record_id)s IS NULL OR id <= %(max_record_id)s)
+                """,
+                {"min_record_id": min_record_id, "max_record_id": max_record_id},
+            )
+            doctor_diagnosed, system_predicted, max_id = cursor.fetchone()
+            return {
+                "doctor_diagnosed_count": doctor_diagnosed,
+                "system_predicted_count": system_predicted,
+                "max_record_id": max_id,
+            }
@@ -1,15 +1,19 @@
-from ..database.database import DatabaseClient
+from ..cache.vocabulary_cache import VocabularyCache, VOCABULARY_CACHE_TTL
 
 
 class SymptomsDAO:
+    vocabulary = VocabularyCache("symptoms", ttl=VOCABULARY_CACHE_TTL)
+
     @staticmethod
     def get_symptom_ids_by_codes(symptom_codes: list[str]) -> dict[str, int]:
         """Fetches a dictionary mapping symptom codes to their IDs."""
         if not symptom_codes:
             return {}
-        conn = DatabaseClient.connection
-        with conn.cursor() as cursor:
-            query = "SELECT id, code FROM symptoms WHERE code = ANY(%s)"
-            cursor.execute(query, (symptom_codes,))
-            rows = cursor.fetchall()
-            return {code: id for id, code in rows}
+        return SymptomsDAO.vocabulary.get_ids_by_codes(symptom_codes)
+
+    @staticmethod
+    def get_invalid_symptom_codes(symptom_codes: list[str]) -> list[str]:
+        """Returns the symptom codes that do not exist, without a database round trip."""
+        if not symptom_codes:
+            return []
+        return SymptomsDAO.vocabulary.get_unknown_codes(symptom_codes)
@@ -1,79 +1,232 @@
+import re
 import psycopg2
+import psycopg2.errors
+from functools import lru_cache
+from psycopg2 import sql
 from ..database.database import DatabaseClient
-from ..model.user_model import UserModel
+from ..cache.user_cache import create_user_cache
+from ..model.user_model import USER_COLUMNS, USER_PUBLIC_COLUMNS, UserModel
+
+
+# Tên constraint UNIQUE (mặc định của Postgres) -> cột tương ứng
+USER_UNIQUE_CONSTRAINTS = {
+    "users_username_key": "username",
+    "users_email_key": "email",
+}
+
+
+class DuplicateUserError(Exception):
+    """Raised by `create_user` when a unique column (`field`) is already taken."""
+
+    def __init__(self, field):
+        super().__init__(f"{field.capitalize()} already exists")
+        self.field = field
+
+
+def conflicting_field(constraint_name, detail):
+    """
+    Cột bị trùng, theo tên constraint hoặc (nếu lạ) theo `Key (col)=...` trong
+    detail. Dùng chung cho psycopg2 (`diag`) và asyncpg.
+    """
+    field = USER_UNIQUE_CONSTRAINTS.get(constraint_name)
+    if field is None:
+        match = re.match(r"Key \((\w+)\)", detail or "")
+        field = match.group(1) if match else "user"
+    return field
+
+
+@lru_cache(maxsize=None)
+def _select_users(columns, where):
+    """`SELECT <columns> FROM users WHERE <where>`; `where` là SQL cố định trong code."""
+    return sql.SQL("SELECT {columns} FROM users WHERE " + where).format(
+        columns=sql.SQL(", ").join(map(sql.Identifier, columns))
+    )
+
+
+# Đăng nhập: một lookup theo username, mật khẩu so sánh trong DB và không được trả về
+_AUTHENTICATE_QUERY = sql.SQL("SELECT {columns}, password = %s FROM users WHERE username = %s").format(
+    columns=sql.SQL(", ").join(map(sql.Identifier, USER_PUBLIC_COLUMNS))
+)
 
 
 class UsersDAO:
+    # Cache user đầy đủ cột cho các lookup theo id/username (None nếu tắt)
+    cache = create_user_cache()
+
     @staticmethod
     def create_user(user: UserModel):
-        conn = DatabaseClient.connection
+        """
+        Một câu INSERT duy nhất; trùng username/email được phát hiện bởi chính
+        constraint UNIQUE (an toàn khi đăng ký đồng thời) và báo bằng
+        `DuplicateUserError`.
+        """
+        conn = DatabaseClient.get_connection()
         with conn.cursor() as cursor:
             insert_query = """
                 INSERT INTO users (username, email, password, first_name, last_name, date_of_birth, gender, phone, address, current_latitude, current_longitude, current_diseases, role, is_active)
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 RETURNING id
             """
-            cursor.execute(
-                insert_query,
-                (
-                    user.username,
-                    user.email,
-                    user.password,
-                    user.first_name,
-                    user.last_name,
-                    user.date_of_birth,
-                    user.gender,
-                    user.phone,
-                    user.address,
-                    user.current_latitude,
-                    user.current_longitude,
-                    user.current_diseases,
-                    user.role,
-                    user.is_active,
-                ),
-            )
+            try:
+                cursor.execute(
+                    insert_query,
+                    (
+                        user.username,
+                        user.email,
+                        user.password,
+                        user.first_name,
+                        user.last_name,
+                        user.date_of_birth,
+                        user.gender,
+                        user.phone,
+                        user.address,
+                        user.current_latitude,
+                        user.current_longitude,
+                        user.current_diseases,
+                        user.role,
+                        user.is_active,
+                    ),
+                )
+            except psycopg2.errors.UniqueViolation as e:
+                conn.rollback()
+                raise DuplicateUserError(conflicting_field(e.diag.constraint_name, e.diag.message_detail)) from e
             user_id = cursor.fetchone()[0]
             conn.commit()
             user.id = user_id
             return user
 
     @staticmethod
-    def get_user_by_id(user_id):
-        conn = DatabaseClient.connection
+    def _get_one(where, params, columns):
+        conn = DatabaseClient.get_connection()
         with conn.cursor() as cursor:
-            cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
+            cursor.execute(_select_users(tuple(columns), where), params)
             row = cursor.fetchone()
-            if row:
-                return UserModel.from_row(row)
-            return None
+            return UserModel.from_row(row, columns) if row else None
 
     @staticmethod
-    def get_user_by_username(username):
-        conn = DatabaseClient.connection
+    def get_user_by_id(user_id, columns=USER_COLUMNS, use_cache=True):
+        """
+        Chỉ SELECT các cột trong `columns`; các cột khác không có trên object trả
+        về. Khi cache bật, user (đủ mọi cột) được lấy từ cache; object đó dùng
+        chung nên nơi nào cần sửa user phải gọi với `use_cache=False`.
+        """
+        cache = UsersDAO.cache
+        if cache is None or not use_cache:
+            return UsersDAO._get_one("id = %s", (user_id,), columns)
+        user = cache.get_by_id(user_id)
+        if user is None:
+            generation = cache.generation()
+            user = UsersDAO._get_one("id = %s", (user_id,), USER_COLUMNS)
+            if user is not None:
+                cache.put(user, generation)
+        return user
+
+    @staticmethod
+    def get_users_by_ids(user_ids: list[int], columns=USER_COLUMNS) -> dict[int, UserModel]:
+        """
+        Fetches several users in one query, keyed by id. `columns` must include
+        `id`. Users found in the cache are not queried.
+        """
+        cache = UsersDAO.cache
+        users = {}
+        if cache is not None:
+            for user_id in user_ids:
+                user = cache.get_by_id(user_id)
+                if user is not None:
+                    users[user_id] = user
+            user_ids = [user_id for user_id in user_ids if user_id not in users]
+            columns = USER_COLUMNS
+        if not user_ids:
+            return users
+        columns = tuple(columns)
+        generation = cache.generation() if cache is not None else None
+        conn = DatabaseClient.get_connection()
         with conn.cursor() as cursor:
-            cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
-            row = cursor.fetchone()
-            return UserModel.from_row(row) if row else None
+            cursor.execute(_select_users(columns, "id = ANY(%s)"), (list(user_ids),))
+            rows = cursor.fetchall()
+        for row in rows:
+            user = UserModel.from_row(row, columns)
+            users[user.id] = user
+            if cache is not None:
+                cache.put(user, generation)
+        return users
+
+    @staticmethod
+    def get_user_by_username(username, columns=USER_COLUMNS, use_cache=True):
+        cache = UsersDAO.cache
+        if cache is None or not use_cache:
+            return UsersDAO._get_one("username = %s", (username,), columns)
+        user = cache.get_by_username(username)
+        if user is None:
+            generation = cache.generation()
+            user = UsersDAO._get_one("username = %s", (username,), USER_COLUMNS)
+            if user is not None:
+                cache.put(user, generation)
+        return user
 
     @staticmethod
-    def get_user_by_email(email):
-        conn = DatabaseClient.connection
+    def authenticate(username, password):
+        """
+        Trả về `(user, password_ok)`; `user` là None nếu username không tồn tại
+        và chỉ có các cột public. Dùng user trong cache nếu có, nếu không thì một
+        query theo index UNIQUE của username.
+        """
+        cache = UsersDAO.cache
+        if cache is not None:
+            user = cache.get_by_username(username)
+            if user is not None:
+                return user, user.password == password
+        conn = DatabaseClient.get_connection()
         with conn.cursor() as cursor:
-            cursor.execute("SELECT * FROM users WHERE email = %s", (email,))
+            cursor.execute(_AUTHENTICATE_QUERY, (password, username))
             row = cursor.fetchone()
-            return UserModel.from_row(row) if row else None
+        if row is None:
+            return None, False
+        return UserModel.from_row(row[:-1], USER_PUBLIC_COLUMNS), bool(row[-1])
+
+    @staticmethod
+    def get_user_by_email(email, columns=USER_COLUMNS):
+        return UsersDAO._get_one("email = %s", (email,), columns)
 
     @staticmethod
-    def get_all_users():
-        conn = DatabaseClient.connection
+    def get_all_users(columns=USER_COLUMNS):
+        columns = tuple(columns)
+        conn = DatabaseClient.get_connection()
         with conn.cursor() as cursor:
-            cursor.execute("SELECT * FROM users")
+            cursor.execute(_select_users(columns, "TRUE ORDER BY id"))
             rows = cursor.fetchall()
-            return [UserModel.from_row(row) for row in rows]
+            return [UserModel.from_row(row, columns) for row in rows]
+
+    @staticmethod
+    def iter_users(fields=USER_PUBLIC_COLUMNS, after_id=None, limit=100, role=None, chunk_size=1000):
+        """
+        Stream tối đa `limit` user có `id > after_id` theo thứ tự id (keyset
+        pagination), lọc theo `role` nếu có. Chỉ SELECT các cột trong `fields`
+        và trả về tuple theo đúng thứ tự đó. Dùng server-side cursor nên bộ nhớ
+        không phụ thuộc số dòng.
+        """
+        conditions = []
+        params = {"limit": limit}
+        if after_id is not None:
+            conditions.append(sql.SQL("id > %(after_id)s"))
+            params["after_id"] = after_id
+        if role is not None:
+            conditions.append(sql.SQL("role = %(role)s"))
+            params["role"] = role
+        query = sql.SQL("SELECT {fields} FROM users WHERE {where} ORDER BY id LIMIT %(limit)s").format(
+            fields=sql.SQL(", ").join(map(sql.Identifier, fields)),
+            where=sql.SQL(" AND ").join(conditions) if conditions else sql.SQL("TRUE"),
+        )
+
+        conn = DatabaseClient.get_connection()
+        with conn.cursor(name="users_stream") as cursor:
+            cursor.itersize = chunk_size
+            cursor.execute(query, params)
+            yield from cursor
 
     @staticmethod
     def update_user(user: UserModel):
-        conn = DatabaseClient.connection
+        conn = DatabaseClient.get_connection()
         with conn.cursor() as cursor:
             update_query = """
                 UPDATE users SET first_name=%s, last_name=%s, date_of_birth=%s, gender=%s, phone=%s, address=%s, current_latitude=%s, current_longitude=%s, current_diseases=%s, role=%s, is_active=%s
@@ -96,13 +249,22 @@ class UsersDAO:
                     user.id,
                 ),
             )
+            if UsersDAO.cache is not None:
+                UsersDAO.cache.publish_invalidation(user.id, cursor)
             conn.commit()
-            return user
+        if UsersDAO.cache is not None:
+            UsersDAO.cache.invalidate(user.id)
+        return user
 
     @staticmethod
     def delete_user(user_id):
-        conn = DatabaseClient.connection
+        conn = DatabaseClient.get_connection()
         with conn.cursor() as cursor:
             cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
+            deleted = cursor.rowcount > 0
+            if deleted and UsersDAO.cache is not None:
+                UsersDAO.cache.publish_invalidation(user_id, cursor)
             conn.commit()
-            return cursor.rowcount > 0
+        if UsersDAO.cache is not None:
+            UsersDAO.cache.invalidate(user_id)
+        return deleted
@@ -0,0 +1,90 @@
+import os
+import re
+from functools import lru_cache
+import asyncpg
+from .database import DATABASE_CONFIG
+
+ASYNC_POOL_CONFIG = {
+    "min_size": int(os.environ.get("ASYNC_DB_POOL_MIN_SIZE", 2)),
+    # Một connection phục vụ lần lượt nhiều coroutine, nên không cần một connection mỗi request
+    "max_size": int(os.environ.get("ASYNC_DB_POOL_MAX_SIZE", 20)),
+    # Thời gian tối đa (giây) chờ một connection rảnh
+    "checkout_timeout": float(os.environ.get("DB_POOL_CHECKOUT_TIMEOUT", 30)),
+}
+
+_NAMED_PARAMETER = re.compile(r"%\((\w+)\)s")
+
+
+@lru_cache(maxsize=None)
+def to_asyncpg(query):
+    """
+    Đổi câu SQL dạng psycopg2 (`%(name)s`) sang dạng asyncpg (`$1`, `$2`...),
+    để dùng chung SQL giữa hai driver. Trả về `(query, names)` với `names` theo
+    thứ tự tham số.
+    """
+    names = []
+
+    def replace(match):
+        name = match.group(1)
+        if name not in names:
+            names.append(name)
+        return f"${names.index(name) + 1}"
+
+    return _NAMED_PARAMETER.sub(replace, query), tuple(names)
+
+
+class AsyncDatabaseClient:
+    """Pool asyncpg cho chế độ ASGI (`src/asgi.py`); dùng cùng `DATABASE_CONFIG`."""
+
+    pool = None
+
+    @staticmethod
+    async def connect():
+        if AsyncDatabaseClient.pool is None:
+            AsyncDatabaseClient.pool = await asyncpg.create_pool(
+                host=DATABASE_CONFIG["host"],
+                port=DATABASE_CONFIG["port"],
+                database=DATABASE_CONFIG["database"],
+                user=DATABASE_CONFIG["user"],
+                password=DATABASE_CONFIG["password"],
+                min_size=ASYNC_POOL_CONFIG["min_size"],
+                max_size=ASYNC_POOL_CONFIG["max_size"],
+            )
+        return AsyncDatabaseClient.pool
+
+    @staticmethod
+    async def disconnect():
+        pool, AsyncDatabaseClient.pool = AsyncDatabaseClient.pool, None
+        if pool is not None:
+            await pool.close()
+
+    @staticmethod
+    def acquire():
+        """`async with AsyncDatabaseClient.acquire() as conn: ...`"""
+        if AsyncDatabaseClient.pool is None:
+            raise asyncpg.InterfaceError("Database is not connected")
+        return AsyncDatabaseClient.pool.acquire(timeout=ASYNC_POOL_CONFIG["checkout_timeout"])
+
+    @staticmethod
+    async def ping(timeout=1.0):
+        """Như `DatabaseClient.ping`: trả về `(ok, error_message)`."""
+        if AsyncDatabaseClient.pool is None:
+            return False, "Not connected"
+        try:
+            async with AsyncDatabaseClient.pool.acquire(timeout=timeout) as conn:
+                await conn.fetchval("SELECT 1", timeout=timeout)
+            return True, None
+        except Exception as e:
+            return False, str(e)
+
+    @staticmethod
+    def get_pool_stats():
+        pool = AsyncDatabaseClient.pool
+        if pool is None:
+            return None
+        return {
+            "min_size": pool.get_min_size(),
+            "max_size": pool.get_max_size(),
+            "size": pool.get_size(),
+            "idle": pool.get_idle_size(),
+        }
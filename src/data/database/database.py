@@ -1,7 +1,14 @@
 import psycopg2
+import psycopg2.extensions
 import logging
 import random
 import enum
+import os
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, has_app_context
+from ...util.metrics import cursor_factory
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -14,6 +21,15 @@ DATABASE_CONFIG = {
     "password": "health_predictor_password",
 }
 
+POOL_CONFIG = {
+    "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+    "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+    # Thời gian tối đa (giây) chờ một connection rảnh trước khi báo lỗi
+    "checkout_timeout": float(os.environ.get("DB_POOL_CHECKOUT_TIMEOUT", 30)),
+    # Connection rảnh lâu hơn ngưỡng này sẽ được kiểm tra bằng `SELECT 1` khi checkout
+    "health_check_after": float(os.environ.get("DB_POOL_HEALTH_CHECK_AFTER", 30)),
+}
+
 
 class ConnectionStatus(enum.Enum):
     NOT_CONNECTED = "Not connected"
@@ -21,19 +37,200 @@ class ConnectionStatus(enum.Enum):
     CONNECTED = "Connected"
 
 
+class PoolTimeoutError(psycopg2.OperationalError):
+    """Raised when no pooled connection becomes available in time."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections.
+
+    Connections are created lazily up to `max_size`; callers block (up to
+    `checkout_timeout`) when the pool is exhausted. Dropped connections are
+    detected on checkout and replaced transparently.
+    """
+
+    def __init__(self, config, min_size, max_size, checkout_timeout, health_check_after):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min={min_size}, max={max_size}")
+        self.config = config
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.health_check_after = health_check_after
+        self.closed = False
+
+        self._lock = threading.Condition()
+        self._idle = []  # [(connection, returned_at)]
+        self._in_use = set()
+
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._total_wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._reconnects = 0
+
+        for _ in range(min_size):
+            self._idle.append((self._new_connection(), time.monotonic()))
+
+    def _new_connection(self):
+        return psycopg2.connect(
+            host=self.config["host"],
+            port=self.config["port"],
+            database=self.config["database"],
+            user=self.config["user"],
+            password=self.config["password"],
+            cursor_factory=cursor_factory(),
+        )
+
+    @property
+    def size(self):
+        return len(self._idle) + len(self._in_use)
+
+    def _is_healthy(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if idle_for < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self, timeout=None):
+        """
+        Check out a connection, waiting if the pool is exhausted (up to `timeout`
+        seconds, `checkout_timeout` by default).
+        """
+        timeout = self.checkout_timeout if timeout is None else timeout
+        started = time.monotonic()
+        waited = False
+        with self._lock:
+            while True:
+                if self.closed:
+                    raise psycopg2.InterfaceError("Connection pool is closed")
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    break
+                if self.size < self.max_size:
+                    conn, returned_at = None, None
+                    break
+                remaining = timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(
+                        f"Timed out after {timeout}s waiting for a database connection"
+                    )
+                waited = True
+                self._lock.wait(remaining)
+            # Giữ chỗ trước khi thả lock để không vượt quá max_size
+            placeholder = object()
+            self._in_use.add(placeholder)
+
+        try:
+            if conn is not None and not self._is_healthy(conn, time.monotonic() - returned_at):
+                logger.warning("Discarding broken pooled database connection, reconnecting")
+                self._close_quietly(conn)
+                conn = None
+                with self._lock:
+                    self._reconnects += 1
+            if conn is None:
+                conn = self._new_connection()
+        except Exception:
+            with self._lock:
+                self._in_use.discard(placeholder)
+                self._lock.notify()
+            raise
+
+        wait_time = time.monotonic() - started
+        with self._lock:
+            self._in_use.discard(placeholder)
+            self._in_use.add(conn)
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+            self._total_wait_time += wait_time
+            self._max_wait_time = max(self._max_wait_time, wait_time)
+        return conn
+
+    def putconn(self, conn):
+        """Return a connection to the pool, rolling back any open transaction."""
+        discard = conn.closed != 0
+        if not discard:
+            try:
+                if (
+                    conn.info.transaction_status
+                    != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+                ):
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        with self._lock:
+            self._in_use.discard(conn)
+            if discard or self.closed or len(self._idle) >= self.max_size:
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._lock.notify()
+
+    def closeall(self):
+        with self._lock:
+            self.closed = True
+            for conn, _ in self._idle:
+                self._close_quietly(conn)
+            for conn in self._in_use:
+                if isinstance(conn, psycopg2.extensions.connection):
+                    self._close_quietly(conn)
+            self._idle.clear()
+            self._in_use.clear()
+            self._lock.notify_all()
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self.size,
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "reconnects": self._reconnects,
+                "total_wait_seconds": self._total_wait_time,
+                "avg_wait_seconds": (
+                    self._total_wait_time / self._checkouts if self._checkouts else 0.0
+                ),
+                "max_wait_seconds": self._max_wait_time,
+            }
+
+
 class DatabaseClient:
-    connection = None
+    pool = None
+    _local = threading.local()
 
     @staticmethod
     def connect():
         try:
-            if DatabaseClient.connection is None or DatabaseClient.connection.closed:
-                DatabaseClient.connection = psycopg2.connect(
-                    host=DATABASE_CONFIG["host"],
-                    port=DATABASE_CONFIG["port"],
-                    database=DATABASE_CONFIG["database"],
-                    user=DATABASE_CONFIG["user"],
-                    password=DATABASE_CONFIG["password"],
+            if DatabaseClient.pool is None or DatabaseClient.pool.closed:
+                DatabaseClient.pool = ConnectionPool(
+                    DATABASE_CONFIG,
+                    min_size=POOL_CONFIG["min_size"],
+                    max_size=POOL_CONFIG["max_size"],
+                    checkout_timeout=POOL_CONFIG["checkout_timeout"],
+                    health_check_after=POOL_CONFIG["health_check_after"],
                 )
                 return True
         except psycopg2.Error as e:
@@ -43,9 +240,9 @@ class DatabaseClient:
     @staticmethod
     def disconnect():
         try:
-            if DatabaseClient.connection and not DatabaseClient.connection.closed:
-                DatabaseClient.connection.close()
-                DatabaseClient.connection = None
+            if DatabaseClient.pool and not DatabaseClient.pool.closed:
+                DatabaseClient.pool.closeall()
+                DatabaseClient.pool = None
                 return True
             else:
                 return True
@@ -53,11 +250,81 @@ class DatabaseClient:
             logger.error(f"Error disconnecting from database: {e}")
             return False
 
+    @staticmethod
+    def get_connection():
+        """
+        Returns the connection bound to the current scope, checking one out
+        of the pool on first use. Inside a Flask app context the connection
+        lives on `g` and is returned at teardown; elsewhere (training, CLI,
+        background threads) it is bound to the current thread until
+        `release_connection()` is called.
+        """
+        if DatabaseClient.pool is None:
+            raise psycopg2.InterfaceError("Database is not connected")
+        if has_app_context():
+            if "db_conn" not in g:
+                g.db_conn = DatabaseClient.pool.getconn()
+            return g.db_conn
+        conn = getattr(DatabaseClient._local, "conn", None)
+        if conn is None:
+            conn = DatabaseClient.pool.getconn()
+            DatabaseClient._local.conn = conn
+        return conn
+
+    @staticmethod
+    def release_connection(exception=None):
+        """Returns the scope-bound connection (if any) to the pool."""
+        if has_app_context():
+            conn = g.pop("db_conn", None)
+        else:
+            conn = getattr(DatabaseClient._local, "conn", None)
+            DatabaseClient._local.conn = None
+        if conn is not None and DatabaseClient.pool is not None:
+            DatabaseClient.pool.putconn(conn)
+
+    @staticmethod
+    @contextmanager
+    def connection_scope():
+        """Binds a pooled connection to the enclosed block and releases it afterwards."""
+        try:
+            yield DatabaseClient.get_connection()
+        finally:
+            DatabaseClient.release_connection()
+
+    @staticmethod
+    def ping(timeout=1.0):
+        """
+        Checks that the database answers `SELECT 1`, using a connection of its
+        own so it never waits longer than `timeout` on an exhausted pool.
+        Returns `(ok, error_message)`.
+        """
+        pool = DatabaseClient.pool
+        if pool is None or pool.closed:
+            return False, DatabaseClient.get_connection_status().value
+        try:
+            conn = pool.getconn(timeout=timeout)
+        except psycopg2.Error as e:
+            return False, str(e)
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True, None
+        except psycopg2.Error as e:
+            return False, str(e)
+        finally:
+            pool.putconn(conn)
+
+    @staticmethod
+    def get_pool_stats():
+        if DatabaseClient.pool is None:
+            return None
+        return DatabaseClient.pool.get_stats()
+
     @staticmethod
     def get_connection_status():
-        if DatabaseClient.connection is None:
+        if DatabaseClient.pool is None:
             return ConnectionStatus.NOT_CONNECTED
-        elif DatabaseClient.connection.closed:
+        elif DatabaseClient.pool.closed:
             return ConnectionStatus.DISCONNECTED
         else:
             return ConnectionStatus.CONNECTED
@@ -1,4 +1,30 @@
+# Các cột của bảng users mà UserModel biết, theo tên (không phụ thuộc thứ tự cột trong bảng)
+USER_COLUMNS = (
+    "id",
+    "username",
+    "email",
+    "password",
+    "first_name",
+    "last_name",
+    "date_of_birth",
+    "gender",
+    "phone",
+    "address",
+    "current_latitude",
+    "current_longitude",
+    "current_diseases",
+    "role",
+    "is_active",
+)
+
+# Các cột được phép trả ra ngoài (không có password)
+USER_PUBLIC_COLUMNS = tuple(column for column in USER_COLUMNS if column != "password")
+
+
 class UserModel:
+    # Không có __dict__ riêng cho mỗi instance
+    __slots__ = USER_COLUMNS
+
     def __init__(
         self,
         id,
@@ -34,5 +60,13 @@ class UserModel:
         self.is_active = is_active
 
     @staticmethod
-    def from_row(row):
-        return UserModel(*row)
+    def from_row(row, columns=USER_COLUMNS):
+        """
+        Dựng user từ một dòng đã SELECT đúng các cột `columns` (theo thứ tự đó).
+        Cột không được SELECT thì không có trên object: đọc nó là AttributeError
+        chứ không âm thầm ra None.
+        """
+        user = UserModel.__new__(UserModel)
+        for column, value in zip(columns, row):
+            setattr(user, column, value)
+        return user
@@ -0,0 +1,314 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import psycopg2
+from ..dao.medical_record_dao import MedicalRecordDAO
+from ..database.database import DatabaseClient
+
+WRITE_BEHIND_CONFIG = {
+    # Trả response /predict ngay, bản ghi được ghi vào DB ở thread nền
+    "enabled": os.environ.get("PREDICT_WRITE_BEHIND", "0") == "1",
+    # File SQLite giữ các bản ghi chưa ghi vào DB (còn nguyên sau khi restart)
+    "queue_path": os.environ.get("PREDICT_WRITE_BEHIND_QUEUE_PATH", "data/write_behind.sqlite3"),
+    # Số bản ghi chờ tối đa; đầy thì request chờ rồi ghi đồng bộ (backpressure)
+    "max_pending": int(os.environ.get("PREDICT_WRITE_BEHIND_MAX_PENDING", 100000)),
+    "batch_size": int(os.environ.get("PREDICT_WRITE_BEHIND_BATCH_SIZE", 500)),
+    "flush_interval_ms": float(os.environ.get("PREDICT_WRITE_BEHIND_FLUSH_INTERVAL_MS", 200)),
+    # Thời gian (giây) request chờ hàng đợi có chỗ trước khi tự ghi đồng bộ
+    "enqueue_timeout": float(os.environ.get("PREDICT_WRITE_BEHIND_ENQUEUE_TIMEOUT", 1.0)),
+    # Số id medical_records lấy trước mỗi lần từ sequence
+    "id_block_size": int(os.environ.get("PREDICT_WRITE_BEHIND_ID_BLOCK_SIZE", 100)),
+}
+
+
+def _with_pooled_cursor(fn):
+    """
+    Chạy `fn(cursor)` trên một connection riêng lấy thẳng từ pool rồi commit, để
+    không đụng tới connection (và transaction) của request đang chạy.
+    """
+    pool = DatabaseClient.pool
+    if pool is None or pool.closed:
+        raise psycopg2.InterfaceError("Database is not connected")
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cursor:
+            result = fn(cursor)
+        conn.commit()
+        return result
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+
+
+def _with_request_cursor(fn):
+    """
+    Chạy `fn(cursor)` trên connection của request đang chạy (không lấy thêm
+    connection từ pool) rồi commit.
+    """
+    conn = DatabaseClient.get_connection()
+    try:
+        with conn.cursor() as cursor:
+            result = fn(cursor)
+        conn.commit()
+        return result
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _database_unavailable(error):
+    """Lỗi do DB không kết nối được (thử lại sau), khác với lỗi của chính bản ghi."""
+    return isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError))
+
+
+class RecordIdAllocator:
+    """Cấp id medical_records từ các block lấy trước trong sequence của Postgres."""
+
+    def __init__(self, block_size=100):
+        self.block_size = block_size
+        self._ids = []
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        with self._lock:
+            if not self._ids:
+                # nextval không bị rollback, nên không cần commit connection của request
+                with DatabaseClient.get_connection().cursor() as cursor:
+                    self._ids = MedicalRecordDAO.reserve_record_ids(self.block_size, cursor)
+                self._ids.reverse()
+            return self._ids.pop()
+
+
+class PredictionWriteQueue:
+    """
+    Hàng đợi ghi sau (write-behind) cho bản ghi dự đoán.
+
+    `submit()` cấp id bản ghi, lưu bản ghi vào file SQLite (bền qua restart) và
+    trả về ngay. Thread nền gom tối đa `batch_size` bản ghi mỗi lần và ghi vào
+    Postgres bằng insert nhiều dòng trong một transaction; chỉ xoá khỏi hàng đợi
+    sau khi commit thành công, nên DB không kết nối được chỉ làm chậm việc ghi
+    chứ không mất dữ liệu. Batch lỗi vì chính bản ghi (vd. user đã bị xoá) được
+    ghi lại từng bản ghi; bản ghi vẫn lỗi được chuyển sang bảng `dead_letter`
+    (kèm lỗi) để các bản ghi sau tiếp tục được ghi. Khi hàng đợi đầy, `submit()`
+    chờ tối đa `enqueue_timeout` rồi tự ghi đồng bộ bản ghi đó trên connection
+    của request.
+    """
+
+    def __init__(
+        self,
+        queue_path,
+        max_pending=100000,
+        batch_size=500,
+        flush_interval_ms=200.0,
+        enqueue_timeout=1.0,
+        id_block_size=100,
+    ):
+        self.queue_path = queue_path
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.enqueue_timeout = enqueue_timeout
+        self.ids = RecordIdAllocator(id_block_size)
+
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._changed = threading.Condition()
+        self._pending = 0
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stopping = False
+
+        self._stats_lock = threading.Lock()
+        self._enqueued = 0
+        self._written = 0
+        self._batches = 0
+        self._failures = 0
+        self._sync_writes = 0
+        self._dead_letters = 0
+        self._backpressure_waits = 0
+        self._last_error = None
+
+    def _open(self):
+        if self._db is None:
+            directory = os.path.dirname(self.queue_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.queue_path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS pending (id INTEGER PRIMARY KEY, payload TEXT NOT NULL)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS dead_letter ("
+                "id INTEGER PRIMARY KEY, payload TEXT NOT NULL, error TEXT NOT NULL, failed_at REAL NOT NULL)"
+            )
+            self._pending = db.execute("SELECT count(*) FROM pending").fetchone()[0]
+            with self._stats_lock:
+                self._dead_letters = db.execute("SELECT count(*) FROM dead_letter").fetchone()[0]
+            self._db = db
+        return self._db
+
+    def start(self):
+        """Mở hàng đợi và chạy thread ghi (ghi nốt bản ghi còn lại từ lần chạy trước)."""
+        self._ensure_started()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                with self._db_lock:
+                    self._open()
+                self._stopping = False
+                self._thread = threading.Thread(
+                    target=self._run, name="prediction-write-behind", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, record):
+        """
+        Đưa một bản ghi dự đoán (chưa có id) vào hàng đợi. Trả về id đã cấp cho
+        bản ghi - id này sẽ là `medical_records.id` khi bản ghi được ghi vào DB.
+        """
+        self._ensure_started()
+        record = dict(record, id=self.ids.next_id())
+        payload = json.dumps(record)
+
+        deadline = time.monotonic() + self.enqueue_timeout
+        with self._changed:
+            if self._pending >= self.max_pending:
+                with self._stats_lock:
+                    self._backpressure_waits += 1
+            while self._pending >= self.max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            queue_full = self._pending >= self.max_pending
+            if not queue_full:
+                with self._db_lock:
+                    self._db.execute(
+                        "INSERT INTO pending (id, payload) VALUES (?, ?)", (record["id"], payload)
+                    )
+                self._pending += 1
+                self._changed.notify_all()
+
+        if queue_full:
+            # Hàng đợi vẫn đầy: ghi thẳng bản ghi này để không mất và không chờ vô hạn.
+            # Dùng connection request đang giữ thay vì lấy thêm từ pool lúc pool đang căng
+            _with_request_cursor(
+                lambda cursor: MedicalRecordDAO.insert_prediction_records([record], cursor)
+            )
+            with self._stats_lock:
+                self._sync_writes += 1
+        else:
+            with self._stats_lock:
+                self._enqueued += 1
+        return record["id"]
+
+    def _run(self):
+        while True:
+            with self._changed:
+                if self._pending < self.batch_size and not self._stopping:
+                    self._changed.wait(self.flush_interval)
+                if self._pending == 0:
+                    if self._stopping:
+                        return
+                    continue
+            if not self._flush_once():
+                if self._stopping:
+                    return
+                # DB không kết nối được: giữ nguyên bản ghi trong hàng đợi và thử lại sau
+                time.sleep(min(5.0, self.flush_interval * 10))
+
+    def _write(self, records):
+        _with_pooled_cursor(lambda cursor: MedicalRecordDAO.insert_prediction_records(records, cursor))
+
+    def _record_failure(self, error):
+        with self._stats_lock:
+            self._failures += 1
+            self._last_error = str(error)
+
+    def _flush_once(self):
+        """Ghi một batch. Trả về False nếu DB không kết nối được (cần chờ rồi thử lại)."""
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT id, payload FROM pending ORDER BY id LIMIT ?", (self.batch_size,)
+            ).fetchall()
+        if not rows:
+            return True
+
+        written = []
+        dead = []
+        available = True
+        try:
+            self._write([json.loads(payload) for _, payload in rows])
+            written = [record_id for record_id, _ in rows]
+        except Exception as e:
+            traceback.print_exc()
+            self._record_failure(e)
+            if _database_unavailable(e):
+                return False
+            # Có bản ghi lỗi trong batch: ghi lại từng bản ghi để tách bản ghi đó ra
+            for record_id, payload in rows:
+                try:
+                    self._write([json.loads(payload)])
+                    written.append(record_id)
+                except Exception as row_error:
+                    if _database_unavailable(row_error):
+                        self._record_failure(row_error)
+                        available = False
+                        break
+                    print(f"⚠️ Prediction record {record_id} moved to dead letter: {row_error}")
+                    dead.append((record_id, payload, str(row_error), time.time()))
+
+        done = written + [row[0] for row in dead]
+        if done:
+            with self._db_lock:
+                self._db.execute("BEGIN")
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO dead_letter (id, payload, error, failed_at) VALUES (?, ?, ?, ?)",
+                    dead,
+                )
+                self._db.executemany("DELETE FROM pending WHERE id = ?", [(i,) for i in done])
+                self._db.execute("COMMIT")
+            with self._changed:
+                self._pending -= len(done)
+                self._changed.notify_all()
+            with self._stats_lock:
+                self._written += len(written)
+                self._dead_letters += len(dead)
+                self._batches += 1
+        return available
+
+    def close(self, timeout=10.0):
+        """Ghi nốt hàng đợi (tối đa `timeout` giây) rồi dừng thread nền."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        with self._changed:
+            self._stopping = True
+            self._changed.notify_all()
+        self._thread.join(timeout)
+        if self._pending:
+            print(f"⚠️ {self._pending} prediction records left in {self.queue_path}, flushed on next start.")
+
+    def get_stats(self):
+        with self._stats_lock:
+            return {
+                "pending": self._pending,
+                "max_pending": self.max_pending,
+                "enqueued": self._enqueued,
+                "written": self._written,
+                "batches": self._batches,
+                "failures": self._failures,
+                "sync_writes": self._sync_writes,
+                "dead_letters": self._dead_letters,
+                "backpressure_waits": self._backpressure_waits,
+                "last_error": self._last_error,
+            }
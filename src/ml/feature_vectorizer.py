@@ -0,0 +1,88 @@
+import threading
+import numpy as np
+
+
+class FeatureVectorizer:
+    """
+    Chuyển dict feature của bệnh nhân thành vector đã scale mà không dùng pandas.
+
+    Được dựng một lần khi load model từ `feature_names` và tham số của
+    `StandardScaler` (mean/scale). Feature thiếu được coi là 0, feature lạ bị bỏ
+    qua - giống hành vi của đường pandas cũ.
+    """
+
+    def __init__(self, feature_names, mean=None, scale=None):
+        self.feature_names = list(feature_names)
+        self.feature_index = {name: i for i, name in enumerate(self.feature_names)}
+        n_features = len(self.feature_names)
+        self.mean = (
+            np.zeros(n_features) if mean is None else np.asarray(mean, dtype=np.float64)
+        )
+        self.scale = (
+            np.ones(n_features) if scale is None else np.asarray(scale, dtype=np.float64)
+        )
+        # Giá trị đã scale của một feature bằng 0 - dùng làm nền cho mỗi hàng
+        self._zero_row = (0.0 - self.mean) / self.scale
+        self._local = threading.local()
+
+    @classmethod
+    def from_scaler(cls, feature_names, scaler):
+        """Dựng vectorizer từ một `StandardScaler` đã fit."""
+        mean = scaler.mean_ if getattr(scaler, "with_mean", True) else None
+        scale = scaler.scale_ if getattr(scaler, "with_std", True) else None
+        return cls(feature_names, mean, scale)
+
+    @property
+    def n_features(self):
+        return len(self.feature_names)
+
+    def transform_one(self, features):
+        """
+        Trả về ma trận (1, n_features) đã scale cho một bệnh nhân.
+
+        Kết quả là buffer dùng lại theo từng thread: chỉ hợp lệ tới lần gọi
+        `transform_one` tiếp theo trên cùng thread, cần `.copy()` nếu giữ lại.
+        """
+        row = getattr(self._local, "row", None)
+        if row is None:
+            row = self._local.row = np.empty((1, self.n_features))
+        row[0] = self._zero_row
+        self._fill(row[0], features)
+        return row
+
+    def transform_many(self, features_list):
+        """
+        Vector hoá nhiều bệnh nhân vào một ma trận đã scale.
+
+        Trả về `(X, valid_indices, errors)`: `X` chỉ chứa các hàng hợp lệ theo thứ
+        tự `valid_indices`, `errors` map chỉ số bệnh nhân lỗi sang exception.
+        """
+        X = np.zeros((len(features_list), self.n_features))
+        valid = np.ones(len(features_list), dtype=bool)
+        errors = {}
+        for i, features in enumerate(features_list):
+            try:
+                self._fill_raw(X[i], features)
+            except Exception as e:
+                valid[i] = False
+                errors[i] = e
+        X = X[valid]
+        X -= self.mean
+        X /= self.scale
+        return X, np.flatnonzero(valid).tolist(), errors
+
+    def _fill(self, row, features):
+        feature_index = self.feature_index
+        mean = self.mean
+        scale = self.scale
+        for name, value in features.items():
+            j = feature_index.get(name)
+            if j is not None:
+                row[j] = (float(value) - mean[j]) / scale[j]
+
+    def _fill_raw(self, row, features):
+        feature_index = self.feature_index
+        for name, value in features.items():
+            j = feature_index.get(name)
+            if j is not None:
+                row[j] = float(value)
@@ -0,0 +1,164 @@
+import argparse
+import sys
+import time
+import numpy as np
+
+
+class CompiledForest:
+    """
+    Bản "biên dịch" của một `RandomForestClassifier` multi-label thành các mảng
+    NumPy liên tục, dùng để suy luận mà không qua lớp kiểm tra đầu vào của sklearn.
+
+    Tất cả node của mọi cây được nối vào chung một mảng. Node lá trỏ về chính nó,
+    nên việc duyệt chỉ là lặp `max_depth` bước `where(x <= threshold, left, right)`
+    cho toàn bộ (sample, cây) cùng lúc. Mỗi node lưu sẵn xác suất lớp dương (1)
+    của từng nhãn, nên kết quả là trung bình giá trị lá trên các cây - giống hệt
+    cách `RandomForestClassifier.predict_proba` tính.
+    """
+
+    def __init__(self, feature, threshold, children_left, children_right, value, roots, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.children_left = children_left
+        self.children_right = children_right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_labels(self):
+        return self.value.shape[1]
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Chuyển một `RandomForestClassifier` đã fit thành `CompiledForest`."""
+        n_outputs = model.n_outputs_
+        classes_per_label = model.classes_ if n_outputs > 1 else [model.classes_]
+        positive_index = [
+            int(np.flatnonzero(classes == 1)[0]) if 1 in classes else None
+            for classes in classes_per_label
+        ]
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            is_leaf = tree.children_left == -1
+            node_ids = np.arange(n_nodes)
+
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            lefts.append((np.where(is_leaf, node_ids, tree.children_left) + offset).astype(np.int32))
+            rights.append((np.where(is_leaf, node_ids, tree.children_right) + offset).astype(np.int32))
+
+            node_value = np.zeros((n_nodes, n_outputs))
+            for k in range(n_outputs):
+                if positive_index[k] is None:
+                    continue
+                counts = tree.value[:, k, : len(classes_per_label[k])]
+                normalizer = counts.sum(axis=1)
+                normalizer[normalizer == 0.0] = 1.0
+                node_value[:, k] = counts[:, positive_index[k]] / normalizer
+            values.append(node_value)
+
+            roots.append(offset)
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features)),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds)),
+            children_left=np.ascontiguousarray(np.concatenate(lefts)),
+            children_right=np.ascontiguousarray(np.concatenate(rights)),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max_depth,
+        )
+
+    def apply(self, X):
+        """Trả về ma trận (n_samples, n_trees) chỉ số node lá mà mỗi sample rơi vào."""
+        # sklearn so sánh ngưỡng trên X dạng float32, làm tương tự để khớp kết quả
+        X = np.asarray(X, dtype=np.float32)
+        n_samples = X.shape[0]
+        rows = np.arange(n_samples)[:, None]
+        nodes = np.broadcast_to(self.roots, (n_samples, self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.children_left[nodes], self.children_right[nodes])
+        return nodes
+
+    def predict_proba(self, X):
+        """Trả về ma trận (n_samples, n_labels) xác suất lớp dương cho từng nhãn."""
+        return self.value[self.apply(X)].mean(axis=1)
+
+
+def _sklearn_positive_proba(model, X):
+    probabilities = np.zeros((X.shape[0], model.n_outputs_))
+    probabilities_per_label = model.predict_proba(X)
+    classes_per_label = model.classes_
+    if model.n_outputs_ == 1:
+        probabilities_per_label, classes_per_label = [probabilities_per_label], [classes_per_label]
+    for k, (prob_array, classes) in enumerate(zip(probabilities_per_label, classes_per_label)):
+        if 1 in classes:
+            probabilities[:, k] = prob_array[:, np.flatnonzero(classes == 1)[0]]
+    return probabilities
+
+
+def _time_per_call(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def compare_with_sklearn(model, n_features, n_samples=1000, repeat=200, seed=42):
+    """
+    So sánh `CompiledForest` với sklearn trên dữ liệu ngẫu nhiên: sai số xác suất
+    lớn nhất và độ trễ trung bình cho một hàng và cho cả batch.
+    """
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_samples, n_features))
+    engine = CompiledForest.from_sklearn(model)
+
+    max_abs_diff = float(np.abs(engine.predict_proba(X) - _sklearn_positive_proba(model, X)).max())
+    row = X[:1]
+    return {
+        "max_abs_diff": max_abs_diff,
+        "single_row_sklearn_ms": _time_per_call(lambda: model.predict_proba(row), repeat) * 1000,
+        "single_row_compiled_ms": _time_per_call(lambda: engine.predict_proba(row), repeat) * 1000,
+        "batch_sklearn_ms": _time_per_call(lambda: model.predict_proba(X), max(1, repeat // 20)) * 1000,
+        "batch_compiled_ms": _time_per_call(lambda: engine.predict_proba(X), max(1, repeat // 20)) * 1000,
+        "batch_size": n_samples,
+    }
+
+
+if __name__ == "__main__":
+    from .train_model import HealthPredictionTrainer
+
+    parser = argparse.ArgumentParser(
+        description="Check CompiledForest parity and latency against sklearn."
+    )
+    parser.add_argument("--model-file", default="data/health_prediction_model.pkl")
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--tolerance", type=float, default=1e-9)
+    args = parser.parse_args()
+
+    trainer = HealthPredictionTrainer()
+    trainer.load_model(args.model_file)
+    report = compare_with_sklearn(
+        trainer.model, len(trainer.feature_names), n_samples=args.samples, repeat=args.repeat
+    )
+    for key, value in report.items():
+        print(f"{key}: {value:.6g}" if isinstance(value, float) else f"{key}: {value}")
+
+    if report["max_abs_diff"] > args.tolerance:
+        print(f"❌ Parity check failed: max abs diff {report['max_abs_diff']:.3g} > {args.tolerance}")
+        sys.exit(1)
+    print("✅ Parity check passed")
@@ -0,0 +1,130 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Gom các request dự đoán đơn lẻ đến gần nhau thành một lần `predict_batch`.
+
+    Mỗi caller gửi một dict feature qua `submit()` và chờ kết quả của riêng mình.
+    Thread nền lấy request đầu tiên trong hàng đợi rồi tiếp tục gom cho tới khi
+    đủ `max_batch_size` hoặc hết `max_wait_ms`, sau đó chạy một lần suy luận cho
+    cả batch.
+    """
+
+    BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+    def __init__(self, predictor, max_batch_size=32, max_wait_ms=5.0, threshold=0.5):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.predictor = predictor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.threshold = threshold
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._batches = 0
+        self._items = 0
+        self._max_batch_size_seen = 0
+        self._batch_size_counts = [0] * (len(self.BATCH_SIZE_BUCKETS) + 1)
+        self._total_queue_wait = 0.0
+        self._max_queue_wait = 0.0
+        self._total_inference_time = 0.0
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="predict-micro-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, features, timeout=None):
+        """Đưa một dict feature vào hàng đợi và chờ kết quả dự đoán của nó."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((features, time.monotonic(), future))
+        return future.result(timeout)
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _flush(self, batch):
+        dequeued_at = time.monotonic()
+        try:
+            results = self.predictor.predict_batch(
+                [features for features, _, _ in batch], threshold=self.threshold
+            )
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        finished_at = time.monotonic()
+
+        for (_, _, future), result in zip(batch, results):
+            result.pop("patient_id", None)
+            if "error" in result:
+                future.set_exception(ValueError(result["error"]))
+            else:
+                future.set_result(result)
+
+        waits = [dequeued_at - enqueued_at for _, enqueued_at, _ in batch]
+        with self._stats_lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._max_batch_size_seen = max(self._max_batch_size_seen, len(batch))
+            bucket = next(
+                (i for i, bound in enumerate(self.BATCH_SIZE_BUCKETS) if len(batch) <= bound),
+                len(self.BATCH_SIZE_BUCKETS),
+            )
+            self._batch_size_counts[bucket] += 1
+            self._total_queue_wait += sum(waits)
+            self._max_queue_wait = max(self._max_queue_wait, max(waits))
+            self._total_inference_time += finished_at - dequeued_at
+
+    def get_stats(self):
+        with self._stats_lock:
+            histogram = {
+                f"le_{bound}": count
+                for bound, count in zip(self.BATCH_SIZE_BUCKETS, self._batch_size_counts)
+            }
+            histogram["gt_" + str(self.BATCH_SIZE_BUCKETS[-1])] = self._batch_size_counts[-1]
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": self._items / self._batches if self._batches else 0.0,
+                "max_batch_size_seen": self._max_batch_size_seen,
+                "batch_size_histogram": histogram,
+                "avg_queue_wait_ms": (
+                    self._total_queue_wait / self._items * 1000 if self._items else 0.0
+                ),
+                "max_queue_wait_ms": self._max_queue_wait * 1000,
+                "avg_batch_inference_ms": (
+                    self._total_inference_time / self._batches * 1000 if self._batches else 0.0
+                ),
+            }
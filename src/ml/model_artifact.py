@@ -0,0 +1,170 @@
+import argparse
+import json
+import os
+import shutil
+from datetime import datetime
+import numpy as np
+from .forest_engine import CompiledForest
+
+# Lưu/serve model qua artifact mmap (mảng .npy + meta.json) bên cạnh file pickle.
+# Khi bật, suy luận luôn dùng engine mảng phẳng (bất kể USE_COMPILED_FOREST)
+MODEL_MMAP_ARTIFACT = os.environ.get("MODEL_MMAP_ARTIFACT", "0") == "1"
+
+# Phiên bản định dạng thư mục artifact; tăng khi đổi cấu trúc file
+ARTIFACT_FORMAT_VERSION = 1
+
+META_FILE = "meta.json"
+
+# File con trỏ trong thư mục artifact, ghi tên thư mục phiên bản đang active
+ARTIFACT_POINTER = "CURRENT"
+
+# Số lần thử lại khi phiên bản vừa đọc từ con trỏ bị xoá trước khi kịp mở
+LOAD_RETRIES = 3
+
+# Các mảng của CompiledForest được lưu thành file .npy riêng (không nén)
+FOREST_ARRAYS = ("feature", "threshold", "children_left", "children_right", "value", "roots")
+
+
+def artifact_dir_for(model_file):
+    """Thư mục artifact mmap đi kèm một file model pickle (`x.pkl` -> `x.forest/`)."""
+    return os.path.splitext(model_file)[0] + ".forest"
+
+
+def _read_pointer(directory):
+    try:
+        with open(os.path.join(directory, ARTIFACT_POINTER)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def current_version_dir(directory):
+    """
+    Thư mục phiên bản đang active trong `directory` (theo con trỏ `CURRENT`).
+    Artifact định dạng cũ (không có con trỏ) có file nằm ngay trong `directory`.
+    """
+    version = _read_pointer(directory)
+    return os.path.join(directory, version) if version else directory
+
+
+def is_artifact_fresh(model_file):
+    """True nếu thư mục artifact tồn tại và không cũ hơn file pickle."""
+    meta_path = os.path.join(current_version_dir(artifact_dir_for(model_file)), META_FILE)
+    if not os.path.exists(meta_path):
+        return False
+    if not os.path.exists(model_file):
+        return True
+    return os.path.getmtime(meta_path) >= os.path.getmtime(model_file)
+
+
+def export_artifact(trainer, model_data, model_file):
+    """
+    Ghi artifact dạng thư mục cho model đang có trong `trainer`: các mảng cây
+    (`*.npy`, không nén) để load bằng mmap và `meta.json` chứa feature_names,
+    label_columns, tham số scaler.
+
+    Mỗi lần ghi tạo một thư mục phiên bản mới trong `x.forest/` rồi đổi con trỏ
+    `CURRENT` bằng `os.replace` (nguyên tử), nên process khác luôn thấy trọn một
+    phiên bản, cũ hoặc mới. Chỉ xoá các phiên bản cũ hơn phiên bản trước đó.
+    """
+    root = artifact_dir_for(model_file)
+    os.makedirs(root, exist_ok=True)
+    previous = _read_pointer(root)
+    # Tên bắt đầu bằng thời điểm tạo để so sánh được thứ tự các phiên bản
+    version = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{os.getpid()}"
+    tmp = os.path.join(root, f"{version}.tmp")
+    os.makedirs(tmp)
+
+    forest = CompiledForest.from_sklearn(trainer.model)
+    for name in FOREST_ARRAYS:
+        np.save(os.path.join(tmp, f"{name}.npy"), getattr(forest, name))
+
+    scaler = trainer.scaler
+    meta = {
+        "format_version": ARTIFACT_FORMAT_VERSION,
+        "feature_names": list(trainer.feature_names),
+        "label_columns": list(trainer.label_columns),
+        "scaler_mean": scaler.mean_.tolist() if getattr(scaler, "with_mean", True) else None,
+        "scaler_scale": scaler.scale_.tolist() if getattr(scaler, "with_std", True) else None,
+        "max_depth": forest.max_depth,
+        "n_trees": forest.n_trees,
+        "total_training_count": model_data.get("total_training_count", 0),
+        "last_record_id": model_data.get("last_record_id"),
+        "trained_at": model_data.get("trained_at"),
+        "model_type": model_data.get("model_type"),
+    }
+    with open(os.path.join(tmp, META_FILE), "w") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    target = os.path.join(root, version)
+    os.rename(tmp, target)
+    pointer = os.path.join(root, ARTIFACT_POINTER)
+    pointer_tmp = f"{pointer}.{os.getpid()}.tmp"
+    with open(pointer_tmp, "w") as f:
+        f.write(version)
+    os.replace(pointer_tmp, pointer)
+
+    _remove_old_versions(root, previous)
+    print(f"💾 Memory-mapped artifact saved to {target}")
+    return target
+
+
+def _remove_old_versions(root, previous):
+    """
+    Xoá file của định dạng cũ và các phiên bản cũ hơn `previous`. Giữ `previous`
+    (process khác có thể vừa đọc con trỏ trỏ tới nó) và mọi phiên bản mới hơn
+    (có thể do một process khác đang ghi song song).
+    """
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if os.path.isdir(path):
+            if previous and not name.endswith(".tmp") and name < previous:
+                shutil.rmtree(path, ignore_errors=True)
+        elif name == META_FILE or name.endswith(".npy"):
+            os.remove(path)
+
+
+def load_artifact(model_file):
+    """
+    Load artifact của `model_file`. Trả về `(forest, meta)`; các mảng của `forest`
+    là `np.memmap` chỉ đọc nên nhiều process cùng host dùng chung page cache.
+    """
+    root = artifact_dir_for(model_file)
+    for attempt in range(LOAD_RETRIES):
+        directory = current_version_dir(root)
+        try:
+            return _load_version(directory)
+        except FileNotFoundError:
+            # Phiên bản bị xoá giữa lúc đọc con trỏ và mở file: đọc lại con trỏ
+            if attempt == LOAD_RETRIES - 1:
+                raise
+
+
+def _load_version(directory):
+    with open(os.path.join(directory, META_FILE)) as f:
+        meta = json.load(f)
+    if meta.get("format_version") != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported artifact format {meta.get('format_version')} in {directory}"
+        )
+
+    arrays = {
+        name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+        for name in FOREST_ARRAYS
+    }
+    forest = CompiledForest(max_depth=meta["max_depth"], **arrays)
+    print(f"📂 Memory-mapped model loaded from {directory}")
+    return forest, meta
+
+
+if __name__ == "__main__":
+    from .train_model import HealthPredictionTrainer
+
+    parser = argparse.ArgumentParser(
+        description="Export a pickled model to the memory-mapped artifact format."
+    )
+    parser.add_argument("--model-file", default="data/health_prediction_model.pkl")
+    args = parser.parse_args()
+
+    trainer = HealthPredictionTrainer()
+    export_artifact(trainer, trainer.load_model(args.model_file), args.model_file)
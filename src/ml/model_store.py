@@ -0,0 +1,41 @@
+import os
+from datetime import datetime
+
+DEFAULT_MODEL_FILE = "data/health_prediction_model.pkl"
+
+# Thư mục chứa các phiên bản model do training worker tạo ra
+MODEL_DIR = os.environ.get("MODEL_DIR", "data/models")
+
+# File con trỏ ghi tên artifact đang được dùng (cập nhật nguyên tử)
+CURRENT_POINTER = "CURRENT"
+
+
+def new_artifact_path(model_dir=MODEL_DIR):
+    """Đường dẫn cho một phiên bản model mới, đặt tên theo thời điểm tạo."""
+    version = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    return os.path.join(model_dir, f"health_prediction_model_{version}.pkl")
+
+
+def resolve_current_model(default=DEFAULT_MODEL_FILE, model_dir=MODEL_DIR):
+    """
+    Trả về artifact model đang active: file mà con trỏ `CURRENT` chỉ tới nếu có,
+    ngược lại là `default`.
+    """
+    pointer = os.path.join(model_dir, CURRENT_POINTER)
+    try:
+        with open(pointer) as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return default
+    path = os.path.join(model_dir, name)
+    return path if name and os.path.exists(path) else default
+
+
+def set_current_model(path, model_dir=MODEL_DIR):
+    """Trỏ `CURRENT` sang artifact `path` (ghi file tạm rồi rename để không bao giờ đọc dở)."""
+    os.makedirs(model_dir, exist_ok=True)
+    pointer = os.path.join(model_dir, CURRENT_POINTER)
+    tmp = f"{pointer}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(os.path.relpath(path, model_dir))
+    os.replace(tmp, pointer)
@@ -4,55 +4,212 @@ from datetime import datetime
 import joblib
 import argparse
 import json
+import os
+import time
 from .train_model import HealthPredictionTrainer
+from .feature_vectorizer import FeatureVectorizer
+from .forest_engine import CompiledForest
+from .model_store import DEFAULT_MODEL_FILE
+from .model_artifact import MODEL_MMAP_ARTIFACT, export_artifact, is_artifact_fresh, load_artifact
+from .prediction_cache import PREDICTION_CACHE_CONFIG, PredictionCache
+from ..util.metrics import record_inference
 
+# Bật engine suy luận dạng mảng phẳng thay cho predict_proba của sklearn
+USE_COMPILED_FOREST = os.environ.get("USE_COMPILED_FOREST", "0") == "1"
 
-class HealthPredictor:
-    def __init__(self, model_file="data/health_prediction_model.pkl"):
-        self.trainer = HealthPredictionTrainer()
-        self.model_file = model_file
-        self.model_data = None
 
-    def load_model(self):
-        """Load model đã train."""
-        try:
-            self.model_data = self.trainer.load_model(self.model_file)
-            print("✅ Model loaded successfully!")
-        except Exception as e:
-            print(f"Train model failed {e}")
+class ModelNotReadyError(RuntimeError):
+    """Raised when a prediction is requested before any model has been loaded."""
 
-    def predict_single(self, patient_data, threshold=0.5):
-        """Dự đoán cho 1 bệnh nhân (multi-label)."""
-        if not self.model_data:
-            self.load_model()
+    code = 503
 
-        df = pd.DataFrame([patient_data])
 
-        for feature in self.trainer.feature_names:
-            if feature not in df.columns:
-                df[feature] = 0
+class LoadedModel:
+    """
+    Một phiên bản model đã load, gồm mọi thứ cần để suy luận. Không bị sửa sau
+    khi tạo, nên request nào đã lấy được nó thì chạy trọn trên phiên bản đó kể cả
+    khi model được thay giữa chừng.
+
+    Khi bật artifact mmap, cây được đọc từ các file `.npy` bằng `mmap_mode="r"`
+    (không unpickle, không giữ bản sklearn trong RAM riêng của process); nếu
+    artifact chưa có hoặc cũ hơn file pickle thì nó được tạo từ pickle trước.
+
+    Cache dự đoán (nếu bật) thuộc về phiên bản model này, nên tự bị bỏ khi model
+    được thay.
+    """
+
+    def __init__(
+        self,
+        model_file,
+        use_compiled_forest,
+        use_mmap_artifact=MODEL_MMAP_ARTIFACT,
+        prediction_cache_size=0,
+        prediction_cache_buckets=None,
+    ):
+        self.model_file = model_file
+        self.trainer = None
+        self.memory_mapped = use_mmap_artifact and self._ensure_artifact()
+        if self.memory_mapped:
+            self.forest_engine, self.model_data = load_artifact(model_file)
+            self.label_columns = list(self.model_data["label_columns"])
+            self.vectorizer = FeatureVectorizer(
+                self.model_data["feature_names"],
+                self.model_data["scaler_mean"],
+                self.model_data["scaler_scale"],
+            )
+        else:
+            self.trainer = HealthPredictionTrainer()
+            self.model_data = self.trainer.load_model(model_file)
+            self.label_columns = list(self.trainer.label_columns)
+            self.vectorizer = FeatureVectorizer.from_scaler(
+                self.trainer.feature_names, self.trainer.scaler
+            )
+            self.forest_engine = (
+                CompiledForest.from_sklearn(self.trainer.model) if use_compiled_forest else None
+            )
+        self.prediction_cache = (
+            PredictionCache(
+                self.vectorizer.feature_names, prediction_cache_size, prediction_cache_buckets
+            )
+            if prediction_cache_size
+            else None
+        )
+        self.version = self.model_data.get("trained_at")
+        self.loaded_at = datetime.now().isoformat()
+
+    def _ensure_artifact(self):
+        """Tạo artifact mmap từ pickle nếu cần. Trả về False nếu không tạo được."""
+        if is_artifact_fresh(self.model_file):
+            return True
+        try:
+            trainer = HealthPredictionTrainer()
+            export_artifact(trainer, trainer.load_model(self.model_file), self.model_file)
+            return True
+        except FileNotFoundError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Could not export memory-mapped artifact, serving from pickle: {e}")
+            return False
 
-        df = df[self.trainer.feature_names]
-        X_scaled = self.trainer.scaler.transform(df)
+    def positive_probabilities(self, X_scaled):
+        """
+        Trả về ma trận (n_samples, n_labels) xác suất lớp dương (1) cho từng nhãn.
+        Nhãn nào mà model chưa từng thấy lớp 1 thì xác suất là 0.
+        """
+        if self.forest_engine is not None:
+            return self.forest_engine.predict_proba(X_scaled)
 
-        # --- Robust Probability Extraction ---
         probabilities_per_label = self.trainer.model.predict_proba(X_scaled)
         model_classes_per_label = self.trainer.model.classes_
 
-        positive_probabilities = []
+        positive_probabilities = np.zeros((X_scaled.shape[0], len(self.label_columns)))
         for i, prob_array in enumerate(probabilities_per_label):
             classes_for_this_label = model_classes_per_label[i]
-            prob_for_this_sample = prob_array[0]
-
             if 1 in classes_for_this_label:
                 class_1_index = np.where(classes_for_this_label == 1)[0][0]
-                positive_probabilities.append(prob_for_this_sample[class_1_index])
-            else:
-                positive_probabilities.append(0.0)
+                positive_probabilities[:, i] = prob_array[:, class_1_index]
+        return positive_probabilities
+
+    def get_info(self):
+        return {
+            "model_file": self.model_file,
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "model_type": self.model_data.get("model_type"),
+            "compiled_forest": self.forest_engine is not None,
+            "memory_mapped": self.memory_mapped,
+            "prediction_cache": self.prediction_cache is not None,
+        }
+
+
+class HealthPredictor:
+    def __init__(
+        self,
+        model_file=DEFAULT_MODEL_FILE,
+        use_compiled_forest=USE_COMPILED_FOREST,
+        prediction_cache_size=PREDICTION_CACHE_CONFIG["max_size"],
+        prediction_cache_buckets=PREDICTION_CACHE_CONFIG["buckets"],
+    ):
+        self.model_file = model_file
+        self.use_compiled_forest = use_compiled_forest
+        self.prediction_cache_size = prediction_cache_size
+        self.prediction_cache_buckets = prediction_cache_buckets
+        self._model = None
+
+    @property
+    def model(self):
+        """Phiên bản model đang phục vụ (None nếu chưa load)."""
+        return self._model
+
+    @property
+    def model_data(self):
+        return self._model.model_data if self._model else None
+
+    @property
+    def trainer(self):
+        return self._model.trainer if self._model else None
 
-        all_probabilities = dict(
-            zip(self.trainer.label_columns, positive_probabilities)
+    def is_ready(self):
+        return self._model is not None
+
+    def get_cache_stats(self):
+        """Thống kê cache dự đoán của model đang phục vụ (None nếu tắt)."""
+        model = self._model
+        if model is None or model.prediction_cache is None:
+            return None
+        return model.prediction_cache.get_stats()
+
+    def load_model(self):
+        """Load model đã train. Lỗi được ném ra cho nơi gọi (lúc khởi động) xử lý."""
+        return self.swap_model(self.model_file)
+
+    def swap_model(self, model_file):
+        """
+        Load `model_file` rồi thay model đang phục vụ bằng một phép gán duy nhất.
+        Lỗi khi load được ném ra và model cũ vẫn giữ nguyên.
+        """
+        loaded = LoadedModel(
+            model_file,
+            self.use_compiled_forest,
+            prediction_cache_size=self.prediction_cache_size,
+            prediction_cache_buckets=self.prediction_cache_buckets,
         )
+        self._model = loaded
+        self.model_file = model_file
+        print("✅ Model loaded successfully!")
+        return loaded
+
+    def _get_model(self):
+        # Không bao giờ load đồng bộ trong request: model do lúc khởi động hoặc
+        # training worker nạp vào
+        model = self._model
+        if model is None:
+            raise ModelNotReadyError("Prediction model is not loaded yet")
+        return model
+
+    def predict_single(self, patient_data, threshold=0.5):
+        """Dự đoán cho 1 bệnh nhân (multi-label)."""
+        model = self._get_model()
+
+        cache = model.prediction_cache
+        if cache is not None:
+            key, patient_data = cache.quantize(patient_data)
+            positive_probabilities = cache.get(key)
+            if positive_probabilities is not None:
+                return self._build_result(model, positive_probabilities, threshold)
+
+        started = time.perf_counter()
+        X_scaled = model.vectorizer.transform_one(patient_data)
+
+        positive_probabilities = model.positive_probabilities(X_scaled)[0]
+        record_inference("single", 1, time.perf_counter() - started)
+        if cache is not None:
+            cache.put(key, positive_probabilities.copy())
+        return self._build_result(model, positive_probabilities, threshold)
+
+    def _build_result(self, model, positive_probabilities, threshold):
+        """Đóng gói xác suất của 1 bệnh nhân thành kết quả trả về."""
+        all_probabilities = dict(zip(model.label_columns, positive_probabilities.tolist()))
 
         predicted_diseases = {
             label: float(prob)
@@ -75,15 +232,74 @@ class HealthPredictor:
 
         return result
 
-    def predict_batch(self, patients_data):
-        """Dự đoán cho nhiều bệnh nhân"""
-        results = []
-        for i, patient in enumerate(patients_data):
-            try:
-                result = self.predict_single(patient)
+    def predict_batch(self, patients_data, threshold=0.5):
+        """
+        Dự đoán cho nhiều bệnh nhân trong một lần gọi model.
+
+        Toàn bộ bệnh nhân hợp lệ được gom vào một ma trận feature, scale một lần
+        và chạy `predict_proba` một lần. Bệnh nhân có dữ liệu lỗi nhận kết quả
+        `{"patient_id": i, "error": ...}` mà không ảnh hưởng các bệnh nhân khác.
+        """
+        model = self._get_model()
+        if model.prediction_cache is not None:
+            return self._predict_batch_cached(model, patients_data, threshold)
+
+        started = time.perf_counter()
+        X_scaled, valid_indices, errors = model.vectorizer.transform_many(patients_data)
+
+        results = [None] * len(patients_data)
+        for i, e in errors.items():
+            print(f"Error predicting for patient {i}: {e}")
+            results[i] = {"patient_id": i, "error": str(e)}
+
+        if valid_indices:
+            positive_probabilities = model.positive_probabilities(X_scaled)
+            record_inference("batch", len(valid_indices), time.perf_counter() - started)
+            for i, probabilities in zip(valid_indices, positive_probabilities):
+                result = self._build_result(model, probabilities, threshold)
                 result["patient_id"] = i
-                results.append(result)
+                results[i] = result
+
+        return results
+
+    def _predict_batch_cached(self, model, patients_data, threshold):
+        """
+        `predict_batch` khi có cache: tra cache theo khoá của từng bệnh nhân, chỉ
+        chạy model một lần cho các khoá chưa có (mỗi khoá một hàng).
+        """
+        cache = model.prediction_cache
+        results = [None] * len(patients_data)
+        probabilities_by_key = {}
+        keys = {}
+        missing = {}
+        for i, patient_data in enumerate(patients_data):
+            try:
+                key, quantized = cache.quantize(patient_data)
             except Exception as e:
                 print(f"Error predicting for patient {i}: {e}")
-                results.append({"patient_id": i, "error": str(e)})
+                results[i] = {"patient_id": i, "error": str(e)}
+                continue
+            keys[i] = key
+            if key in probabilities_by_key or key in missing:
+                continue
+            probabilities = cache.get(key)
+            if probabilities is None:
+                missing[key] = quantized
+            else:
+                probabilities_by_key[key] = probabilities
+
+        if missing:
+            started = time.perf_counter()
+            X_scaled, _, _ = model.vectorizer.transform_many(list(missing.values()))
+            positive_probabilities = model.positive_probabilities(X_scaled)
+            record_inference("batch", len(missing), time.perf_counter() - started)
+            for key, probabilities in zip(missing, positive_probabilities):
+                probabilities = probabilities.copy()
+                cache.put(key, probabilities)
+                probabilities_by_key[key] = probabilities
+
+        for i, key in keys.items():
+            result = self._build_result(model, probabilities_by_key[key], threshold)
+            result["patient_id"] = i
+            results[i] = result
         return results
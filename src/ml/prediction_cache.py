@@ -0,0 +1,112 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+from ..data.dao.medical_record_dao import BASE_FEATURE_COLUMNS
+from ..util.metrics import record_cache_lookups
+
+
+def _parse_buckets(spec):
+    """'age=5,weather_temp=2' -> {"age": 5.0, "weather_temp": 2.0}"""
+    buckets = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, size = item.partition("=")
+        buckets[name.strip()] = float(size)
+    return buckets
+
+
+PREDICTION_CACHE_CONFIG = {
+    # Số kết quả tối đa giữ trong cache (LRU); 0 = tắt cache
+    "max_size": int(os.environ.get("PREDICTION_CACHE_SIZE", 0)),
+    # Độ rộng bucket của các feature số; feature cơ bản không có ở đây được giữ nguyên giá trị
+    "buckets": _parse_buckets(
+        os.environ.get("PREDICTION_CACHE_BUCKETS", "age=5,weather_temp=2,humidity=5")
+    ),
+}
+
+
+class PredictionCache:
+    """
+    Cache LRU kết quả suy luận (xác suất lớp dương của từng nhãn) cho một phiên
+    bản model - model mới có cache mới, nên không cần xoá thủ công khi swap.
+
+    Khoá gồm chỉ số bucket của các feature cơ bản (tuổi, thời tiết, ...) và một
+    bitmask các triệu chứng có mặt. Để mọi bệnh nhân cùng khoá nhận cùng một kết
+    quả (không phụ thuộc ai tới trước), model luôn được chạy trên feature đã
+    lượng tử hoá: giá trị số được thay bằng tâm bucket, triệu chứng là 0/1.
+    """
+
+    def __init__(self, feature_names, max_size, buckets=None):
+        self.max_size = max_size
+        self.buckets = dict(buckets or {})
+        self.base_features = [name for name in feature_names if name in BASE_FEATURE_COLUMNS]
+        symptom_names = [name for name in feature_names if name not in BASE_FEATURE_COLUMNS]
+        self.symptom_bits = {name: 1 << i for i, name in enumerate(symptom_names)}
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def quantize(self, features):
+        """
+        Trả về `(key, quantized_features)`. Feature lạ bị bỏ qua, feature cơ bản
+        thiếu được coi là 0 - giống `FeatureVectorizer`.
+        """
+        key = []
+        quantized = {}
+        for name in self.base_features:
+            value = float(features.get(name, 0))
+            size = self.buckets.get(name)
+            if size:
+                bucket = math.floor(value / size)
+                quantized[name] = (bucket + 0.5) * size
+            else:
+                bucket = value
+                quantized[name] = value
+            key.append(bucket)
+
+        mask = 0
+        symptom_bits = self.symptom_bits
+        for name, value in features.items():
+            bit = symptom_bits.get(name)
+            if bit is not None and float(value):
+                mask |= bit
+                quantized[name] = 1
+        key.append(mask)
+        return tuple(key), quantized
+
+    def get(self, key):
+        with self._lock:
+            probabilities = self._entries.get(key)
+            if probabilities is None:
+                self._misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self._hits += 1
+        hit = probabilities is not None
+        record_cache_lookups(hits=int(hit), misses=int(not hit))
+        return probabilities
+
+    def put(self, key, probabilities):
+        probabilities.setflags(write=False)
+        with self._lock:
+            self._entries[key] = probabilities
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else None,
+                "evictions": self._evictions,
+                "buckets": self.buckets,
+            }
@@ -6,16 +6,41 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import classification_report, accuracy_score, hamming_loss
 import joblib
 from datetime import datetime
+import json
 import os
+import time
 import warnings
-from ..data.dao.medical_record_dao import MedicalRecordDAO
+from ..data.dao.medical_record_dao import MedicalRecordDAO, TRAINING_CHUNK_SIZE
+from ..data.dao.model_training_history_dao import ModelTrainingHistoryDAO
 from ..data.database.database import DatabaseClient
+from .model_artifact import MODEL_MMAP_ARTIFACT, export_artifact
 
 # Ignore warnings for labels with no predicted samples
 warnings.filterwarnings(
     "ignore", category=UserWarning, module="sklearn.metrics._classification"
 )
 
+TRAINING_CONFIG = {
+    # Stream dữ liệu training theo chunk thay vì tải toàn bộ vào một DataFrame
+    "streaming": os.environ.get("TRAINING_STREAMING", "0") == "1",
+    "chunk_size": int(os.environ.get("TRAINING_CHUNK_SIZE", TRAINING_CHUNK_SIZE)),
+    # Số core dùng để fit forest (-1 = tất cả)
+    "n_jobs": int(os.environ.get("TRAINING_N_JOBS", 1)),
+}
+
+INCREMENTAL_CONFIG = {
+    # Chỉ train trên bản ghi mới kể từ lần train hoàn tất gần nhất, thêm cây vào model cũ
+    "enabled": os.environ.get("TRAINING_INCREMENTAL", "0") == "1",
+    "trees_per_increment": int(os.environ.get("TRAINING_TREES_PER_INCREMENT", 20)),
+    # Vượt quá số cây này thì train lại từ đầu
+    "max_estimators": int(os.environ.get("TRAINING_MAX_ESTIMATORS", 500)),
+    # Dữ liệu mới vượt quá tỉ lệ này so với lần train trước thì train lại từ đầu
+    "max_new_fraction": float(os.environ.get("TRAINING_MAX_NEW_FRACTION", 0.5)),
+    # Trung bình feature của dữ liệu mới lệch quá ngưỡng này (tính theo độ lệch chuẩn
+    # của scaler) thì coi là drift và train lại từ đầu
+    "drift_threshold": float(os.environ.get("TRAINING_DRIFT_THRESHOLD", 1.0)),
+}
+
 
 class HealthPredictionTrainer:
     def __init__(self):
@@ -23,10 +48,20 @@ class HealthPredictionTrainer:
         self.scaler = StandardScaler()
         self.label_columns = []
         self.feature_names = []
+        self.training_data_count = 0
+        self.total_training_count = 0
+        self.last_record_id = None
+        self.n_jobs = TRAINING_CONFIG["n_jobs"]
+        # Callback nhận tên từng giai đoạn training (dùng để báo tiến độ)
+        self.progress_callback = None
+
+    def _report_progress(self, stage):
+        if self.progress_callback is not None:
+            self.progress_callback(stage)
 
     def get_label_columns(self):
         """Gets the list of disease codes to identify label columns."""
-        conn = DatabaseClient.connection
+        conn = DatabaseClient.get_connection()
         try:
             diseases_df = pd.read_sql("SELECT code FROM diseases", conn)
             return diseases_df["code"].tolist()
@@ -60,21 +95,88 @@ class HealthPredictionTrainer:
         )
         return X, Y
 
-    def _train(self):
-        """Train mô hình multi-label."""
-        print("🤖 Starting multi-label model training...")
+    def _load_training_matrix(
+        self, streaming, chunk_size, min_record_id=None, max_record_id=None
+    ):
+        """Trả về (X, Y) để train, hoặc (None, None) nếu không có dữ liệu."""
+        self._report_progress("loading_data")
+        self.training_data_count = 0
+        if streaming:
+            data = MedicalRecordDAO.get_training_matrix(
+                chunk_size=chunk_size,
+                min_record_id=min_record_id,
+                max_record_id=max_record_id,
+            )
+            if data is None:
+                print("❌ Training stopped due to lack of data.")
+                return None, None
+            X, Y, self.feature_names, self.label_columns = data
+            print(
+                f"Identified {len(self.feature_names)} features and {len(self.label_columns)} labels."
+            )
+            self.training_data_count = len(X)
+            return X, Y
 
-        df = MedicalRecordDAO.get_training_data()
+        df = MedicalRecordDAO.get_training_data(
+            min_record_id=min_record_id, max_record_id=max_record_id
+        )
 
         if df is None or df.empty:
             print("❌ Training stopped due to lack of data.")
-            return None, 0
+            return None, None
 
         X, Y = self.prepare_features_and_labels(df)
 
         if X is None or Y.empty:
             print("❌ Training stopped due to feature/label preparation failure.")
+            return None, None
+        self.training_data_count = len(X)
+        return X, Y
+
+    def _load_matrix_files(self, data_dir):
+        """
+        Load ma trận training đã ghi sẵn ra file (`manifest.json`, `X.npy`, `Y.npy`,
+        ví dụ do `src.tools.synthetic_data --format npy` tạo) bằng mmap.
+        """
+        self._report_progress("loading_data")
+        with open(os.path.join(data_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+        X = np.load(os.path.join(data_dir, manifest["files"]["X"]), mmap_mode="r")
+        Y = np.load(os.path.join(data_dir, manifest["files"]["Y"]), mmap_mode="r")
+        self.feature_names = list(manifest["feature_names"])
+        self.label_columns = list(manifest["label_columns"])
+        self.training_data_count = len(X)
+        print(f"📂 Loaded {len(X)} records from {data_dir}")
+        return X, Y
+
+    def train_from_files(self, data_dir, filename=None):
+        """
+        Train lại từ đầu trên ma trận đã ghi ra file thay vì đọc từ database (không
+        ghi model_training_history). Trả về True nếu đã lưu model.
+        """
+        print(f"🏥 Training from files in {data_dir}")
+        accuracy, h_loss = self._train(data_dir=data_dir)
+        if accuracy is None:
+            return False
+        self._report_progress("saving")
+        self.last_record_id = None
+        self.save_model(filename)
+        print(f"\n✅ Training completed. Subset Accuracy: {accuracy:.4f}, Hamming Loss: {h_loss:.4f}")
+        return True
+
+    def _train(
+        self, streaming=False, chunk_size=TRAINING_CHUNK_SIZE, max_record_id=None, data_dir=None
+    ):
+        """Train mô hình multi-label."""
+        print("🤖 Starting multi-label model training...")
+
+        if data_dir is not None:
+            X, Y = self._load_matrix_files(data_dir)
+        else:
+            X, Y = self._load_training_matrix(streaming, chunk_size, max_record_id=max_record_id)
+        if X is None:
             return None, 0
+        self.total_training_count = self.training_data_count
 
         # Split data (stratify is not supported for multi-label)
         X_train, X_test, y_train, y_test = train_test_split(
@@ -87,12 +189,20 @@ class HealthPredictionTrainer:
 
         # Train model
         print("🎯 Training Random Forest model for multi-label classification...")
+        self._report_progress("fitting")
         self.model = RandomForestClassifier(
-            n_estimators=100, max_depth=10, random_state=42, class_weight="balanced"
+            n_estimators=100,
+            max_depth=10,
+            random_state=42,
+            class_weight="balanced",
+            n_jobs=self.n_jobs,
         )
         self.model.fit(X_train_scaled, y_train)
+        # Model được lưu để phục vụ từng request nhỏ: suy luận tuần tự nhanh hơn
+        self.model.set_params(n_jobs=None)
 
         # Evaluate
+        self._report_progress("evaluating")
         y_pred = self.model.predict(X_test_scaled)
         subset_accuracy = accuracy_score(y_test, y_pred)
         h_loss = hamming_loss(y_test, y_pred)
@@ -106,6 +216,87 @@ class HealthPredictionTrainer:
 
         return subset_accuracy, h_loss
 
+    def _full_refit_reason(self, X_new, y_new, base_features, base_labels):
+        """
+        Trả về lý do cần train lại từ đầu thay vì thêm cây, hoặc None nếu có thể
+        train incremental trên dữ liệu mới.
+        """
+        if self.feature_names != base_features or self.label_columns != base_labels:
+            return "feature or label columns changed"
+
+        n_trees = len(self.model.estimators_) + INCREMENTAL_CONFIG["trees_per_increment"]
+        if n_trees > INCREMENTAL_CONFIG["max_estimators"]:
+            return f"ensemble would exceed {INCREMENTAL_CONFIG['max_estimators']} trees"
+
+        if self.total_training_count and (
+            len(X_new) > INCREMENTAL_CONFIG["max_new_fraction"] * self.total_training_count
+        ):
+            return f"{len(X_new)} new records vs {self.total_training_count} already trained"
+
+        mean_shift = np.abs(np.asarray(X_new, dtype=np.float64).mean(axis=0) - self.scaler.mean_)
+        drift = float((mean_shift / self.scaler.scale_).max())
+        if drift > INCREMENTAL_CONFIG["drift_threshold"]:
+            return f"feature drift {drift:.2f} std exceeds threshold"
+
+        # warm_start tính lại classes_ từ dữ liệu mới: phải khớp với các cây cũ
+        y_new = np.asarray(y_new)
+        for k, classes in enumerate(self.model.classes_):
+            if set(np.unique(y_new[:, k]).tolist()) != set(classes.tolist()):
+                return f"label {self.label_columns[k]} has different classes in new data"
+        return None
+
+    def _train_incremental(self, streaming, chunk_size, min_record_id, max_record_id):
+        """
+        Thêm cây vào model hiện có, chỉ dùng bản ghi trong (min_record_id, max_record_id].
+
+        Trả về `(status, accuracy, h_loss)` với status là "trained", "no_data"
+        hoặc "refit" (cần train lại từ đầu). Với dưới 10 bản ghi mới thì không
+        tách được tập test riêng: model được train trên tất cả và không đánh giá
+        (accuracy, h_loss là None) thay vì chấm điểm trên chính dữ liệu vừa train.
+        """
+        print(f"🤖 Starting incremental training on records after id {min_record_id}...")
+        base_features = list(self.feature_names)
+        base_labels = list(self.label_columns)
+
+        X, Y = self._load_training_matrix(
+            streaming, chunk_size, min_record_id=min_record_id, max_record_id=max_record_id
+        )
+        if X is None:
+            return "no_data", None, 0
+
+        if len(X) >= 10:
+            X_train, X_test, y_train, y_test = train_test_split(
+                X, Y, test_size=0.2, random_state=42
+            )
+        else:
+            X_train, X_test, y_train, y_test = X, None, Y, None
+
+        reason = self._full_refit_reason(X, y_train, base_features, base_labels)
+        if reason:
+            print(f"🔁 Full retrain required: {reason}.")
+            return "refit", None, 0
+
+        n_estimators = len(self.model.estimators_) + INCREMENTAL_CONFIG["trees_per_increment"]
+        print(f"🎯 Growing the forest to {n_estimators} trees with {len(X_train)} new records...")
+        self._report_progress("fitting")
+        self.model.set_params(warm_start=True, n_estimators=n_estimators, n_jobs=self.n_jobs)
+        self.model.fit(self.scaler.transform(X_train), y_train)
+        self.model.set_params(warm_start=False, n_jobs=None)
+        self.total_training_count += self.training_data_count
+
+        if X_test is None:
+            print(f"\n📈 Incremental training on {len(X_train)} records: too few to evaluate.")
+            return "trained", None, None
+
+        self._report_progress("evaluating")
+        y_pred = self.model.predict(self.scaler.transform(X_test))
+        subset_accuracy = accuracy_score(y_test, y_pred)
+        h_loss = hamming_loss(y_test, y_pred)
+        print("\n📈 Incremental Training Results (new records):")
+        print(f"Subset Accuracy (Exact Match): {subset_accuracy:.4f}")
+        print(f"Hamming Loss (Label Mismatch Ratio): {h_loss:.4f}")
+        return "trained", subset_accuracy, h_loss
+
     def save_model(self, filename=None):
         """Lưu mô hình đã train."""
         if filename is None:
@@ -117,11 +308,15 @@ class HealthPredictionTrainer:
             "scaler": self.scaler,
             "label_columns": self.label_columns,
             "feature_names": self.feature_names,
+            "total_training_count": self.total_training_count,
+            "last_record_id": self.last_record_id,
             "trained_at": datetime.now().isoformat(),
             "model_type": "RandomForestClassifier_MultiLabel",
         }
         joblib.dump(model_data, filename)
         print(f"💾 Model saved to {filename}")
+        if MODEL_MMAP_ARTIFACT:
+            export_artifact(self, model_data, filename)
 
     def load_model(self, filename="data/health_prediction_model.pkl"):
         """Load mô hình đã train."""
@@ -133,22 +328,117 @@ class HealthPredictionTrainer:
         self.scaler = model_data["scaler"]
         self.label_columns = model_data["label_columns"]
         self.feature_names = model_data["feature_names"]
+        self.total_training_count = model_data.get("total_training_count", 0)
+        self.last_record_id = model_data.get("last_record_id")
 
         print(f"📂 Model loaded from {filename}")
         print(f"Trained at: {model_data.get('trained_at', 'Unknown')}")
         return model_data
 
-    def train_model(self):
-        """Main training function."""
+    def train_model(
+        self,
+        streaming=None,
+        chunk_size=None,
+        incremental=None,
+        trigger_type="manual",
+        triggered_by=None,
+        filename=None,
+        base_filename=None,
+    ):
+        """
+        Main training function. Mỗi lần chạy được ghi vào model_training_history
+        (trạng thái, thời gian, số bản ghi và id bản ghi lớn nhất đã train).
+
+        Model được lưu vào `filename`; khi train incremental, model gốc được load
+        từ `base_filename` (mặc định chính là `filename`). Trả về True nếu đã lưu
+        một model mới.
+        """
         print("🏥 Health Prediction Model Training (Multi-Label)")
         print("=" * 50)
 
-        accuracy, h_loss = self._train()
+        if streaming is None:
+            streaming = TRAINING_CONFIG["streaming"]
+        if chunk_size is None:
+            chunk_size = TRAINING_CONFIG["chunk_size"]
+        if incremental is None:
+            incremental = INCREMENTAL_CONFIG["enabled"]
+        if filename is None:
+            filename = "data/health_prediction_model.pkl"
+        if base_filename is None:
+            base_filename = filename
+
+        started = time.monotonic()
+        run_id = ModelTrainingHistoryDAO.start_run(trigger_type, triggered_by)
+        try:
+            # Cố định mốc: bản ghi thêm vào trong lúc train sẽ thuộc về lần train sau
+            max_record_id = ModelTrainingHistoryDAO.get_record_counts()["max_record_id"]
+            min_record_id = None
+            mode = "full"
+
+            if incremental and self.model is None and os.path.exists(base_filename):
+                self.load_model(base_filename)
+            if incremental and self.model is None:
+                print(f"🔁 No existing model at {base_filename}, doing a full retrain.")
+            elif incremental and self.last_record_id is None:
+                # Mốc lấy từ chính model gốc (không phải lịch sử): lần chạy 'completed'
+                # có thể chưa được thay vào, hoặc model được thay bằng tay/train_from_files
+                print("🔁 Base model has no last_record_id, doing a full retrain.")
+            elif incremental:
+                min_record_id = self.last_record_id
+                status, accuracy, h_loss = self._train_incremental(
+                    streaming, chunk_size, min_record_id, max_record_id
+                )
+                if status == "no_data":
+                    ModelTrainingHistoryDAO.finish_run(
+                        run_id,
+                        "cancelled",
+                        int(time.monotonic() - started),
+                        notes="incremental: no new records since last training",
+                    )
+                    print("\n✅ Model is up to date, nothing to train.")
+                    return False
+                mode = "incremental" if status == "trained" else "full"
+
+            if mode == "full":
+                min_record_id = None
+                accuracy, h_loss = self._train(
+                    streaming=streaming, chunk_size=chunk_size, max_record_id=max_record_id
+                )
+                if accuracy is None:
+                    ModelTrainingHistoryDAO.finish_run(
+                        run_id,
+                        "failed",
+                        int(time.monotonic() - started),
+                        error_message="No training data",
+                    )
+                    print("\n❌ Training failed.")
+                    return False
+
+            # Lưu model và đóng lần chạy cũng nằm trong try: lỗi ở đây phải được ghi
+            # vào lịch sử thay vì để bản ghi ở trạng thái 'running' mãi
+            self._report_progress("saving")
+            self.last_record_id = max_record_id
+            self.save_model(filename)
+            counts = ModelTrainingHistoryDAO.get_record_counts(min_record_id, max_record_id)
+            ModelTrainingHistoryDAO.complete_run(
+                run_id,
+                training_data_count=self.training_data_count,
+                doctor_diagnosed_count=counts["doctor_diagnosed_count"],
+                system_predicted_count=counts["system_predicted_count"],
+                last_record_id=max_record_id,
+                duration_seconds=int(time.monotonic() - started),
+                notes=mode,
+            )
+        except Exception as e:
+            ModelTrainingHistoryDAO.finish_run(
+                run_id, "failed", int(time.monotonic() - started), error_message=str(e)
+            )
+            raise
 
-        if accuracy is not None:
-            self.save_model()
-            print("\n✅ Training completed successfully!")
+        print("\n✅ Training completed successfully!")
+        if accuracy is None:
+            print("Final Subset Accuracy: not evaluated")
+        else:
             print(f"Final Subset Accuracy: {accuracy:.4f}")
             print(f"Final Hamming Loss: {h_loss:.4f}")
-        else:
-            print("\n❌ Training failed.")
+        return True
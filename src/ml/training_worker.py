@@ -0,0 +1,278 @@
+import argparse
+import fcntl
+import json
+import os
+import subprocess
+import sys
+import threading
+import traceback
+from datetime import datetime
+
+from .model_store import MODEL_DIR, new_artifact_path, set_current_model
+
+
+def _run_training_process(args):
+    """
+    Entry point của process training (`python -m src.ml.training_worker`). Chạy
+    trong interpreter riêng nên không chia sẻ connection hay thread nào với
+    server. Ghi các message JSON theo dòng vào `--progress-fd`: `{"stage": ...}`,
+    rồi `{"done": saved}` hoặc `{"error": message}`.
+    """
+    from ..data.database.database import DatabaseClient
+    from .train_model import HealthPredictionTrainer
+
+    progress = os.fdopen(args.progress_fd, "w", buffering=1)
+
+    def send(message):
+        progress.write(json.dumps(message) + "\n")
+
+    try:
+        if DatabaseClient.connect() is False:
+            raise RuntimeError("Could not connect to the database")
+        with DatabaseClient.connection_scope():
+            trainer = HealthPredictionTrainer()
+            trainer.n_jobs = -1
+            trainer.progress_callback = lambda stage: send({"stage": stage})
+            saved = trainer.train_model(
+                incremental={"auto": None, "incremental": True, "full": False}[args.mode],
+                streaming=args.streaming,
+                trigger_type=args.trigger_type,
+                triggered_by=args.triggered_by,
+                filename=args.artifact,
+                base_filename=args.base,
+            )
+        send({"done": bool(saved)})
+    except Exception as e:
+        traceback.print_exc()
+        send({"error": str(e)})
+    finally:
+        DatabaseClient.disconnect()
+        progress.close()
+
+
+class TrainingJobRunner:
+    """
+    Chạy training trong một process riêng rồi hot-swap model mới vào
+    `HealthPredictor` mà không chặn request nào. Mỗi lúc chỉ có một job, kể cả
+    giữa các worker của server pre-fork: job giữ một file lock trong `model_dir`
+    và trạng thái được ghi ra file để worker nào cũng trả lời được.
+    """
+
+    def __init__(self, predictor, model_dir=MODEL_DIR, on_swap=None):
+        self.predictor = predictor
+        self.model_dir = model_dir
+        # Gọi với đường dẫn artifact sau khi model mới được thay vào (vd. để báo
+        # master của server pre-fork cho các worker khác load model mới)
+        self.on_swap = on_swap
+        self._lock = threading.Lock()
+        self._status = {"state": "idle"}
+        self.lock_path = os.path.join(model_dir, "training.lock")
+        self.status_path = os.path.join(model_dir, "training_status.json")
+        self._lock_fd = None
+        self._process = None
+        self._thread = None
+
+    def is_running(self):
+        with self._lock:
+            return self._status["state"] in ("queued", "running")
+
+    def start(self, incremental=None, streaming=None, trigger_type="api", triggered_by=None):
+        """Bắt đầu một job training nền. Trả về False nếu đang có job chạy."""
+        options = {
+            "incremental": incremental,
+            "streaming": streaming,
+            "trigger_type": trigger_type,
+            "triggered_by": triggered_by,
+        }
+        with self._lock:
+            if self._status["state"] in ("queued", "running"):
+                return False
+            lock_fd = self._acquire_job_lock()
+            if lock_fd is None:
+                return False
+            self._lock_fd = lock_fd
+            self._status = {
+                "state": "queued",
+                "stage": "queued",
+                "options": options,
+                "started_at": datetime.now().isoformat(),
+                "stages": [],
+                "worker_pid": os.getpid(),
+            }
+            self._save_status()
+        self._thread = threading.Thread(
+            target=self._run, args=(options,), name="training-job", daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def stop(self, timeout=10.0):
+        """Dừng process training đang chạy (khi worker thoát) thay vì để nó mồ côi."""
+        process = self._process
+        if process is not None and process.poll() is None:
+            print(f"🛑 Stopping training process {process.pid}")
+            process.terminate()
+            try:
+                process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def get_status(self):
+        with self._lock:
+            status = dict(self._status)
+            status["stages"] = list(status.get("stages", []))
+        if status["state"] not in ("queued", "running"):
+            # Job gần nhất có thể do worker khác chạy
+            status = self._read_shared_status() or status
+        model = self.predictor.model
+        status["current_model"] = model.get_info() if model else None
+        return status
+
+    def running_job_owner(self):
+        """Pid của process (worker) đang chạy job training, hoặc None."""
+        status = self._read_shared_status()
+        if status and status["state"] in ("queued", "running"):
+            return status.get("worker_pid")
+        return None
+
+    def _acquire_job_lock(self):
+        """Khóa job dùng chung giữa các process; trả về fd đã khóa hoặc None nếu đang bị giữ."""
+        os.makedirs(self.model_dir, exist_ok=True)
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    def _save_status(self):
+        # Gọi khi đang giữ `self._lock`
+        tmp = f"{self.status_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._status, f)
+        os.replace(tmp, self.status_path)
+
+    def _read_shared_status(self):
+        try:
+            with open(self.status_path) as f:
+                status = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if status["state"] in ("queued", "running") and not _pid_alive(status.get("worker_pid")):
+            status["state"] = "failed"
+            status["error"] = "Training job was interrupted: its worker process exited"
+        return status
+
+    def _set_stage(self, stage, **fields):
+        with self._lock:
+            self._status["stage"] = stage
+            self._status.setdefault("stages", []).append(
+                {"stage": stage, "at": datetime.now().isoformat()}
+            )
+            self._status.update(fields)
+            self._save_status()
+
+    def _command(self, options, artifact_path, progress_fd):
+        mode = {None: "auto", True: "incremental", False: "full"}[options["incremental"]]
+        command = [
+            sys.executable,
+            "-m",
+            "src.ml.training_worker",
+            "--artifact", artifact_path,
+            "--base", self.predictor.model_file,
+            "--progress-fd", str(progress_fd),
+            "--mode", mode,
+            "--trigger-type", options["trigger_type"],
+        ]
+        if options["streaming"] is not None:
+            command.append("--streaming" if options["streaming"] else "--no-streaming")
+        if options["triggered_by"] is not None:
+            command += ["--triggered-by", str(options["triggered_by"])]
+        return command
+
+    def _run(self, options):
+        artifact_path = new_artifact_path(self.model_dir)
+        self._set_stage("starting", state="running", artifact=artifact_path)
+
+        read_fd, write_fd = os.pipe()
+        try:
+            try:
+                # Process training cũng giữ file lock: nếu worker chết, job mới vẫn
+                # chờ tới khi process này thoát
+                process = subprocess.Popen(
+                    self._command(options, artifact_path, write_fd),
+                    pass_fds=(write_fd, self._lock_fd),
+                )
+            finally:
+                os.close(write_fd)
+            self._process = process
+            self._set_stage("started", pid=process.pid)
+
+            outcome = None
+            progress = os.fdopen(read_fd)
+            # File object giờ sở hữu fd; không đóng lại số fd này (có thể đã là socket của thread khác)
+            read_fd = None
+            with progress:
+                for line in progress:
+                    message = json.loads(line)
+                    if "stage" in message:
+                        self._set_stage(message["stage"])
+                    else:
+                        outcome = message
+            returncode = process.wait()
+
+            if outcome is None:
+                self._finish("failed", error=f"Training process exited with code {returncode}")
+            elif "error" in outcome:
+                self._finish("failed", error=outcome["error"])
+            elif not outcome["done"]:
+                self._finish("succeeded", message="No new model produced", swapped=False)
+            else:
+                self._set_stage("swapping")
+                # Request đang chạy vẫn giữ model cũ; request mới dùng model mới
+                self.predictor.swap_model(artifact_path)
+                set_current_model(artifact_path, self.model_dir)
+                self._finish("succeeded", swapped=True)
+                if self.on_swap is not None:
+                    self.on_swap(artifact_path)
+        except Exception as e:
+            traceback.print_exc()
+            self._finish("failed", error=str(e))
+        finally:
+            if read_fd is not None:
+                os.close(read_fd)
+            self._process = None
+            # Nhả khóa sau khi trạng thái cuối đã được ghi
+            with self._lock:
+                os.close(self._lock_fd)
+                self._lock_fd = None
+
+    def _finish(self, state, **fields):
+        self._set_stage(state, state=state, finished_at=datetime.now().isoformat(), **fields)
+
+
+def _pid_alive(pid):
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train a model artifact in a worker process.")
+    parser.add_argument("--artifact", required=True)
+    parser.add_argument("--base", required=True)
+    parser.add_argument("--progress-fd", type=int, required=True)
+    parser.add_argument("--mode", choices=["auto", "incremental", "full"], default="auto")
+    parser.add_argument("--streaming", action=argparse.BooleanOptionalAction, default=None)
+    parser.add_argument("--trigger-type", default="api")
+    parser.add_argument("--triggered-by", type=int, default=None)
+    _run_training_process(parser.parse_args())
@@ -0,0 +1,359 @@
+"""
+Server pre-fork cho production: process master load model và danh mục triệu
+chứng/bệnh một lần, mở socket nghe rồi fork N worker. Các worker dùng chung các
+trang bộ nhớ của model (copy-on-write) và mỗi worker tự mở connection DB, thread
+nền sau khi fork.
+
+    python3 -B -m src.server --workers 4 --port 5000
+
+Tín hiệu gửi cho master:
+    SIGTERM / SIGINT  dừng êm: worker ngừng nhận request, chạy nốt request đang dở rồi thoát
+    SIGHUP            load lại model hiện hành (`CURRENT`) rồi thay lần lượt từng worker
+"""
+
+import argparse
+import gc
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+# Không để `src.app` tự khởi động khi import: master tự gọi `initialize()`
+os.environ["STARTUP_MODE"] = "manual"
+
+from werkzeug.serving import ThreadedWSGIServer
+
+from src import app as app_module
+from src.controller.model_controller import training_runner
+from src.controller.predict_controller import health_predictor_instance, write_queue
+from src.data.database.database import DatabaseClient
+from src.ml.model_store import resolve_current_model
+
+PREFORK_CONFIG = {
+    "host": os.environ.get("PREFORK_HOST", "127.0.0.1"),
+    "port": int(os.environ.get("PREFORK_PORT", 5000)),
+    "workers": int(os.environ.get("PREFORK_WORKERS", os.cpu_count() or 1)),
+    # Worker tự thoát (và được thay) sau chừng này request; 0 = không giới hạn
+    "max_requests": int(os.environ.get("PREFORK_MAX_REQUESTS", 0)),
+    # Cộng thêm ngẫu nhiên 0..jitter vào max_requests để các worker không cùng lúc khởi động lại
+    "max_requests_jitter": int(os.environ.get("PREFORK_MAX_REQUESTS_JITTER", 0)),
+    # Thời gian (giây) chờ worker chạy nốt request trước khi bị kill
+    "graceful_timeout": float(os.environ.get("PREFORK_GRACEFUL_TIMEOUT", 30)),
+    "backlog": int(os.environ.get("PREFORK_BACKLOG", 2048)),
+}
+
+# Worker thoát trong khoảng này sau khi fork thì chờ trước khi fork lại slot đó
+_RESPAWN_BACKOFF = 1.0
+
+
+def worker_queue_path(queue_path, slot):
+    """
+    File hàng đợi write-behind của worker `slot`. Mỗi worker một file (hai
+    process cùng đọc một file sẽ ghi trùng bản ghi); worker thay thế dùng lại file
+    của slot nên bản ghi còn lại vẫn được ghi tiếp. Slot 0 dùng file gốc để ghi
+    nốt hàng đợi của chế độ một process.
+    """
+    if slot == 0:
+        return queue_path
+    root, ext = os.path.splitext(queue_path)
+    return f"{root}.{slot}{ext}"
+
+
+class WorkerHTTPServer(ThreadedWSGIServer):
+    """
+    Server WSGI của một worker trên socket nghe kế thừa từ master. Đếm request
+    đang chạy để khi dừng có thể chờ chúng xong.
+    """
+
+    def __init__(self, app, listener):
+        host, port = listener.getsockname()[:2]
+        super().__init__(host, port, app, fd=listener.fileno())
+        self.timeout = 0.5
+        self.handled = 0
+        self.active = 0
+        self._idle = threading.Condition()
+
+    def get_request(self):
+        request, client_address = super().get_request()
+        # Socket nghe là non-blocking (nhiều worker cùng chờ accept), connection thì không
+        request.setblocking(True)
+        return request, client_address
+
+    def process_request(self, request, client_address):
+        with self._idle:
+            self.active += 1
+            self.handled += 1
+        super().process_request(request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            with self._idle:
+                self.active -= 1
+                self._idle.notify_all()
+
+    def wait_idle(self, timeout):
+        with self._idle:
+            return self._idle.wait_for(lambda: self.active == 0, timeout)
+
+
+def run_worker(slot, listener, config):
+    """Thân của process worker sau fork; không bao giờ return."""
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    # Ctrl+C gửi cho cả nhóm process: để master quyết định dừng worker
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    gc.enable()
+    # Trạng thái random kế thừa từ master giống hệt nhau ở mọi worker
+    random.seed()
+
+    exit_code = 0
+    try:
+        if DatabaseClient.connect() is False:
+            threading.Thread(
+                target=app_module.connect_database,
+                kwargs={"retry_interval": app_module.STARTUP_CONFIG["db_retry_interval"]},
+                name="db-connect",
+                daemon=True,
+            ).start()
+        if write_queue is not None:
+            write_queue.queue_path = worker_queue_path(write_queue.queue_path, slot)
+        app_module.start_background_services()
+        # Model train xong ở worker này: báo master load lại và thay các worker khác
+        training_runner.on_swap = lambda path: os.kill(os.getppid(), signal.SIGHUP)
+
+        max_requests = config["max_requests"]
+        if max_requests:
+            max_requests += random.randint(0, config["max_requests_jitter"])
+        server = WorkerHTTPServer(app_module.app, listener)
+        print(f"👷 Worker {slot} (pid {os.getpid()}) serving")
+        while not stopping.is_set():
+            server.handle_request()
+            # Không thay worker đang chạy job training (job và hot-swap gắn với process này)
+            if max_requests and server.handled >= max_requests and not training_runner.is_running():
+                print(f"♻️ Worker {slot} (pid {os.getpid()}) served {server.handled} requests, recycling")
+                break
+        training_runner.stop(timeout=min(10.0, config["graceful_timeout"] / 2))
+        if not server.wait_idle(config["graceful_timeout"]):
+            print(f"⚠️ Worker {slot} (pid {os.getpid()}) exiting with {server.active} requests still running")
+        server.server_close()
+        if write_queue is not None:
+            write_queue.close()
+    except Exception:
+        traceback.print_exc(file=sys.stdout)
+        exit_code = 1
+    finally:
+        DatabaseClient.disconnect()
+        sys.stdout.flush()
+        os._exit(exit_code)
+
+
+class PreforkServer:
+    """Process master: giữ socket nghe, fork/thay worker và xử lý tín hiệu."""
+
+    def __init__(self, config=PREFORK_CONFIG):
+        self.config = config
+        self.listener = None
+        self.workers = {}  # pid -> slot
+        self._spawned_at = {}  # slot -> thời điểm fork
+        self._not_before = {}  # slot -> chưa fork lại trước thời điểm này
+        self._outdated = set()  # pid của worker chạy model cũ, chờ được thay
+        self._terminating = {}  # pid -> hạn chót trước khi kill
+        self._stopping = False
+        self._reload = False
+        self._wakeup = None
+
+    # --- Khởi động ---
+    def preload(self):
+        """Load model, danh mục triệu chứng/bệnh trong master rồi đóng pool DB trước khi fork."""
+        gc.disable()
+        app_module.initialize(start_services=False)
+        DatabaseClient.disconnect()
+        if not health_predictor_instance.is_ready():
+            raise RuntimeError(f"No prediction model could be loaded: {app_module.startup_state['error']}")
+
+    def bind(self):
+        listener = socket.create_server(
+            (self.config["host"], self.config["port"]), backlog=self.config["backlog"]
+        )
+        listener.setblocking(False)
+        self.listener = listener
+        print(f"🌐 Listening on http://{self.config['host']}:{self.config['port']}")
+
+    def _install_signals(self):
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(read_fd, False)
+        os.set_blocking(write_fd, False)
+        self._wakeup = (read_fd, write_fd)
+        signal.set_wakeup_fd(write_fd)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        # Chỉ để đánh thức vòng lặp qua wakeup fd; việc thu dọn làm trong `_reap`
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _on_reload(self, signum, frame):
+        self._reload = True
+
+    # --- Worker ---
+    def _spawn(self, slot):
+        # Đưa mọi object hiện có (model, danh mục...) ra khỏi tầm quét của GC để
+        # GC ở worker không ghi vào các trang dùng chung
+        gc.freeze()
+        pid = os.fork()
+        if pid == 0:
+            signal.set_wakeup_fd(-1)
+            os.close(self._wakeup[0])
+            os.close(self._wakeup[1])
+            run_worker(slot, self.listener, self.config)
+        self.workers[pid] = slot
+        self._spawned_at[slot] = time.monotonic()
+
+    def _spawn_missing(self):
+        now = time.monotonic()
+        used = set(self.workers.values())
+        for slot in range(self.config["workers"]):
+            if slot not in used and now >= self._not_before.get(slot, 0):
+                self._spawn(slot)
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            slot = self.workers.pop(pid, None)
+            self._outdated.discard(pid)
+            self._terminating.pop(pid, None)
+            if slot is None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if code != 0 and not self._stopping:
+                print(f"⚠️ Worker {slot} (pid {pid}) exited with code {code}")
+            if time.monotonic() - self._spawned_at.get(slot, 0) < _RESPAWN_BACKOFF:
+                self._not_before[slot] = time.monotonic() + _RESPAWN_BACKOFF
+
+    def _terminate(self, pid):
+        if pid in self._terminating:
+            return
+        self._terminating[pid] = time.monotonic() + self.config["graceful_timeout"]
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def _kill_overdue(self):
+        now = time.monotonic()
+        for pid, deadline in list(self._terminating.items()):
+            if now >= deadline:
+                print(f"⚠️ Worker pid {pid} did not stop in time, killing it")
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                self._terminating[pid] = float("inf")
+
+    def reload_model(self):
+        """Load model hiện hành trong master rồi đánh dấu mọi worker để thay lần lượt."""
+        print("🔄 Reloading model in master...")
+        gc.unfreeze()
+        try:
+            health_predictor_instance.swap_model(resolve_current_model())
+        except Exception as e:
+            print(f"❌ Model reload failed, workers keep the current model: {e}")
+            return
+        finally:
+            gc.collect()
+        self._outdated = set(self.workers)
+
+    def _roll_outdated(self):
+        # Mỗi lúc chỉ thay một worker để các worker còn lại vẫn phục vụ; worker
+        # đang chạy job training được thay sau khi job xong
+        if self._outdated and not (self._outdated & set(self._terminating)):
+            training_pid = training_runner.running_job_owner()
+            candidates = [pid for pid in self._outdated if pid != training_pid]
+            if candidates:
+                self._terminate(candidates[0])
+
+    # --- Vòng lặp chính ---
+    def _wait(self, timeout):
+        try:
+            select.select([self._wakeup[0]], [], [], timeout)
+        except InterruptedError:
+            pass
+        try:
+            while os.read(self._wakeup[0], 512):
+                pass
+        except BlockingIOError:
+            pass
+
+    def run(self):
+        self.preload()
+        self.bind()
+        self._install_signals()
+        print(f"🚀 Master pid {os.getpid()} starting {self.config['workers']} workers")
+
+        while not self._stopping:
+            self._reap()
+            if self._reload:
+                self._reload = False
+                self.reload_model()
+            self._roll_outdated()
+            self._kill_overdue()
+            self._spawn_missing()
+            self._wait(1.0)
+
+        print("🛑 Stopping workers...")
+        for pid in list(self.workers):
+            self._terminate(pid)
+        while self.workers:
+            self._reap()
+            self._kill_overdue()
+            self._wait(0.2)
+        self.listener.close()
+        print("👋 Master stopped")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the API with a pre-forked pool of worker processes.")
+    parser.add_argument("--host", default=PREFORK_CONFIG["host"])
+    parser.add_argument("--port", type=int, default=PREFORK_CONFIG["port"])
+    parser.add_argument("--workers", type=int, default=PREFORK_CONFIG["workers"])
+    parser.add_argument("--max-requests", type=int, default=PREFORK_CONFIG["max_requests"])
+    parser.add_argument("--max-requests-jitter", type=int, default=PREFORK_CONFIG["max_requests_jitter"])
+    parser.add_argument("--graceful-timeout", type=float, default=PREFORK_CONFIG["graceful_timeout"])
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    config = dict(
+        PREFORK_CONFIG,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        max_requests=args.max_requests,
+        max_requests_jitter=args.max_requests_jitter,
+        graceful_timeout=args.graceful_timeout,
+    )
+    PreforkServer(config).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+"""
+Sinh dữ liệu bệnh án tổng hợp với số lượng tuỳ ý (từ vài nghìn tới hàng chục
+triệu bản ghi) để thử tải và thử training.
+
+Tương quan triệu chứng - bệnh lấy từ `symptoms_map` trong `docker/db/init.sql`,
+có thêm nhiễu (triệu chứng bị thiếu/thừa) và phân bố bệnh theo mùa. Dữ liệu được
+sinh và ghi theo từng chunk nên bộ nhớ không phụ thuộc vào số bản ghi.
+
+Hai định dạng đầu ra:
+
+- `copy`: các file CSV cho `COPY` (`users`, `medical_records`, `record_symptoms`,
+  `record_diseases`) kèm `load.sql` để nạp bằng psql.
+- `npy`: ma trận feature/label (`X.npy` float32, `Y.npy` uint8) đúng thứ tự cột
+  của pipeline training, train trực tiếp bằng `HealthPredictionTrainer.train_from_files`.
+
+    python -m src.tools.synthetic_data --records 1000000 --format copy --out data/synthetic
+    python -m src.tools.synthetic_data --records 5000000 --format npy --out data/synthetic_npy
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from ..data.dao.medical_record_dao import BASE_FEATURE_COLUMNS
+
+# Danh mục theo đúng thứ tự (và id) được seed trong docker/db/init.sql
+SYMPTOM_CODES = [
+    "FEVER", "COUGH", "HEADACHE", "SORE_THROAT", "RUNNY_NOSE",
+    "FATIGUE", "BODY_ACHES", "NAUSEA", "DIARRHEA", "SHORTNESS_OF_BREATH",
+]
+DISEASE_CODES = [
+    "COMMON_COLD", "SEASONAL_FLU", "GASTROENTERITIS", "ALLERGIC_RHINITIS", "HEAT_EXHAUSTION",
+    "HEALTHY", "COVID19", "PHARYNGITIS", "HYPERTENSION", "DIABETES_T2",
+]
+
+# disease id -> symptom ids, giống `symptoms_map` trong init.sql
+SYMPTOMS_MAP = {
+    1: [1, 2, 5, 4, 6],
+    2: [1, 2, 7, 3, 6],
+    3: [8, 9, 1, 6],
+    4: [5, 2, 4, 6],
+    5: [6, 3, 8, 1],
+    6: [],
+    7: [1, 2, 10, 6, 3],
+    8: [4, 1, 3, 6],
+    9: [3, 6, 10, 8],
+    10: [6, 3, 8],
+}
+
+SEASONS = ["spring", "summer", "autumn", "winter"]
+GENDERS = ["female", "male", "other"]  # index = giá trị feature (0, 1, 2)
+
+# Trọng số xuất hiện của bệnh theo mùa (spring, summer, autumn, winter)
+SEASONAL_DISEASE_WEIGHTS = {
+    "COMMON_COLD": (1.0, 0.6, 1.2, 2.0),
+    "SEASONAL_FLU": (1.0, 0.4, 1.2, 2.5),
+    "GASTROENTERITIS": (1.0, 1.6, 1.0, 0.8),
+    "ALLERGIC_RHINITIS": (2.5, 1.0, 1.2, 0.6),
+    "HEAT_EXHAUSTION": (0.5, 3.0, 0.6, 0.1),
+    "HEALTHY": (1.5, 1.5, 1.5, 1.5),
+    "COVID19": (1.0, 0.8, 1.0, 1.3),
+    "PHARYNGITIS": (1.0, 0.8, 1.1, 1.4),
+    "HYPERTENSION": (1.0, 1.0, 1.0, 1.0),
+    "DIABETES_T2": (1.0, 1.0, 1.0, 1.0),
+}
+SEASON_MEAN_TEMP = (24.0, 33.0, 26.0, 16.0)
+
+GENERATOR_CONFIG = {
+    "chunk_size": 100000,
+    # Xác suất một triệu chứng điển hình của bệnh xuất hiện trong bản ghi
+    "symptom_keep_probability": 0.85,
+    # Xác suất một triệu chứng ngoài bệnh cảnh xuất hiện (nhiễu)
+    "symptom_noise_probability": 0.03,
+}
+
+USER_COLUMNS = [
+    "id", "username", "email", "password", "first_name", "last_name", "date_of_birth",
+    "gender", "phone", "address", "role", "is_active",
+]
+RECORD_COLUMNS = [
+    "id", "user_id", "doctor_id", "record_type", "confidence_score", "status", "is_accurate",
+    "weather_temp", "humidity", "air_quality_index", "season",
+]
+
+
+def _symptom_matrix():
+    """Ma trận (n_diseases, n_symptoms): 1 nếu triệu chứng thuộc bệnh cảnh của bệnh."""
+    matrix = np.zeros((len(DISEASE_CODES), len(SYMPTOM_CODES)), dtype=bool)
+    for disease_id, symptom_ids in SYMPTOMS_MAP.items():
+        matrix[disease_id - 1, [s - 1 for s in symptom_ids]] = True
+    return matrix
+
+
+class SyntheticDataGenerator:
+    def __init__(
+        self,
+        n_patients,
+        n_doctors,
+        n_records,
+        seed=42,
+        user_id_start=1001,
+        record_id_start=1001,
+        system_prediction_ratio=0.0,
+        chunk_size=GENERATOR_CONFIG["chunk_size"],
+    ):
+        self.n_patients = n_patients
+        self.n_doctors = n_doctors
+        self.n_records = n_records
+        self.seed = seed
+        self.user_id_start = user_id_start
+        self.record_id_start = record_id_start
+        self.system_prediction_ratio = system_prediction_ratio
+        self.chunk_size = chunk_size
+
+        self.symptom_matrix = _symptom_matrix()
+        self.log_weights = np.log(
+            np.array([SEASONAL_DISEASE_WEIGHTS[code] for code in DISEASE_CODES]).T
+        )
+
+        # Thuộc tính của user cần cho bản ghi (tuổi, giới tính): giữ theo số user,
+        # không theo số bản ghi
+        rng = np.random.default_rng([seed, 0])
+        n_users = n_patients + n_doctors
+        self.birth_years = rng.integers(1940, 2015, size=n_users).astype(np.int16)
+        self.birth_years[n_patients:] = rng.integers(1955, 1995, size=n_doctors)
+        self.genders = rng.integers(0, 3, size=n_users).astype(np.int8)
+
+    def _chunks(self, total):
+        for index, start in enumerate(range(0, total, self.chunk_size)):
+            yield index, start, min(self.chunk_size, total - start)
+
+    def iter_users(self):
+        """DataFrame user theo từng chunk (patient trước, doctor sau)."""
+        n_users = self.n_patients + self.n_doctors
+        for _, start, size in self._chunks(n_users):
+            offsets = np.arange(start, start + size)
+            ids = self.user_id_start + offsets
+            is_patient = offsets < self.n_patients
+            prefix = np.where(is_patient, "synth_patient", "synth_doctor")
+            usernames = pd.Series(prefix).str.cat(ids.astype(str), sep="_")
+            yield pd.DataFrame(
+                {
+                    "id": ids,
+                    "username": usernames,
+                    "email": usernames + "@example.com",
+                    "password": "synthetic",
+                    "first_name": "Synthetic",
+                    "last_name": pd.Series(ids).astype(str),
+                    "date_of_birth": pd.Series(self.birth_years[offsets]).astype(str) + "-01-01",
+                    "gender": np.array(GENDERS)[self.genders[offsets]],
+                    "phone": None,
+                    "address": None,
+                    "role": np.where(is_patient, "patient", "doctor"),
+                    "is_active": True,
+                }
+            )
+
+    def generate_chunk(self, index, start, size):
+        """
+        Sinh một chunk bản ghi. Trả về dict các mảng: thông tin bản ghi và ma trận
+        bool `diseases` (size, n_diseases), `symptoms` (size, n_symptoms).
+        Mỗi chunk có seed riêng (seed, index) nên cùng seed và `chunk_size` luôn
+        sinh ra cùng dữ liệu.
+        """
+        rng = np.random.default_rng([self.seed, 1, index])
+        season = rng.integers(0, 4, size=size)
+
+        # Chọn 1-3 bệnh khác nhau theo trọng số mùa (Gumbel top-k)
+        n_diseases = rng.integers(1, 4, size=size)
+        keys = self.log_weights[season] + rng.gumbel(size=(size, len(DISEASE_CODES)))
+        ranks = np.argsort(np.argsort(-keys, axis=1), axis=1)
+        diseases = ranks < n_diseases[:, None]
+
+        typical = (diseases.astype(np.uint8) @ self.symptom_matrix.astype(np.uint8)) > 0
+        draw = rng.random(size=typical.shape)
+        symptoms = np.where(
+            typical,
+            draw < GENERATOR_CONFIG["symptom_keep_probability"],
+            draw < GENERATOR_CONFIG["symptom_noise_probability"],
+        )
+
+        user_offsets = rng.integers(0, self.n_patients, size=size)
+        temp = rng.normal(np.take(SEASON_MEAN_TEMP, season), 4.0)
+        return {
+            "id": self.record_id_start + start + np.arange(size),
+            "user_offset": user_offsets,
+            "doctor_offset": rng.integers(0, max(self.n_doctors, 1), size=size),
+            "is_system": rng.random(size=size) < self.system_prediction_ratio,
+            "weather_temp": np.clip(temp, 10.0, 42.0).round(1),
+            "humidity": rng.integers(30, 91, size=size),
+            "air_quality_index": rng.integers(1, 6, size=size),
+            "season": season,
+            "probability": rng.uniform(0.5, 1.0, size=size).round(4),
+            "diseases": diseases,
+            "symptoms": symptoms,
+        }
+
+    def iter_record_chunks(self):
+        for index, start, size in self._chunks(self.n_records):
+            yield self.generate_chunk(index, start, size)
+
+    # --- COPY (CSV) ---
+    def write_copy(self, out_dir):
+        os.makedirs(out_dir, exist_ok=True)
+        paths = {
+            name: os.path.join(out_dir, f"{name}.csv")
+            for name in ("users", "medical_records", "record_symptoms", "record_diseases")
+        }
+        with open(paths["users"], "w", newline="") as f:
+            for users in self.iter_users():
+                users.to_csv(f, header=False, index=False, columns=USER_COLUMNS)
+
+        files = {name: open(path, "w", newline="") for name, path in paths.items() if name != "users"}
+        try:
+            for chunk in self._progress(self.iter_record_chunks()):
+                self._write_copy_chunk(chunk, files)
+        finally:
+            for f in files.values():
+                f.close()
+
+        with open(os.path.join(out_dir, "load.sql"), "w") as f:
+            f.write(self._load_script())
+        return paths
+
+    def _write_copy_chunk(self, chunk, files):
+        ids = chunk["id"]
+        is_system = chunk["is_system"]
+        # Bản ghi do hệ thống dự đoán không có bác sĩ
+        doctor_ids = pd.array(
+            self.user_id_start + self.n_patients + chunk["doctor_offset"], dtype="Int64"
+        )
+        doctor_ids[is_system | (self.n_doctors == 0)] = pd.NA
+        records = pd.DataFrame(
+            {
+                "id": ids,
+                "user_id": self.user_id_start + chunk["user_offset"],
+                "doctor_id": doctor_ids,
+                "record_type": np.where(is_system, "system_prediction", "doctor_diagnosis"),
+                "confidence_score": np.where(is_system, chunk["probability"], np.nan),
+                "status": "completed",
+                "is_accurate": None,
+                "weather_temp": chunk["weather_temp"],
+                "humidity": chunk["humidity"],
+                "air_quality_index": chunk["air_quality_index"],
+                "season": np.array(SEASONS)[chunk["season"]],
+            }
+        )
+        records.to_csv(files["medical_records"], header=False, index=False)
+
+        rows, cols = np.nonzero(chunk["symptoms"])
+        pd.DataFrame({"record_id": ids[rows], "symptom_id": cols + 1}).to_csv(
+            files["record_symptoms"], header=False, index=False
+        )
+
+        rows, cols = np.nonzero(chunk["diseases"])
+        probability = np.where(is_system[rows], chunk["probability"][rows], 1.0)
+        pd.DataFrame(
+            {"record_id": ids[rows], "disease_id": cols + 1, "probability": probability}
+        ).to_csv(files["record_diseases"], header=False, index=False)
+
+    def _load_script(self):
+        record_symptom_columns = "record_id, symptom_id"
+        record_disease_columns = "record_id, disease_id, probability"
+        return (
+            "-- Nạp dữ liệu tổng hợp: chạy `psql -f load.sql` trong thư mục chứa các file CSV\n"
+            "BEGIN;\n"
+            f"\\copy users ({', '.join(USER_COLUMNS)}) FROM 'users.csv' WITH (FORMAT csv)\n"
+            f"\\copy medical_records ({', '.join(RECORD_COLUMNS)}) FROM 'medical_records.csv' WITH (FORMAT csv)\n"
+            f"\\copy record_symptoms ({record_symptom_columns}) FROM 'record_symptoms.csv' WITH (FORMAT csv)\n"
+            f"\\copy record_diseases ({record_disease_columns}) FROM 'record_diseases.csv' WITH (FORMAT csv)\n"
+            "SELECT setval('users_id_seq', (SELECT max(id) FROM users));\n"
+            "SELECT setval('medical_records_id_seq', (SELECT max(id) FROM medical_records));\n"
+            "COMMIT;\n"
+            "ANALYZE users, medical_records, record_symptoms, record_diseases;\n"
+        )
+
+    # --- Ma trận training (npy) ---
+    def write_npy(self, out_dir):
+        """
+        Ghi thẳng `X.npy`/`Y.npy` bằng memmap theo từng chunk, cùng `manifest.json`
+        mô tả cột. Feature được tính giống `MedicalRecordDAO._engineer_features`.
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        feature_names = BASE_FEATURE_COLUMNS + SYMPTOM_CODES
+        X = np.lib.format.open_memmap(
+            os.path.join(out_dir, "X.npy"),
+            mode="w+",
+            dtype=np.float32,
+            shape=(self.n_records, len(feature_names)),
+        )
+        Y = np.lib.format.open_memmap(
+            os.path.join(out_dir, "Y.npy"),
+            mode="w+",
+            dtype=np.uint8,
+            shape=(self.n_records, len(DISEASE_CODES)),
+        )
+        current_year = datetime.now().year
+        column = {name: i for i, name in enumerate(feature_names)}
+        n_base = len(BASE_FEATURE_COLUMNS)
+
+        position = 0
+        for chunk in self._progress(self.iter_record_chunks()):
+            end = position + len(chunk["id"])
+            block = np.empty((end - position, len(feature_names)), dtype=np.float32)
+            user_offsets = chunk["user_offset"]
+            # GENDERS = female, male, other -> 0, 1, 2: cùng mapping khi training
+            block[:, column["gender"]] = self.genders[user_offsets]
+            block[:, column["weather_temp"]] = chunk["weather_temp"]
+            block[:, column["humidity"]] = chunk["humidity"]
+            block[:, column["air_quality_index"]] = chunk["air_quality_index"]
+            block[:, column["season"]] = chunk["season"]
+            block[:, column["age"]] = current_year - self.birth_years[user_offsets]
+            block[:, n_base:] = chunk["symptoms"]
+            X[position:end] = block
+            Y[position:end] = chunk["diseases"]
+            position = end
+        X.flush()
+        Y.flush()
+        del X, Y
+
+        manifest = {
+            "format": "npy",
+            "n_records": self.n_records,
+            "feature_names": feature_names,
+            "label_columns": DISEASE_CODES,
+            "seed": self.seed,
+            "generated_at": datetime.now().isoformat(),
+            "files": {"X": "X.npy", "Y": "Y.npy"},
+        }
+        with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+    def _progress(self, chunks):
+        started = time.monotonic()
+        n_done = 0
+        for chunk in chunks:
+            yield chunk
+            n_done += len(chunk["id"])
+            rate = n_done / max(time.monotonic() - started, 1e-9)
+            print(f"   ... generated {n_done}/{self.n_records} records ({rate:,.0f}/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic medical records.")
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--patients", type=int, default=None, help="Default: records / 10")
+    parser.add_argument("--doctors", type=int, default=None, help="Default: patients / 50")
+    parser.add_argument("--format", choices=["copy", "npy"], default="copy")
+    parser.add_argument("--out", default="data/synthetic")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=GENERATOR_CONFIG["chunk_size"])
+    parser.add_argument("--user-id-start", type=int, default=1001)
+    parser.add_argument("--record-id-start", type=int, default=1001)
+    parser.add_argument("--system-prediction-ratio", type=float, default=0.0)
+    args = parser.parse_args()
+
+    n_patients = args.patients or max(1, args.records // 10)
+    n_doctors = args.doctors if args.doctors is not None else max(1, n_patients // 50)
+    generator = SyntheticDataGenerator(
+        n_patients=n_patients,
+        n_doctors=n_doctors,
+        n_records=args.records,
+        seed=args.seed,
+        user_id_start=args.user_id_start,
+        record_id_start=args.record_id_start,
+        system_prediction_ratio=args.system_prediction_ratio,
+        chunk_size=args.chunk_size,
+    )
+    print(
+        f"🧪 Generating {args.records} records for {n_patients} patients "
+        f"and {n_doctors} doctors ({args.format})..."
+    )
+    if args.format == "copy":
+        generator.write_copy(args.out)
+    else:
+        generator.write_npy(args.out)
+    print(f"✅ Synthetic data written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
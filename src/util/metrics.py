@@ -0,0 +1,266 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+import psycopg2.extensions
+from flask import g, has_request_context, request
+
+METRICS_CONFIG = {
+    "enabled": os.environ.get("METRICS_ENABLED", "1") == "1",
+}
+
+# Bucket (giây) cho độ trễ: từ 0.1ms tới 10s
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+    2.5, 5.0, 10.0,
+)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.type = "counter"
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in items
+        ]
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.type = "histogram"
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def collect(self):
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        lines = []
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                le = bound if bound == "+Inf" else _format_value(float(bound))
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, labels, ('le', le))} {cumulative}"
+                )
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class GaugeCallback:
+    """
+    Metric đọc giá trị tại thời điểm scrape từ `callback()` (trả về dict labels ->
+    value). Dùng `metric_type="counter"` cho bộ đếm do module khác tự giữ.
+    """
+
+    def __init__(self, name, documentation, callback, labelnames=(), metric_type="gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.type = metric_type
+        self.callback = callback
+
+    def collect(self):
+        try:
+            values = self.callback() or {}
+        except Exception:
+            return []
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in sorted(values.items())
+            if value is not None
+        ]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Toàn bộ metric ở định dạng text của Prometheus (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUEST_DURATION = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency by endpoint.",
+        ("endpoint", "method", "status"),
+    )
+)
+STAGE_DURATION = registry.register(
+    Histogram(
+        "request_stage_duration_seconds",
+        "Latency of named stages inside a request.",
+        ("endpoint", "stage"),
+    )
+)
+DB_QUERY_DURATION = registry.register(
+    Histogram(
+        "db_query_duration_seconds",
+        "Database statement execution time by endpoint.",
+        ("endpoint",),
+    )
+)
+DB_QUERIES_PER_REQUEST = registry.register(
+    Histogram(
+        "db_queries_per_request",
+        "Number of database statements executed per request.",
+        ("endpoint",),
+        buckets=COUNT_BUCKETS,
+    )
+)
+MODEL_INFERENCE_DURATION = registry.register(
+    Histogram(
+        "model_inference_duration_seconds",
+        "Model inference time per call.",
+        ("kind",),
+    )
+)
+MODEL_INFERENCE_ROWS = registry.register(
+    Counter("model_inference_rows_total", "Patients scored by the model.", ("kind",))
+)
+PREDICTION_CACHE_LOOKUPS = registry.register(
+    Counter("prediction_cache_lookups_total", "Prediction cache lookups by result.", ("result",))
+)
+
+
+def current_endpoint():
+    """Nhãn endpoint của request hiện tại (theo URL rule để không bùng số series)."""
+    if not has_request_context():
+        return "none"
+    rule = request.url_rule
+    return rule.rule if rule is not None else "unmatched"
+
+
+@contextmanager
+def timed_stage(stage):
+    """Đo thời gian một đoạn xử lý trong request, gắn nhãn theo endpoint."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - started, current_endpoint(), stage)
+
+
+def record_inference(kind, rows, duration):
+    MODEL_INFERENCE_DURATION.observe(duration, kind)
+    MODEL_INFERENCE_ROWS.inc(kind, amount=rows)
+
+
+def record_cache_lookups(hits=0, misses=0):
+    if hits:
+        PREDICTION_CACHE_LOOKUPS.inc("hit", amount=hits)
+    if misses:
+        PREDICTION_CACHE_LOOKUPS.inc("miss", amount=misses)
+
+
+def begin_request():
+    g.db_query_count = 0
+
+
+def end_request(response, duration):
+    endpoint = current_endpoint()
+    HTTP_REQUEST_DURATION.observe(duration, endpoint, request.method, str(response.status_code))
+    DB_QUERIES_PER_REQUEST.observe(g.get("db_query_count", 0), endpoint)
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """Cursor đếm số câu lệnh và thời gian thực thi, gắn vào request hiện tại."""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            _record_query(time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            _record_query(time.perf_counter() - started)
+
+
+def _record_query(duration):
+    endpoint = current_endpoint()
+    DB_QUERY_DURATION.observe(duration, endpoint)
+    if endpoint != "none":
+        g.db_query_count = g.get("db_query_count", 0) + 1
+
+
+def cursor_factory():
+    """`cursor_factory` cho connection mới: có đo đạc nếu metrics đang bật."""
+    return InstrumentedCursor if METRICS_CONFIG["enabled"] else None
@@ -0,0 +1,185 @@
+import atexit
+import json
+import os
+import queue
+import random
+import sys
+import threading
+
+REQUEST_LOG_CONFIG = {
+    "enabled": os.environ.get("REQUEST_LOG_ENABLED", "1") == "1",
+    # Số bản ghi tối đa chờ ghi; khi đầy bản ghi mới bị bỏ (và được đếm)
+    "queue_size": int(os.environ.get("REQUEST_LOG_QUEUE_SIZE", 10000)),
+    # Tỉ lệ request được log (request lỗi >= 400 luôn được log)
+    "sample_rate": float(os.environ.get("REQUEST_LOG_SAMPLE_RATE", 1.0)),
+    # Tỉ lệ request được log kèm body (trong số request được log)
+    "body_sample_rate": float(os.environ.get("REQUEST_LOG_BODY_SAMPLE_RATE", 1.0)),
+    # Số byte tối đa giữ lại của mỗi body; 0 = không log body
+    "max_body_bytes": int(os.environ.get("REQUEST_LOG_MAX_BODY_BYTES", 500)),
+}
+
+
+def _head(chunks, limit):
+    """Lấy tối đa `limit` byte đầu của một list chunk mà không nối cả body."""
+    parts = []
+    remaining = limit
+    for chunk in chunks:
+        if remaining <= 0:
+            break
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        parts.append(chunk[:remaining])
+        remaining -= len(parts[-1])
+    return b"".join(parts)
+
+
+class RequestLogger:
+    """
+    Ghi log request/response bằng một thread nền.
+
+    Thread xử lý request chỉ quyết định sampling, cắt tối đa `max_body_bytes` byte
+    đầu của body đã có sẵn trong bộ nhớ rồi đưa một dict vào hàng đợi có giới hạn
+    (không block; hàng đợi đầy thì bỏ bản ghi). Việc decode, format và ghi ra
+    `stream` đều diễn ra ở thread nền.
+    """
+
+    def __init__(
+        self,
+        queue_size=10000,
+        sample_rate=1.0,
+        body_sample_rate=1.0,
+        max_body_bytes=500,
+        stream=None,
+    ):
+        self.sample_rate = sample_rate
+        self.body_sample_rate = body_sample_rate
+        self.max_body_bytes = max_body_bytes
+        self.stream = stream
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._enqueued = 0
+        self._dropped = 0
+        self._written = 0
+        self._sampled_out = 0
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="request-logger", daemon=True
+                )
+                self._thread.start()
+
+    def should_log(self, status_code):
+        return status_code >= 400 or random.random() < self.sample_rate
+
+    def log(self, request, response, duration):
+        """Gọi từ `after_request`: tạo bản ghi cho request/response và đưa vào hàng đợi."""
+        if not self.should_log(response.status_code):
+            with self._stats_lock:
+                self._sampled_out += 1
+            return
+
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round(duration * 1000, 3),
+            "request_bytes": request.content_length,
+            "response_bytes": response.content_length,
+            "content_type": response.content_type,
+        }
+        if self.max_body_bytes > 0 and random.random() < self.body_sample_rate:
+            record["request_body"] = self._request_head(request)
+            record["response_body"] = self._response_head(response)
+        self.submit(record)
+
+    def _request_head(self, request):
+        # Chỉ log body mà view đã đọc (Werkzeug cache trong `_cached_data`); body
+        # chưa đọc thì không đọc thêm, bản ghi chỉ có `request_bytes`
+        body = getattr(request, "_cached_data", None)
+        if body is None or not request.is_json:
+            return None
+        return body[: self.max_body_bytes]
+
+    def _response_head(self, response):
+        # Response stream (generator) không được đọc lại để log
+        if response.is_streamed or not isinstance(response.response, (list, tuple)):
+            return None
+        return _head(response.response, self.max_body_bytes)
+
+    def submit(self, record):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._stats_lock:
+                self._dropped += 1
+            return False
+        with self._stats_lock:
+            self._enqueued += 1
+        return True
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            try:
+                self._write(record)
+            except Exception as e:
+                print(f"⚠️ Request logger failed to write a record: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, record):
+        for key in ("request_body", "response_body"):
+            body = record.get(key)
+            if isinstance(body, bytes):
+                record[key] = body.decode("utf-8", errors="replace")
+        stream = self.stream or sys.stdout
+        stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        with self._stats_lock:
+            self._written += 1
+
+    def flush(self, timeout=None):
+        """Chờ ghi hết các bản ghi đang trong hàng đợi (dùng khi tắt server)."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        done = threading.Event()
+
+        def wait():
+            self._queue.join()
+            done.set()
+
+        threading.Thread(target=wait, daemon=True).start()
+        done.wait(timeout)
+
+    def get_stats(self):
+        with self._stats_lock:
+            return {
+                "enqueued": self._enqueued,
+                "written": self._written,
+                "dropped": self._dropped,
+                "sampled_out": self._sampled_out,
+                "queue_depth": self._queue.qsize(),
+                "queue_size": self._queue.maxsize,
+            }
+
+
+request_logger = (
+    RequestLogger(
+        queue_size=REQUEST_LOG_CONFIG["queue_size"],
+        sample_rate=REQUEST_LOG_CONFIG["sample_rate"],
+        body_sample_rate=REQUEST_LOG_CONFIG["body_sample_rate"],
+        max_body_bytes=REQUEST_LOG_CONFIG["max_body_bytes"],
+    )
+    if REQUEST_LOG_CONFIG["enabled"]
+    else None
+)
+
+if request_logger is not None:
+    atexit.register(request_logger.flush, 2.0)
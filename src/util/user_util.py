@@ -1,4 +1,9 @@
+from operator import attrgetter
+from src.data.model.user_model import USER_PUBLIC_COLUMNS
+
+# Lấy giá trị tất cả cột public trong một lần gọi (không copy __dict__, không có password)
+_public_values = attrgetter(*USER_PUBLIC_COLUMNS)
+
+
 def user_to_dict(user):
-    d = user.__dict__.copy()
-    d.pop("password", None)
-    return d
+    return dict(zip(USER_PUBLIC_COLUMNS, _public_values(user)))